@@ -0,0 +1,920 @@
+# benchmarks.py
+"""
+Benchmarks locales del pipeline.
+
+Uso:
+    python benchmarks.py bible <biblia.json> [--libro genesis --capitulo 1 --repeat 5]
+    python benchmarks.py startup [--modulo telegram_bot]
+    python benchmarks.py scrape <biblia.json|dir_fixtures> [--libros genesis,rut --concurrencia 1,4 --modos browser,http]
+    python benchmarks.py parse [<biblia.json|dir_fixtures>] [--repeat 5]
+    python benchmarks.py llm [--latency 0.3 --concurrencia 1,3]
+    python benchmarks.py batch [--capitulos 50 --fallos 2]
+    python benchmarks.py stream [--latency 0.3 --tts-latency 0.5]
+    python benchmarks.py limits [--hilos 4 --llamadas 10 --server-rps 5]
+    python benchmarks.py repair [--items 30]
+    python benchmarks.py json [--items 20 --rotos 0.4]
+    python benchmarks.py hedge [--llamadas 200 --tail 0.05 --factor 20 --max-extra 0.1]
+    python benchmarks.py cascade [--capitulos 20 --fallos 0.15]
+    python benchmarks.py tts [--audios 60 --latency 0.2 --workers 1,3,8]
+    python benchmarks.py tts-cache [--audios 30 --latency 0.2]
+    python benchmarks.py tts-chunks [--largos 300,800,1600,3200 --workers 8]
+    python benchmarks.py worker [--capitulos 5 --carga 2 --frames 0.3]
+"""
+import argparse
+import asyncio
+import json
+import re
+import tempfile
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+def _medir(fn, repeat: int) -> dict:
+    tiempos = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - t0)
+    return {
+        "min_ms": min(tiempos) * 1000,
+        "median_ms": statistics.median(tiempos) * 1000,
+    }
+
+
+def _imprimir(nombre: str, r: dict):
+    print(f"  {nombre:32} min {r['min_ms']:9.3f} ms   mediana {r['median_ms']:9.3f} ms")
+
+
+# ============ BIBLIA: JSON vs índice .rvbi ============
+
+def bench_bible(json_path: str, libro: str, capitulo: int, repeat: int):
+    from bible_io import BibleIndex, BibleJSONProcessor, compile_bible, index_path_for
+
+    json_path = Path(json_path)
+    idx_path = index_path_for(json_path)
+
+    t0 = time.perf_counter()
+    compile_bible(json_path, idx_path)
+    print(f"Compilación: {(time.perf_counter() - t0) * 1000:.1f} ms "
+          f"({json_path.stat().st_size / 1024:.0f} KB JSON -> {idx_path.stat().st_size / 1024:.0f} KB índice)\n")
+
+    def via_json():
+        # Lo que hacía run_json en cada llamada
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        verses = data["libros"][libro][str(capitulo)]
+        "\n".join(f"{k}. {v}" for k, v in sorted(verses.items(), key=lambda x: int(x[0])))
+
+    def via_index_frio():
+        index = BibleIndex(idx_path)
+        index.iter_chapter_verses(libro, capitulo)
+        index.close()
+
+    processor = BibleJSONProcessor(json_path)
+
+    def via_index_compartido():
+        processor.format_chapter(libro, capitulo)
+
+    print(f"Leer {libro} {capitulo} ({repeat} repeticiones):")
+    _imprimir("json.load + capítulo", _medir(via_json, repeat))
+    _imprimir("abrir .rvbi + capítulo", _medir(via_index_frio, repeat))
+    _imprimir("format_chapter (índice abierto)", _medir(via_index_compartido, repeat))
+
+
+# ============ ARRANQUE: python -X importtime ============
+
+HEAVY_MODULES = ["torch", "diffusers", "mistralai", "elevenlabs"]
+
+
+def _importtime(codigo: str) -> tuple[list, bool, str]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        capture_output=True,
+        text=True,
+        cwd=Path(__file__).resolve().parent,
+    )
+    filas = []
+    for line in proc.stderr.splitlines():
+        # "import time:      self [us] |   cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cum_us, nombre = line[len("import time:"):].split("|", 2)
+        filas.append((nombre.strip(), int(self_us), int(cum_us)))
+    ok = proc.returncode == 0
+    return filas, ok, proc.stdout if ok else proc.stderr[-2000:]
+
+
+def bench_startup(modulo: str, top: int):
+    codigo = (
+        "import time; t0 = time.perf_counter(); "
+        f"import {modulo}; "
+        "t1 = time.perf_counter(); "
+        "print(f'{(t1 - t0) * 1000:.1f}'); "
+        "import sys; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    filas, ok, salida = _importtime(codigo)
+    if not ok:
+        print(f"No se pudo importar {modulo}:\n{salida}")
+        return
+
+    import_ms, cargados = (salida.strip().splitlines() + ["", ""])[:2]
+    print(f"import {modulo}: {import_ms} ms (hasta poder responder /libros, /status)")
+    print(f"Módulos pesados cargados al arrancar: {cargados or 'ninguno'}\n")
+
+    print(f"Top {top} imports por tiempo acumulado:")
+    for nombre, _, cum in sorted(filas, key=lambda f: f[2], reverse=True)[:top]:
+        print(f"  {cum / 1000:9.1f} ms  {nombre}")
+
+    # Costo que se evita al diferir: import en frío de cada módulo pesado
+    print("\nCosto evitado (import en frío, solo si está instalado):")
+    for heavy in HEAVY_MODULES:
+        filas_h, ok, _ = _importtime(f"import {heavy}")
+        total = next((cum for nombre, _, cum in filas_h if nombre == heavy), None)
+        if ok and total is not None:
+            print(f"  {total / 1000:9.1f} ms  {heavy}")
+
+
+# ============ SCRAPER: servidor local con capítulos grabados ============
+
+def _fixtures_dir(origen: str, libros: list, tmp: str) -> tuple[Path, dict]:
+    """Acepta un directorio de fixtures grabadas o un JSON desde el cual generarlas."""
+    from scraper_fixtures import write_fixtures_from_json
+
+    origen = Path(origen)
+    if origen.is_dir():
+        return origen, {}
+    write_fixtures_from_json(origen, tmp, books=libros)
+    with open(origen, "r", encoding="utf-8") as f:
+        esperado = {b: c for b, c in json.load(f).get("libros", {}).items() if b in libros}
+    return Path(tmp), esperado
+
+
+def bench_scrape(origen: str, libros: list, concurrencias: list, latency: float, rate: float | None,
+                 modos: list = ("browser",)):
+    from scraper import BibleScraper
+    from scraper_fixtures import FixtureServer
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixtures, esperado = _fixtures_dir(origen, libros, tmp)
+        with FixtureServer(fixtures, latency=latency) as server:
+            for modo, n in [(m, n) for m in modos for n in concurrencias]:
+                scraper = BibleScraper(
+                    concurrency=n, rate=rate, delay=0, base_url=server.base_url, fetch_mode=modo,
+                    checkpoint_path=Path(tmp) / f"checkpoint_{modo}_{n}.jsonl",
+                )
+                t0 = time.perf_counter()
+                asyncio.run(scraper.scrape_all(books_list=libros))
+                dt = time.perf_counter() - t0
+
+                estado = "sin referencia"
+                if esperado:
+                    distintos = [
+                        f"{b} {c}"
+                        for b, caps in esperado.items()
+                        for c, versos in caps.items()
+                        if dict(scraper.iter_book(b)).get(c) != versos
+                    ]
+                    estado = "OK" if not distintos else f"{len(distintos)} capítulos distintos: {distintos[:5]}"
+                print(f"\n>>> modo={modo} concurrencia={n}: {dt:.2f} s, stats={scraper.stats}, contra JSON: {estado}")
+
+
+# ============ PARSE_VERSES: tokenizer actual vs regex anterior ============
+
+# Corpus mínimo si no se da --origen (los casos con resultado esperado están en tests/test_scraper.py)
+PARSE_CASOS = [
+    "Libro 5\n1Este es el registro de la familia.\n2Y vivió el padre 130 años, y tuvo un hijo.\n"
+    "3Y fueron todos sus días 930 años; y murió.",
+    "1 Y dijo: ¿Dónde estás?\n2¿Quién te enseñó esto? 3 Y respondió: Yo lo oí.",
+    "1Y salieron los 12 Apóstoles.\n2Y eran como 5 Mil hombres.",
+]
+
+
+def _parse_verses_anterior(text):
+    """Copia del parser previo (regex perezosa con lookahead), solo para comparar."""
+    verses = {}
+    text = text.strip()
+    pattern = r'(\d+)\s*([^0-9]+?)(?=\d+\s*[A-ZÁÉÍÓÚÑ]|$)'
+    for match in re.finditer(pattern, text, re.DOTALL):
+        verse_text = re.sub(r'\s+', ' ', match.group(2).strip()).strip()
+        if verse_text:
+            verses[match.group(1)] = verse_text
+    return verses
+
+
+def _parse_corpus(origen: str | None) -> list:
+    """[(nombre, texto)] desde el corpus mínimo, un JSON o fixtures grabadas."""
+    from scraper import extract_page_text
+
+    corpus = [(f"caso_{i}", texto) for i, texto in enumerate(PARSE_CASOS, 1)]
+    if not origen:
+        return corpus
+
+    origen = Path(origen)
+    if origen.is_dir():
+        for path in sorted(origen.rglob("*.html")) + sorted(origen.rglob("*.txt")):
+            raw = path.read_text(encoding="utf-8")
+            texto = extract_page_text(raw)[0] if path.suffix == ".html" else raw
+            corpus.append((str(path.relative_to(origen)), texto))
+        return corpus
+
+    with open(origen, "r", encoding="utf-8") as f:
+        libros = json.load(f).get("libros", {})
+    for libro, caps in libros.items():
+        for cap, versos in caps.items():
+            # Mismo formato que inner_text(): número pegado al texto, un versículo por línea
+            texto = f"{libro.title()} {cap}\n" + "\n".join(
+                f"{n}{t}" for n, t in sorted(versos.items(), key=lambda x: int(x[0]))
+            )
+            corpus.append((f"{libro} {cap}", texto))
+    return corpus
+
+
+def bench_parse(origen: str | None, repeat: int):
+    from scraper import BibleScraper
+
+    parser = BibleScraper(checkpoint_path=None)
+    corpus = _parse_corpus(origen)
+    print(f"Corpus: {len(corpus)} capítulos, {sum(len(t) for _, t in corpus) / 1024:.0f} KB\n")
+
+    def run(fn):
+        for _, texto in corpus:
+            fn(texto)
+
+    print(f"parse_verses ({repeat} repeticiones sobre todo el corpus):")
+    _imprimir("regex anterior", _medir(lambda: run(_parse_verses_anterior), repeat))
+    _imprimir("tokenizer de una pasada", _medir(lambda: run(parser.parse_verses), repeat))
+
+
+# ============ LLM: procesar_capitulo secuencial vs async ============
+
+def _prompts_llm():
+    # prompts.py puede no exponer todos los prompts; para el cliente falso da igual
+    import prompts
+    return [
+        getattr(prompts, nombre, nombre)
+        for nombre in ("PRINCIPAL_PROMPT", "SYSTEM_PROMPT_REFINER",
+                       "SYSTEM_PROMPT_SCRIPT_DOCTOR", "SYSTEM_PROMPT_ELEVEN_V3")
+    ]
+
+
+def _entorno_falso():
+    # Con clientes falsos: sin el limitador de config (no hay cuota que cuidar)
+    # y sin ensuciar las métricas reales de llm_metrics ni la caché de audios
+    from llm_metrics import set_metrics_path
+    from rate_limit import Provider, set_provider
+    from tts_pipeline import set_tts_cache_mode
+    for nombre in ("mistral", "elevenlabs"):
+        set_provider(nombre, Provider(nombre, requests_per_second=1e6))
+    set_metrics_path(None)
+    set_tts_cache_mode("off")
+
+
+def bench_llm(latency: float, concurrencias: list):
+    from disk_cache import DiskCache
+    from llm_fixtures import FakeMistral
+    from llm_pipeline import (
+        procesar_capitulo, procesar_capitulo_async, set_cache_mode, set_llm_cache,
+    )
+
+    prompts = _prompts_llm()
+    texto = "RUT 1\n1 Aconteció en los días que gobernaban los jueces."
+    print(f"Cliente falso con {latency * 1000:.0f} ms por llamada\n")
+    set_cache_mode("off")
+    _entorno_falso()
+
+    client = FakeMistral(latency=latency)
+    t0 = time.perf_counter()
+    esperado = procesar_capitulo(client, *prompts, texto)
+    print(f"  {'secuencial':32} {time.perf_counter() - t0:7.2f} s   {client.calls} llamadas")
+
+    for n in concurrencias:
+        client = FakeMistral(latency=latency)
+        t0 = time.perf_counter()
+        resultados = asyncio.run(procesar_capitulo_async(client, *prompts, texto, max_concurrency=n))
+        dt = time.perf_counter() - t0
+        igual = "igual" if resultados == esperado else "DISTINTO"
+        print(f"  {f'async concurrencia={n}':32} {dt:7.2f} s   {client.calls} llamadas   {igual}")
+
+    # Re-ejecución con la caché de respuestas en un directorio temporal
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = DiskCache(tmp)
+        set_llm_cache(cache)
+        set_cache_mode("on")
+        try:
+            for nombre in ("caché fría", "caché caliente"):
+                client = FakeMistral(latency=latency)
+                t0 = time.perf_counter()
+                resultados = asyncio.run(procesar_capitulo_async(client, *prompts, texto))
+                dt = time.perf_counter() - t0
+                igual = "igual" if resultados == esperado else "DISTINTO"
+                print(f"  {nombre:32} {dt * 1000:7.1f} ms  {client.calls} llamadas   {igual}")
+            for etapa, st in sorted(cache.stats().items()):
+                print(f"    {etapa:10} aciertos {st['hits']}/{st['hits'] + st['misses']}")
+        finally:
+            cache.close()
+            set_llm_cache(None)
+
+
+def bench_batch(n_capitulos: int, fallos: int, job_latency: float):
+    from llm_batch import procesar_capitulos_batch
+    from llm_fixtures import FakeBatchMistral, FakeMistral
+    from llm_pipeline import procesar_capitulo, set_cache_mode
+
+    set_cache_mode("off")
+    _entorno_falso()
+    prompts = _prompts_llm()
+    textos = {cap: f"GENESIS {cap}\n1 En el principio." for cap in range(1, n_capitulos + 1)}
+
+    client = FakeMistral()
+    t0 = time.perf_counter()
+    esperado = {cap: procesar_capitulo(client, *prompts, texto) for cap, texto in textos.items()}
+    print(f"  {'síncrono, capítulo a capítulo':32} {client.calls:6} llamadas HTTP   {time.perf_counter() - t0:6.2f} s")
+
+    fail_ids = {f"{cap}:0" for cap in range(1, fallos + 1)}
+    client = FakeBatchMistral(job_latency=job_latency, fail_ids=fail_ids)
+    t0 = time.perf_counter()
+    resultados = procesar_capitulos_batch(client, *prompts, textos, poll_interval=job_latency / 4 or 0.01)
+    dt = time.perf_counter() - t0
+    igual = "igual" if resultados == esperado else "DISTINTO"
+    print(
+        f"  {'batch':32} {len(client.jobs):6} jobs ({client.batch_requests} peticiones, "
+        f"{client.calls} reintentos síncronos)   {dt:6.2f} s   {igual}"
+    )
+
+
+def bench_stream(latency: float, tts_latency: float, jitter: float):
+    from llm_fixtures import FakeMistral
+    from llm_pipeline import procesar_capitulo_async, iter_capitulo_async, set_cache_mode
+    from tts_fixtures import FakeElevenLabs
+    from tts_pipeline import extraer_guiones_para_tts, procesar_lote_audios, procesar_stream_audios
+
+    set_cache_mode("off")
+    _entorno_falso()
+    prompts = _prompts_llm()
+    texto = "RUT 1\n1. Aconteció en los días que gobernaban los jueces."
+    print(f"LLM falso {latency * 1000:.0f} ms/llamada (±{jitter:.0%}), TTS falso {tts_latency * 1000:.0f} ms/audio\n")
+
+    def primer_audio(carpeta: str, t0: float) -> float:
+        mtimes = [p.stat().st_mtime for p in Path(carpeta).rglob("*.mp3")]
+        return min(mtimes) - t0 if mtimes else float("nan")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        salida = str(Path(tmp) / "lote")
+        t0 = time.time()
+        resultados = asyncio.run(procesar_capitulo_async(FakeMistral(latency=latency, jitter=jitter), *prompts, texto))
+        procesar_lote_audios(FakeElevenLabs(latency=tts_latency), extraer_guiones_para_tts(resultados),
+                             base_output=salida)
+        total = time.time() - t0
+        print(f"  {'LLM completo y luego TTS':32} primer audio {primer_audio(salida, t0):5.2f} s   total {total:5.2f} s")
+
+        salida = str(Path(tmp) / "stream")
+        items = iter_capitulo_async(FakeMistral(latency=latency, jitter=jitter), *prompts, texto)
+
+        async def solo_items():
+            async for _, item in items:
+                yield item
+
+        t0 = time.time()
+        asyncio.run(procesar_stream_audios(FakeElevenLabs(latency=tts_latency), solo_items(), base_output=salida))
+        total = time.time() - t0
+        print(f"  {'tubería LLM -> TTS':32} primer audio {primer_audio(salida, t0):5.2f} s   total {total:5.2f} s")
+
+
+def bench_limits(hilos: int, llamadas: int, server_rps: float):
+    from concurrent.futures import ThreadPoolExecutor
+    from bible_io import retry
+    from llm_fixtures import FakeMistral
+    from rate_limit import CircuitOpenError, Provider
+
+    request = {"model": "m", "messages": [{"role": "user", "content": "hola"}], "max_tokens": 10}
+    print(f"{hilos} hilos x {llamadas} llamadas contra un servidor que acepta {server_rps:g} peticiones/s\n")
+
+    def correr(nombre, client, llamar):
+        fallos = []
+
+        def hilo(_):
+            for _ in range(llamadas):
+                try:
+                    llamar(lambda: client.chat.complete(**request))
+                except Exception as e:
+                    fallos.append(e)
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(hilos) as ex:
+            list(ex.map(hilo, range(hilos)))
+        dt = time.perf_counter() - t0
+        print(f"  {nombre:32} {dt:6.2f} s   429 recibidos {client.rejected:4}   llamadas fallidas {len(fallos)}")
+
+    client = FakeMistral(latency=0.02, server_rps=server_rps, retry_after=1.0)
+    correr("retry ciego (bible_io.retry)", client, retry)
+
+    client = FakeMistral(latency=0.02, server_rps=server_rps, retry_after=1.0)
+    # Un poco por debajo del límite del servidor, como se configuraría MISTRAL_RPS
+    provider = Provider("mistral", requests_per_second=server_rps * 0.9, burst=1)
+    correr("limitador compartido", client, provider.call)
+
+    client = FakeMistral(latency=0.02)
+    client.down = True
+    provider = Provider("mistral", requests_per_second=1000, failure_threshold=5, reset_timeout=30, backoff=1.1)
+    rapidas = 0
+    t0 = time.perf_counter()
+    for _ in range(20):
+        try:
+            provider.call(lambda: client.chat.complete(**request))
+        except CircuitOpenError:
+            rapidas += 1
+        except Exception:
+            pass
+    dt = time.perf_counter() - t0
+    print(f"\n  Proveedor caído, 20 llamadas: {client.calls} llegaron al servidor, "
+          f"{rapidas} cortadas por el circuito, {dt:.2f} s")
+
+
+def bench_repair(n_items: int):
+    import random
+    from llm_fixtures import FakeMistral, respuesta_por_defecto
+    from llm_pipeline import (
+        campos_invalidos, refinar_video_llm, reparar_refinado_llm, set_cache_mode,
+    )
+
+    set_cache_mode("off")
+    _entorno_falso()
+    refiner = _prompts_llm()[1]
+    rng = random.Random(7)
+
+    def roto(request):
+        # Refinado con 1-3 campos perdidos o con otro tipo de dato, como en producción
+        content = respuesta_por_defecto(request)
+        if not request["messages"][-1]["content"].startswith("Refine this video"):
+            return content
+        item = json.loads(content)
+        if item.get("tipo") == "ORACION":
+            item.pop("prompt_imagen", None)
+            return json.dumps(item)
+        for _ in range(rng.randint(1, 3)):
+            if rng.random() < 0.5:
+                item["secuencia_visual"].pop(f"frame_{rng.randint(1, 6)}", None)
+            else:
+                k = rng.randint(1, 5)
+                item["transiciones"][f"transicion_{k}_{k+1}"] = {"tipo": "corte"}
+        return json.dumps(item)
+
+    base = json.loads(respuesta_por_defecto({"messages": [{"content": "Capítulo a analizar"}]}))["contenido"]
+    items = [base[i % len(base)] for i in range(n_items)]
+
+    client = FakeMistral(responder=roto)
+    refinados = [refinar_video_llm(client, refiner, item) for item in items]
+    rotos = [(item, r) for item, r in zip(items, refinados) if campos_invalidos(r)]
+    print(f"{len(rotos)}/{n_items} refinados con campos faltantes o rotos\n")
+
+    # Reintento completo: otra llamada de refinado entera por cada item roto
+    completo = FakeMistral()
+    for item, _ in rotos:
+        refinar_video_llm(completo, refiner, item)
+
+    reparacion = FakeMistral()
+    recuperados = sum(1 for item, r in rotos if reparar_refinado_llm(reparacion, item, r) is not None)
+
+    for nombre, c in (("reintento completo", completo), ("reparación dirigida", reparacion)):
+        print(f"  {nombre:24} {c.calls:4} llamadas   tokens entrada {c.prompt_tokens:7}   salida {c.completion_tokens:6}")
+    print(f"\n  Recuperados con reparación: {recuperados}/{len(rotos)}")
+
+
+def bench_json(n_items: int, fraccion: float, latency: float):
+    import random
+    import llm_pipeline
+    from llm_fixtures import FakeMistral, respuesta_por_defecto
+    from llm_metrics import aggregate, load_records, set_metrics_path
+    from llm_pipeline import refinar_video_llm, set_cache_mode, validate_video_structure
+
+    set_cache_mode("off")
+    _entorno_falso()
+    refiner = _prompts_llm()[1]
+
+    def malformado(texto: str, rng) -> str:
+        # Los defectos que se ven en producción: fences, comas colgantes, comentarios, corte por max_tokens
+        defecto = rng.choice(("fence", "coma", "comentario", "truncado"))
+        if defecto == "fence":
+            return f"Aquí está el JSON refinado:\n```json\n{texto}\n```"
+        if defecto == "coma":
+            return texto[:-1] + ",}"
+        if defecto == "comentario":
+            return texto.replace("{", "{ // refinado\n", 1)
+        return texto[: int(len(texto) * rng.uniform(0.6, 0.95))]
+
+    def responder_con_fallos():
+        rng = random.Random(11)
+        vistos = set()
+
+        def responder(request):
+            content = respuesta_por_defecto(request)
+            user = request["messages"][-1]["content"]
+            # Solo la primera respuesta de cada item sale rota; el reintento sale bien
+            if user.startswith("Refine this video") and user not in vistos:
+                vistos.add(user)
+                if rng.random() < fraccion:
+                    return malformado(content, rng)
+            return content
+        return responder
+
+    base = json.loads(respuesta_por_defecto({"messages": [{"content": "Capítulo a analizar"}]}))["contenido"]
+    items = []
+    for i in range(n_items):
+        item = dict(base[i % len(base)])
+        item["referencia"] = f"Rut 1:{i + 1}"  # peticiones distintas
+        items.append(item)
+
+    print(f"{n_items} refinados, ~{fraccion:.0%} con JSON mal formado, latencia {latency} s\n")
+    parse_original = llm_pipeline._parse_json
+    with tempfile.TemporaryDirectory() as tmp:
+        for nombre, parse in (("json.loads + reintento", json.loads), ("reparación local", parse_original)):
+            path = Path(tmp) / f"{len(nombre)}.jsonl"
+            set_metrics_path(path)
+            llm_pipeline._parse_json = parse
+            client = FakeMistral(latency=latency, responder=responder_con_fallos())
+            t0 = time.perf_counter()
+            try:
+                validos = sum(1 for item in items if validate_video_structure(refinar_video_llm(client, refiner, item)))
+            finally:
+                llm_pipeline._parse_json = parse_original
+            total = time.perf_counter() - t0
+            f = aggregate(load_records(path), "etapa").get("refinar", {})
+            print(f"  {nombre:24} {total:6.2f} s   {client.calls:3} llamadas   "
+                  f"tokens entrada {client.prompt_tokens:6}   válidos {validos}/{n_items}   "
+                  f"reparados {f.get('json_repairs', 0)}   reintentos {f.get('retries', 0)}")
+    set_metrics_path(None)
+    print("\n  (un refinado truncado no se repara localmente: se reintenta, para no guardar uno incompleto)")
+
+
+def bench_hedge(llamadas: int, latency: float, tail: float, factor: float, max_extra: float):
+    from hedging import Hedger, set_hedger
+    from llm_fixtures import FakeMistral, respuesta_por_defecto
+    from llm_pipeline import refinar_video_llm, set_cache_mode
+    from tts_fixtures import FakeElevenLabs
+    from tts_pipeline import generar_audio_tts
+
+    set_cache_mode("off")
+    _entorno_falso()
+    refiner = _prompts_llm()[1]
+    item = json.loads(respuesta_por_defecto({"messages": [{"content": "Capítulo a analizar"}]}))["contenido"][0]
+
+    def percentiles(tiempos):
+        t = sorted(tiempos)
+        return {q: t[min(len(t) - 1, int(q / 100 * len(t)))] for q in (50, 95, 99)}
+
+    def correr(nombre, llamar, client):
+        tiempos = []
+        for i in range(llamadas):
+            t0 = time.perf_counter()
+            llamar(client, i)
+            tiempos.append(time.perf_counter() - t0)
+        p = percentiles(tiempos)
+        print(f"  {nombre:22} p50 {p[50]:6.3f} s   p95 {p[95]:6.3f} s   p99 {p[99]:6.3f} s   "
+              f"total {sum(tiempos):6.2f} s   peticiones {client.calls}")
+
+    def refinar(client, i):
+        refinar_video_llm(client, refiner, {**item, "referencia": f"Rut 1:{i}"})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def sintetizar(client, i):
+            generar_audio_tts(client, "Y aconteció en los días que gobernaban los jueces.", f"a{i}", output_folder=tmp,
+                              quiet=True)
+
+        print(f"{llamadas} llamadas secuenciales, {tail:.0%} tardan {factor:g}x; duplicados máx. {max_extra:.0%}\n")
+        for proveedor, etiqueta, llamar, nuevo in (
+            ("mistral", "LLM", refinar, lambda: FakeMistral(latency=latency, jitter=0.2, tail=(tail, factor))),
+            ("elevenlabs", "TTS", sintetizar, lambda: FakeElevenLabs(latency=latency, tail=(tail, factor))),
+        ):
+            print(f"{etiqueta}:")
+            set_hedger(proveedor, None)
+            correr("sin hedging", llamar, nuevo())
+            hedger = Hedger(proveedor, max_extra=max_extra)
+            set_hedger(proveedor, hedger)
+            correr("con hedging", llamar, nuevo())
+            set_hedger(proveedor, None)
+            st = hedger.stats
+            print(f"  duplicadas {st['hedged']} ({st['hedged'] / st['requests']:.1%}), ganó el duplicado "
+                  f"{st['hedge_wins']}, el original {st['original_wins']}, denegadas por tope {st['denied']}\n")
+
+
+def bench_cascade(capitulos: int, fallos: float):
+    import random
+    from llm_fixtures import FakeMistral, respuesta_por_defecto
+    from llm_metrics import aggregate, load_records, set_metrics_path
+    from llm_pipeline import cascade_stats, procesar_capitulo, set_cache_mode, set_cascade_mode
+
+    set_cache_mode("off")
+    _entorno_falso()
+    prompts = _prompts_llm()
+    texto = "RUT 1\n1 Aconteció en los días que gobernaban los jueces."
+    # Proporciones de latencia entre modelos, escaladas para que el bench sea corto
+    latencias = {"mistral-small-latest": 0.02, "mistral-medium-latest": 0.05, "mistral-large-latest": 0.1}
+
+    def responder_con_fallos():
+        rng = random.Random(5)
+
+        def responder(request):
+            content = respuesta_por_defecto(request)
+            if request["model"] != "mistral-small-latest" or rng.random() >= fallos:
+                return content
+            # El modelo chico a veces pierde campos o se queda corto
+            user = request["messages"][-1]["content"]
+            if user.startswith("Refine this video"):
+                item = json.loads(content)
+                item.get("secuencia_visual", {}).pop("frame_6", None)
+                item.pop("prompt_imagen", None)
+                return json.dumps(item)
+            if "TEXTO BASE:" in user:
+                return "Hubo hambre en Belén."
+            return content
+        return responder
+
+    print(f"{capitulos} capítulos (procesar_capitulo), el modelo chico falla el chequeo ~{fallos:.0%} de las veces\n")
+    with tempfile.TemporaryDirectory() as tmp:
+        for nombre, cascada in (("modelos fijos", False), ("cascada", True)):
+            set_cascade_mode(cascada)
+            cascade_stats(reset=True)
+            path = Path(tmp) / f"{nombre}.jsonl"
+            set_metrics_path(path)
+            client = FakeMistral(latency=latencias, responder=responder_con_fallos())
+            tiempos = []
+            for _ in range(capitulos):
+                t0 = time.perf_counter()
+                procesar_capitulo(client, *prompts, texto)
+                tiempos.append(time.perf_counter() - t0)
+            costo = sum(f["cost_usd"] for f in aggregate(load_records(path), "etapa").values())
+            print(f"  {nombre:14} mediana {statistics.median(tiempos):6.3f} s/capítulo   "
+                  f"{client.calls:4} llamadas   US$ {costo:.4f}")
+            for etapa, st in sorted(cascade_stats().items()):
+                print(f"      {etapa:10} escaladas {st['escaladas']}/{st['llamadas']} "
+                      f"({st['escaladas'] / st['llamadas']:.0%})")
+    set_cascade_mode(False)
+    set_metrics_path(None)
+
+
+def bench_tts(audios: int, latency: float, workers: list):
+    import contextlib
+    import io
+    from tts_fixtures import FakeElevenLabs
+    from tts_pipeline import procesar_lote_audios
+
+    _entorno_falso()
+    lote = [
+        {"tipo": ("HISTORIA", "CURIOSIDAD", "ORACION")[i % 3], "nombre": f"Libro_{i // 3 + 1}_{i % 3}",
+         "guion_final": "Y aconteció en los días que gobernaban los jueces. " * (1 + i % 4)}
+        for i in range(audios)
+    ]
+    print(f"{audios} audios, TTS falso {latency * 1000:.0f} ms/audio (10% tardan 5x)\n")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in workers:
+            client = FakeElevenLabs(latency=latency, tail=(0.1, 5.0))
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                reporte = procesar_lote_audios(client, lote, base_output=str(Path(tmp) / str(n)), max_workers=n)
+            total = time.perf_counter() - t0
+            print(f"  {n:2} workers   {total:6.2f} s   {len(reporte['procesados'])}/{audios} audios")
+
+
+def bench_tts_cache(audios: int, latency: float):
+    import contextlib
+    import io
+    from disk_cache import DiskCache
+    from tts_fixtures import FakeElevenLabs
+    from tts_pipeline import procesar_lote_audios, set_tts_cache, set_tts_cache_mode
+
+    _entorno_falso()
+    lote = [
+        {"tipo": ("HISTORIA", "CURIOSIDAD", "ORACION")[i % 3], "nombre": f"Rut_{i // 3 + 1}_{i % 3}",
+         "guion_final": f"Capítulo {i // 3 + 1}, parte {i % 3 + 1}. Y aconteció en los días que gobernaban los jueces. " * 3}
+        for i in range(audios)
+    ]
+    print(f"{audios} audios, TTS falso {latency * 1000:.0f} ms/audio, 1 worker\n")
+    with tempfile.TemporaryDirectory() as tmp:
+        set_tts_cache(DiskCache(Path(tmp) / "cache"))
+        set_tts_cache_mode("on")
+        # 1ª vuelta: /full cancelado a mitad; 2ª: /tts completo; 3ª: /tts otra vez
+        for nombre, cantidad in (("mitad (cancelado)", audios // 2), ("completo", audios), ("repetido", audios)):
+            client = FakeElevenLabs(latency=latency)
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                reporte = procesar_lote_audios(client, lote[:cantidad], base_output=str(Path(tmp) / "out"),
+                                               max_workers=1)
+            total = time.perf_counter() - t0
+            caracteres = sum(len(r["text"]) for r in client.requests)
+            print(f"  {nombre:18} {total:6.2f} s   {client.calls:3} síntesis   {caracteres:6} caracteres   "
+                  f"{sum(1 for r in reporte['procesados'] if r.get('cached'))}/{cantidad} de caché")
+        set_tts_cache(None)
+        set_tts_cache_mode("off")
+
+
+def bench_tts_chunks(largos: list, latency: float, char_latency: float, workers: int):
+    import contextlib
+    import io
+    from mp3_frames import frames_mp3
+    from tts_fixtures import FakeElevenLabs
+    from tts_pipeline import generar_audio_tts, set_chunked_mode
+
+    _entorno_falso()
+    frase = "Y aconteció en los días que gobernaban los jueces, que hubo hambre en la tierra. "
+    print(f"TTS falso {latency * 1000:.0f} ms + {char_latency * 1000:.2f} ms/carácter por petición, "
+          f"{workers} fragmentos a la vez\n")
+    print(f"  {'caracteres':>10} {'una petición':>13} {'por frases':>11} {'fragmentos':>10} {'frames (frases / una)':>22}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for largo in largos:
+            texto = (frase * (largo // len(frase) + 1))[:largo].rsplit(" ", 1)[0] + "."
+            tiempos = {}
+            frames = {}
+            for por_frases in (False, True):
+                set_chunked_mode(por_frases, workers=workers)
+                client = FakeElevenLabs(latency=latency, char_latency=char_latency, tags=True)
+                carpeta = Path(tmp) / str(por_frases)
+                t0 = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    r = generar_audio_tts(client, texto, f"g{largo}", output_folder=str(carpeta))
+                tiempos[por_frases] = time.perf_counter() - t0
+                frames[por_frases] = frames_mp3(Path(r["file"]).read_bytes())[1]
+                if por_frases:
+                    n = r.get("fragmentos", 1)
+            # Cada parte pierde su frame Info y redondea su duración a frames enteros
+            print(f"  {largo:10} {tiempos[False]:12.2f}s {tiempos[True]:10.2f}s {n:10} "
+                  f"{frames[True]:14} / {frames[False]}")
+    set_chunked_mode(False)
+
+
+def bench_worker(capitulos: int, carga: float, frames: float):
+    import threading
+    from multiprocessing.connection import Listener
+    from image_worker import ImageWorker, _pedir, generar_en_worker, ping
+
+    def cargar():
+        time.sleep(carga)  # simula GGUF + ZImagePipeline a la GPU
+        return object()
+
+    def generar(pipeline, json_path, output_root, libro, capitulo):
+        time.sleep(frames)
+
+    print(f"Carga simulada {carga:.1f} s, generación {frames:.1f} s por capítulo, {capitulos} capítulos\n")
+
+    # Antes: cada capítulo carga el modelo en su propio proceso
+    t0 = time.perf_counter()
+    for _ in range(capitulos):
+        generar(cargar(), "", "", None, None)
+    en_proceso = time.perf_counter() - t0
+
+    # Puerto libre elegido por el SO (el worker real usa IMAGE_WORKER_PORT)
+    sonda = Listener(("127.0.0.1", 0), authkey=b"bench")
+    address = sonda.address
+    sonda.close()
+    worker = ImageWorker(address=address, authkey=b"bench", idle_timeout=3600, cargar=cargar, generar=generar)
+    threading.Thread(target=worker.serve, daemon=True).start()
+    while ping(address, b"bench") is None:
+        time.sleep(0.05)
+
+    tiempos = []
+    with tempfile.NamedTemporaryFile(suffix=".json") as f:
+        for _ in range(capitulos):
+            t0 = time.perf_counter()
+            generar_en_worker(f.name, address=address, authkey=b"bench")
+            tiempos.append(time.perf_counter() - t0)
+    estado = ping(address, b"bench")
+    _pedir({"op": "shutdown"}, address, b"bench")
+
+    print(f"  {'modo':14} {'total':>8} {'1er cap.':>9} {'siguientes':>11} {'cargas':>7}")
+    print(f"  {'en proceso':14} {en_proceso:7.2f}s {en_proceso / capitulos:8.2f}s "
+          f"{en_proceso / capitulos:10.2f}s {capitulos:7}")
+    siguientes = statistics.mean(tiempos[1:]) if len(tiempos) > 1 else 0.0
+    print(f"  {'worker':14} {sum(tiempos):7.2f}s {tiempos[0]:8.2f}s {siguientes:10.2f}s {estado['loads']:7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del pipeline")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_bible = sub.add_parser("bible", help="Carga del JSON completo vs índice mmap")
+    p_bible.add_argument("json_path")
+    p_bible.add_argument("--libro", default="genesis")
+    p_bible.add_argument("--capitulo", type=int, default=1)
+    p_bible.add_argument("--repeat", type=int, default=5)
+
+    p_startup = sub.add_parser("startup", help="Tiempo de import del bot (python -X importtime)")
+    p_startup.add_argument("--modulo", default="telegram_bot")
+    p_startup.add_argument("--top", type=int, default=15)
+
+    p_scrape = sub.add_parser("scrape", help="BibleScraper contra un servidor local de fixtures")
+    p_scrape.add_argument("origen", help="JSON de la Biblia o directorio <libro>/<cap>.html")
+    p_scrape.add_argument("--libros", default="rut,jonas")
+    p_scrape.add_argument("--concurrencia", default="1,4")
+    p_scrape.add_argument("--latency", type=float, default=0.1, help="Latencia simulada por página (s)")
+    p_scrape.add_argument("--rate", type=float, default=None, help="Peticiones/s máximas al host")
+    p_scrape.add_argument("--modos", default="browser,http", help="browser, http o ambos")
+
+    p_parse = sub.add_parser("parse", help="parse_verses actual vs regex anterior")
+    p_parse.add_argument("origen", nargs="?", default=None, help="JSON de la Biblia o directorio de fixtures")
+    p_parse.add_argument("--repeat", type=int, default=5)
+
+    p_llm = sub.add_parser("llm", help="procesar_capitulo secuencial vs async (cliente falso)")
+    p_llm.add_argument("--latency", type=float, default=0.3, help="Latencia simulada por llamada (s)")
+    p_llm.add_argument("--concurrencia", default="1,3")
+
+    p_batch = sub.add_parser("batch", help="JSON de un libro: síncrono vs API de batch (cliente falso)")
+    p_batch.add_argument("--capitulos", type=int, default=50)
+    p_batch.add_argument("--fallos", type=int, default=2, help="Líneas que fallan en el batch")
+    p_batch.add_argument("--job-latency", type=float, default=0.2, help="Duración simulada de cada job (s)")
+
+    p_stream = sub.add_parser("stream", help="/json_tts: LLM y luego TTS vs tubería (clientes falsos)")
+    p_stream.add_argument("--latency", type=float, default=0.3, help="Latencia simulada por llamada LLM (s)")
+    p_stream.add_argument("--tts-latency", type=float, default=0.5, help="Latencia simulada por audio (s)")
+    p_stream.add_argument("--jitter", type=float, default=0.5, help="Variación relativa de la latencia LLM")
+
+    p_limits = sub.add_parser("limits", help="Retry ciego vs limitador compartido y circuit breaker")
+    p_limits.add_argument("--hilos", type=int, default=4)
+    p_limits.add_argument("--llamadas", type=int, default=10)
+    p_limits.add_argument("--server-rps", type=float, default=5)
+
+    p_repair = sub.add_parser("repair", help="Refinado roto: reintento completo vs reparación dirigida")
+    p_repair.add_argument("--items", type=int, default=30)
+
+    p_json = sub.add_parser("json", help="JSON mal formado: reintento pagado vs reparación local")
+    p_json.add_argument("--items", type=int, default=20)
+    p_json.add_argument("--rotos", type=float, default=0.4, help="Fracción de respuestas mal formadas")
+    p_json.add_argument("--latency", type=float, default=0.3, help="Latencia simulada por llamada (s)")
+
+    p_hedge = sub.add_parser("hedge", help="Cola de latencia: sin vs con hedging (clientes falsos)")
+    p_hedge.add_argument("--llamadas", type=int, default=200)
+    p_hedge.add_argument("--latency", type=float, default=0.02, help="Latencia simulada típica (s)")
+    p_hedge.add_argument("--tail", type=float, default=0.05, help="Fracción de llamadas lentas")
+    p_hedge.add_argument("--factor", type=float, default=20, help="Cuánto más tarda una llamada lenta")
+    p_hedge.add_argument("--max-extra", type=float, default=0.1, help="Tope de peticiones duplicadas")
+
+    p_cascade = sub.add_parser("cascade", help="Modelos fijos vs cascada chico -> grande (cliente falso)")
+    p_cascade.add_argument("--capitulos", type=int, default=20)
+    p_cascade.add_argument("--fallos", type=float, default=0.15, help="Fracción de salidas del modelo chico que no pasan el chequeo")
+
+    p_tts = sub.add_parser("tts", help="procesar_lote_audios secuencial vs pool de hilos (cliente falso)")
+    p_tts.add_argument("--audios", type=int, default=60)
+    p_tts.add_argument("--latency", type=float, default=0.2, help="Latencia simulada por audio (s)")
+    p_tts.add_argument("--workers", default="1,3,8")
+
+    p_tts_cache = sub.add_parser("tts-cache", help="Re-sintetizar vs caché de audios (cliente falso)")
+    p_tts_cache.add_argument("--audios", type=int, default=30)
+    p_tts_cache.add_argument("--latency", type=float, default=0.2, help="Latencia simulada por audio (s)")
+
+    p_tts_chunks = sub.add_parser("tts-chunks", help="Guion largo: una petición vs fragmentos en paralelo")
+    p_tts_chunks.add_argument("--largos", default="300,800,1600,3200", help="Caracteres de cada guion")
+    p_tts_chunks.add_argument("--latency", type=float, default=0.1, help="Latencia fija por petición (s)")
+    p_tts_chunks.add_argument("--char-latency", type=float, default=0.0005, help="Latencia por carácter (s)")
+    p_tts_chunks.add_argument("--workers", type=int, default=8, help="Fragmentos sintetizados a la vez")
+
+    p_worker = sub.add_parser("worker", help="Carga de Z-Image por capítulo vs worker residente (simulado)")
+    p_worker.add_argument("--capitulos", type=int, default=5)
+    p_worker.add_argument("--carga", type=float, default=2.0, help="Segundos de carga del modelo")
+    p_worker.add_argument("--frames", type=float, default=0.3, help="Segundos de generación por capítulo")
+
+    args = parser.parse_args()
+    if args.cmd == "bible":
+        bench_bible(args.json_path, args.libro, args.capitulo, args.repeat)
+    elif args.cmd == "startup":
+        bench_startup(args.modulo, args.top)
+    elif args.cmd == "scrape":
+        bench_scrape(
+            args.origen,
+            args.libros.split(","),
+            [int(n) for n in args.concurrencia.split(",")],
+            args.latency,
+            args.rate,
+            args.modos.split(","),
+        )
+    elif args.cmd == "parse":
+        bench_parse(args.origen, args.repeat)
+    elif args.cmd == "llm":
+        bench_llm(args.latency, [int(n) for n in args.concurrencia.split(",")])
+    elif args.cmd == "batch":
+        bench_batch(args.capitulos, args.fallos, args.job_latency)
+    elif args.cmd == "stream":
+        bench_stream(args.latency, args.tts_latency, args.jitter)
+    elif args.cmd == "limits":
+        bench_limits(args.hilos, args.llamadas, args.server_rps)
+    elif args.cmd == "repair":
+        bench_repair(args.items)
+    elif args.cmd == "json":
+        bench_json(args.items, args.rotos, args.latency)
+    elif args.cmd == "hedge":
+        bench_hedge(args.llamadas, args.latency, args.tail, args.factor, args.max_extra)
+    elif args.cmd == "cascade":
+        bench_cascade(args.capitulos, args.fallos)
+    elif args.cmd == "tts":
+        bench_tts(args.audios, args.latency, [int(n) for n in args.workers.split(",")])
+    elif args.cmd == "tts-cache":
+        bench_tts_cache(args.audios, args.latency)
+    elif args.cmd == "tts-chunks":
+        bench_tts_chunks([int(n) for n in args.largos.split(",")], args.latency, args.char_latency, args.workers)
+    elif args.cmd == "worker":
+        bench_worker(args.capitulos, args.carga, args.frames)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,14 @@
 # bible_io.py
+import bisect
 import json
+import mmap
+import os
+import re
+import struct
+import unicodedata
+from collections import OrderedDict
 from pathlib import Path
+from threading import Lock
 
 def log(msg: str):
     print(f"[LOG] {msg}")
@@ -9,6 +17,50 @@ def sanitize_text(txt: str, max_words: int = 3000) -> str:
     words = txt.split()
     return " ".join(words[:max_words])
 
+# Aproximación para español con tokenizers tipo Mistral (~3.5 caracteres por token).
+# Se prefiere sobreestimar: el presupuesto es para no pasarse, no para llenarlo al 100%.
+CHARS_PER_TOKEN = 3.2
+_VERSE_LINE_RE = re.compile(r"^(\d+)\.\s")
+
+def estimate_tokens(txt: str) -> int:
+    if not txt:
+        return 0
+    return int(len(txt) / CHARS_PER_TOKEN) + 1
+
+def chunk_chapter(texto: str, max_tokens: int) -> tuple[str, list]:
+    """
+    Divide un capítulo ya formateado (format_chapter) en fragmentos de como
+    mucho max_tokens, cortando solo entre versículos.
+    Devuelve (header, [{"desde", "hasta", "texto"}, ...]).
+    Un versículo que por sí solo excede el presupuesto va en su propio fragmento.
+    """
+    header_lines, verses = [], []
+    for line in texto.splitlines():
+        m = _VERSE_LINE_RE.match(line)
+        if m:
+            verses.append([int(m.group(1)), line])
+        elif verses:
+            verses[-1][1] += "\n" + line
+        else:
+            header_lines.append(line)
+
+    header = "\n".join(header_lines).strip()
+    chunks, current, used = [], [], 0
+    for num, line in verses:
+        cost = estimate_tokens(line)
+        if current and used + cost > max_tokens:
+            chunks.append(current)
+            current, used = [], 0
+        current.append((num, line))
+        used += cost
+    if current:
+        chunks.append(current)
+
+    return header, [
+        {"desde": c[0][0], "hasta": c[-1][0], "texto": "\n".join(line for _, line in c)}
+        for c in chunks
+    ]
+
 def retry(fn, attempts: int = 3, backoff: float = 1.5):
     import time, random
     for i in range(attempts):
@@ -19,21 +71,344 @@ def retry(fn, attempts: int = 3, backoff: float = 1.5):
                 raise
             time.sleep(backoff**i + random.uniform(0, 0.2))
 
+
+
+# ============ ÍNDICE COMPILADO (mmap) ============
+#
+# Formato del archivo .rvbi (little endian):
+#   header   : magic, n_libros, n_capitulos, n_versiculos, len_nombres,
+#              offset_blob, mtime_ns y tamaño del JSON de origen
+#   nombres  : nombres de libros en UTF-8 separados por "\n"
+#   libros   : n_libros    x (primer_capitulo, n_capitulos)
+#   capitulos: n_capitulos x (numero, primer_versiculo, n_versiculos)
+#   versos   : n_versiculos x (numero, offset, longitud)   # offset relativo al blob
+#   blob     : texto de todos los versículos en UTF-8, uno tras otro
+
+INDEX_SUFFIX = ".rvbi"
+_MAGIC = b"RVBIDX01"
+_HEADER = struct.Struct("<8sIIIIQQQ")
+_BOOK = struct.Struct("<II")
+_CHAPTER = struct.Struct("<III")
+_VERSE = struct.Struct("<III")
+
+
+def index_path_for(json_path: str | Path) -> Path:
+    return Path(json_path).with_suffix(INDEX_SUFFIX)
+
+
+def compile_bible(json_path: str | Path, out_path: str | Path | None = None) -> Path:
+    """
+    Convierte el JSON de la Biblia al formato indexado .rvbi.
+    Solo se guardan capítulos y versículos con clave numérica, ya ordenados.
+    """
+    json_path = Path(json_path)
+    out_path = Path(out_path) if out_path else index_path_for(json_path)
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    libros = data.get("libros", {})
+    book_rows, chapter_rows, verse_rows = [], [], []
+    blob = bytearray()
+
+    for book, chapters in libros.items():
+        nums = sorted(int(c) for c in chapters.keys() if c.isdigit())
+        book_rows.append((len(chapter_rows), len(nums)))
+        for num in nums:
+            verses = chapters[str(num)] or {}
+            v_nums = sorted(int(k) for k in verses.keys() if isinstance(k, str) and k.isdigit())
+            chapter_rows.append((num, len(verse_rows), len(v_nums)))
+            for v in v_nums:
+                raw = verses[str(v)].encode("utf-8")
+                verse_rows.append((v, len(blob), len(raw)))
+                blob += raw
+
+    names = "\n".join(libros.keys()).encode("utf-8")
+    blob_offset = (
+        _HEADER.size
+        + len(names)
+        + _BOOK.size * len(book_rows)
+        + _CHAPTER.size * len(chapter_rows)
+        + _VERSE.size * len(verse_rows)
+    )
+    src = json_path.stat()
+
+    tmp_path = out_path.with_suffix(out_path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(
+            _MAGIC, len(book_rows), len(chapter_rows), len(verse_rows),
+            len(names), blob_offset, src.st_mtime_ns, src.st_size,
+        ))
+        f.write(names)
+        f.write(b"".join(_BOOK.pack(*row) for row in book_rows))
+        f.write(b"".join(_CHAPTER.pack(*row) for row in chapter_rows))
+        f.write(b"".join(_VERSE.pack(*row) for row in verse_rows))
+        f.write(blob)
+    os.replace(tmp_path, out_path)
+
+    log(f"Índice compilado: {out_path} ({len(book_rows)} libros, "
+        f"{len(chapter_rows)} capítulos, {len(verse_rows)} versículos)")
+    return out_path
+
+
+class BibleIndex:
+    """
+    Acceso de solo lectura a un archivo .rvbi mapeado en memoria.
+    Al abrir solo se decodifican las tablas de libros y capítulos; los
+    versículos se leen bajo demanda con struct.unpack_from sobre el mmap.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, self.n_books, self.n_chapters, self.n_verses, names_len,
+         self._blob, self.source_mtime_ns, self.source_size) = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"Archivo de índice inválido: {self.path}")
+
+        pos = _HEADER.size
+        names = self._mm[pos:pos + names_len].decode("utf-8").split("\n") if names_len else []
+        pos += names_len
+
+        self._books = {}
+        for i, name in enumerate(names):
+            self._books[name] = _BOOK.unpack_from(self._mm, pos + i * _BOOK.size)
+        pos += _BOOK.size * self.n_books
+
+        self._chapters_at = pos
+        self._verses_at = pos + _CHAPTER.size * self.n_chapters
+
+        # Listas de capítulos ordenadas, una sola vez al abrir
+        self._chapter_lists = {
+            name: [self._chapter_row(first + i)[0] for i in range(n)]
+            for name, (first, n) in self._books.items()
+        }
+
+    @property
+    def closed(self) -> bool:
+        return self._mm.closed
+
+    def is_fresh_for(self, json_path: str | Path) -> bool:
+        try:
+            st = Path(json_path).stat()
+        except OSError:
+            # Sin JSON de origen el índice es la única fuente disponible
+            return True
+        return st.st_mtime_ns == self.source_mtime_ns and st.st_size == self.source_size
+
+    def list_books(self):
+        return list(self._books.keys())
+
+    def chapter_count(self, book: str) -> int:
+        entry = self._books.get(book)
+        return entry[1] if entry else 0
+
+    def _chapter_row(self, idx: int):
+        return _CHAPTER.unpack_from(self._mm, self._chapters_at + idx * _CHAPTER.size)
+
+    def list_chapters(self, book: str):
+        return list(self._chapter_lists.get(book, ()))
+
+    def _find_chapter(self, book: str, chapter: int):
+        entry = self._books.get(book)
+        if not entry:
+            return None
+        first, n = entry
+        # Caso normal: capítulos contiguos 1..n -> acceso directo
+        if 1 <= chapter <= n:
+            row = self._chapter_row(first + chapter - 1)
+            if row[0] == chapter:
+                return row
+        # Numeración con huecos: búsqueda binaria
+        lo, hi = 0, n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            row = self._chapter_row(first + mid)
+            if row[0] < chapter:
+                lo = mid + 1
+            elif row[0] > chapter:
+                hi = mid
+            else:
+                return row
+        return None
+
+    def iter_chapter_verses(self, book: str, chapter: int):
+        """Devuelve [(num, texto), ...] ordenado, o None si no existe."""
+        row = self._find_chapter(book, chapter)
+        if row is None:
+            return None
+        _, first_verse, n_verses = row
+        out = []
+        for i in range(n_verses):
+            num, off, length = _VERSE.unpack_from(self._mm, self._verses_at + (first_verse + i) * _VERSE.size)
+            start = self._blob + off
+            out.append((num, self._mm[start:start + length].decode("utf-8")))
+        return out
+
+    def close(self):
+        if not self._mm.closed:
+            self._mm.close()
+        self._file.close()
+
+
+# Índices y JSON compartidos por todos los BibleJSONProcessor del proceso.
+# Se revalidan contra (mtime_ns, tamaño) del JSON: un scrape o refresh en el
+# mismo proceso (el bot) no deja texto viejo en memoria.
+_INDEXES: dict = {}
+_JSON_DATA: dict = {}       # ruta -> (sello, data, {libro: [capítulos]})
+_STORE_LOCK = Lock()
+
+# Caché LRU de capítulos formateados: (ruta, sello, libro, capítulo, include_numbers) -> texto
+FORMAT_CACHE_SIZE = 256
+_FORMAT_CACHE: OrderedDict = OrderedDict()
+_FORMAT_STATS = {"hits": 0, "misses": 0}
+_FORMAT_LOCK = Lock()
+
+
+def format_cache_stats() -> dict:
+    with _FORMAT_LOCK:
+        return {**_FORMAT_STATS, "size": len(_FORMAT_CACHE), "max_size": FORMAT_CACHE_SIZE}
+
+
+def clear_format_cache():
+    with _FORMAT_LOCK:
+        _FORMAT_CACHE.clear()
+        _FORMAT_STATS["hits"] = 0
+        _FORMAT_STATS["misses"] = 0
+
+
+def _source_stamp(json_path: Path):
+    """(mtime_ns, tamaño) del JSON, o None si no existe."""
+    try:
+        st = json_path.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _open_index(json_path: Path) -> BibleIndex | None:
+    key = str(json_path.resolve())
+    with _STORE_LOCK:
+        index = _INDEXES.get(key)
+        if index is not None:
+            if index.is_fresh_for(json_path):
+                return index
+            # Se cierra antes de recompilar: en Windows os.replace no puede
+            # sustituir un archivo mapeado. Los processors que lo tenían lo
+            # ven desactualizado en su próximo _revalidar y piden el nuevo.
+            del _INDEXES[key]
+            index.close()
+            index = None
+
+        idx_path = index_path_for(json_path)
+        try:
+            if idx_path.exists():
+                index = BibleIndex(idx_path)
+                if not index.is_fresh_for(json_path):
+                    log(f"Índice desactualizado, recompilando: {idx_path}")
+                    index.close()
+                    index = None
+            if index is None:
+                if not json_path.exists():
+                    return None
+                compile_bible(json_path, idx_path)
+                index = BibleIndex(idx_path)
+        except (OSError, ValueError) as e:
+            log(f"⚠️ No se pudo usar el índice {idx_path}: {e}. Se usará el JSON.")
+            return None
+
+        _INDEXES[key] = index
+        return index
+
+
 class BibleJSONProcessor:
-    def __init__(self, json_path: str | Path):
+    def __init__(self, json_path: str | Path, use_index: bool = True):
         self.json_path = Path(json_path)
-        self.data = None
-        self.load_json()
+        self._data = None
+        self._stamp = None
+        self.index = _open_index(self.json_path) if use_index else None
+        if self.index is None:
+            self.load_json()
+
+    def _revalidar(self):
+        """Si el JSON cambió desde que se abrió, reabre el índice o recarga el JSON."""
+        if self.index is not None:
+            if self.index.closed or not self.index.is_fresh_for(self.json_path):
+                self.index = _open_index(self.json_path)
+                self._data = None
+                if self.index is None:
+                    self.load_json()
+        elif self._data is not None and self._stamp != _source_stamp(self.json_path):
+            self.load_json()
+
+    @property
+    def data(self):
+        # Con índice el JSON completo solo se carga si alguien lo pide explícitamente
+        if self._data is None:
+            self.load_json()
+        return self._data
 
     def load_json(self):
-        with open(self.json_path, "r", encoding="utf-8") as f:
-            self.data = json.load(f)
+        key = str(self.json_path.resolve())
+        stamp = _source_stamp(self.json_path)
+        with _STORE_LOCK:
+            cached = _JSON_DATA.get(key)
+            if cached is None or cached[0] != stamp:
+                with open(self.json_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                chapters = {
+                    book: sorted(int(c) for c in caps.keys() if c.isdigit())
+                    for book, caps in data.get("libros", {}).items()
+                }
+                cached = _JSON_DATA[key] = (stamp, data, chapters)
+            self._stamp, self._data, self._chapter_lists = cached
 
     def get_chapter(self, book: str, chapter: int):
+        self._revalidar()
+        if self.index is not None:
+            verses = self.index.iter_chapter_verses(book, chapter)
+            if verses is None:
+                return None
+            return {str(num): texto for num, texto in verses}
+
         books = self.data.get("libros", {})
         return books.get(book, {}).get(str(chapter), None)
 
     def format_chapter(self, book: str, chapter: int, include_numbers: bool = True) -> str:
+        self._revalidar()
+        # El sello del JSON en la clave: si cambió, las entradas viejas no se usan y salen por LRU
+        key = (str(self.json_path), _source_stamp(self.json_path), book, int(chapter), bool(include_numbers))
+        with _FORMAT_LOCK:
+            texto = _FORMAT_CACHE.get(key)
+            if texto is not None:
+                _FORMAT_CACHE.move_to_end(key)
+                _FORMAT_STATS["hits"] += 1
+                return texto
+            _FORMAT_STATS["misses"] += 1
+
+        texto = self._format_chapter(book, chapter, include_numbers)
+
+        with _FORMAT_LOCK:
+            _FORMAT_CACHE[key] = texto
+            _FORMAT_CACHE.move_to_end(key)
+            while len(_FORMAT_CACHE) > FORMAT_CACHE_SIZE:
+                _FORMAT_CACHE.popitem(last=False)
+        return texto
+
+    def _format_chapter(self, book: str, chapter: int, include_numbers: bool) -> str:
+        if self.index is not None:
+            # El índice ya guarda solo versículos numéricos y en orden
+            verses = self.index.iter_chapter_verses(book, chapter)
+            if verses is None:
+                return ""
+            header = f"{book} - Capítulo {chapter}\n" + "=" * 40 + "\n\n"
+            if not verses:
+                return header.strip()
+            lines = [f"{num}. {texto}" if include_numbers else texto for num, texto in verses]
+            return header + "\n".join(lines)
+
         data = self.get_chapter(book, chapter)
         if not data:
             return ""
@@ -62,17 +437,279 @@ class BibleJSONProcessor:
 
     # NUEVO: lista los libros
     def list_books(self):
+        self._revalidar()
+        if self.index is not None:
+            return self.index.list_books()
         return list(self.data.get("libros", {}).keys())
 
-    # NUEVO: número de capítulos de un libro
+    # NUEVO: número de capítulos de un libro (solo claves numéricas, igual con o sin índice)
     def chapter_count(self, book: str) -> int:
-        libros = self.data.get("libros", {})
-        if book not in libros:
-            return 0
-        return len(libros[book])
+        self._revalidar()
+        if self.index is not None:
+            return self.index.chapter_count(book)
+        if self._data is None:
+            self.load_json()
+        return len(self._chapter_lists.get(book, ()))
 
     # NUEVO: lista capítulos disponibles de un libro
     def list_chapters(self, book: str):
-        libros = self.data.get("libros", {})
-        caps = libros.get(book, {})
-        return sorted(int(c) for c in caps.keys() if c.isdigit())
\ No newline at end of file
+        self._revalidar()
+        if self.index is not None:
+            return self.index.list_chapters(book)
+        if self._data is None:
+            self.load_json()
+        return list(self._chapter_lists.get(book, ()))
+
+    # NUEVO: versículos ordenados de un capítulo como [(num, texto), ...]
+    def chapter_verses(self, book: str, chapter: int):
+        self._revalidar()
+        if self.index is not None:
+            return self.index.iter_chapter_verses(book, chapter) or []
+        data = self.get_chapter(book, chapter) or {}
+        return sorted(
+            ((int(k), v) for k, v in data.items() if isinstance(k, str) and k.isdigit()),
+            key=lambda x: x[0],
+        )
+
+    # NUEVO: recorre toda la Biblia como (libro, capítulo, versículo, texto)
+    def iter_verses(self):
+        for book in self.list_books():
+            for chapter in self.list_chapters(book):
+                for num, texto in self.chapter_verses(book, chapter):
+                    yield book, chapter, num, texto
+
+    # NUEVO: búsqueda de texto completo (ver BibleSearchIndex)
+    def search(self, query: str, limit: int = 20):
+        return get_search_index(self).search(query, limit=limit)
+
+
+# ============ BÚSQUEDA DE TEXTO COMPLETO ============
+
+SEARCH_SUFFIX = ".search.json"
+_SEARCH_VERSION = 1
+_TOKEN_RE = re.compile(r"\w+")
+_QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def normalize_text(txt: str) -> str:
+    """Minúsculas y sin acentos: 'Él' -> 'el', 'Jehová' -> 'jehova'."""
+    decomposed = unicodedata.normalize("NFD", txt.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(txt: str) -> list:
+    return _TOKEN_RE.findall(normalize_text(txt))
+
+
+def search_path_for(json_path: str | Path) -> Path:
+    return Path(json_path).with_suffix(SEARCH_SUFFIX)
+
+
+class BibleSearchIndex:
+    """
+    Índice invertido término -> ids de versículo, normalizado sin acentos
+    ni mayúsculas. Consultas:
+      palabras sueltas  -> todas deben aparecer en el versículo
+      "frase exacta"    -> términos consecutivos
+      prefijo*          -> cualquier término que empiece así
+    """
+
+    def __init__(self, books: list, refs: list, postings: dict, source: dict | None = None):
+        self.books = books
+        self.refs = refs            # id -> [idx_libro, capítulo, versículo]
+        self.postings = postings    # término -> [ids ordenados]
+        self.source = source or {}
+        self.terms = sorted(postings)
+        self.processor = None
+
+    @classmethod
+    def build(cls, processor: "BibleJSONProcessor") -> "BibleSearchIndex":
+        books = processor.list_books()
+        book_ids = {b: i for i, b in enumerate(books)}
+        refs, postings = [], {}
+
+        for book, chapter, num, texto in processor.iter_verses():
+            vid = len(refs)
+            refs.append([book_ids[book], chapter, num])
+            for term in set(tokenize(texto)):
+                postings.setdefault(term, []).append(vid)
+
+        index = cls(books, refs, postings, _source_signature(processor.json_path))
+        index.processor = processor
+        log(f"Índice de búsqueda construido: {len(refs)} versículos, {len(postings)} términos")
+        return index
+
+    def save(self, path: str | Path):
+        path = Path(path)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": _SEARCH_VERSION,
+                    "source": self.source,
+                    "books": self.books,
+                    "refs": self.refs,
+                    "postings": self.postings,
+                },
+                f,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "BibleSearchIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        if raw.get("version") != _SEARCH_VERSION:
+            raise ValueError(f"Versión de índice de búsqueda no soportada: {path}")
+        return cls(raw["books"], raw["refs"], raw["postings"], raw.get("source"))
+
+    def _ids_for_term(self, term: str) -> set:
+        return set(self.postings.get(term, ()))
+
+    def _ids_for_prefix(self, prefix: str) -> set:
+        ids = set()
+        i = bisect.bisect_left(self.terms, prefix)
+        while i < len(self.terms) and self.terms[i].startswith(prefix):
+            ids.update(self.postings[self.terms[i]])
+            i += 1
+        return ids
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """
+        Devuelve [{libro, capitulo, versiculo, texto}, ...] en orden bíblico.
+        """
+        phrases, groups = [], []
+        for phrase, word in _QUERY_RE.findall(query):
+            if phrase:
+                tokens = tokenize(phrase)
+                if tokens:
+                    phrases.append(tokens)
+                    groups.extend(self._ids_for_term(t) for t in tokens)
+            elif word.endswith("*") and len(word) > 1:
+                prefix = normalize_text(word[:-1])
+                if prefix:
+                    groups.append(self._ids_for_prefix(prefix))
+            else:
+                groups.extend(self._ids_for_term(t) for t in tokenize(word))
+
+        if not groups:
+            return []
+
+        groups.sort(key=len)
+        candidates = groups[0]
+        for g in groups[1:]:
+            candidates = candidates & g
+            if not candidates:
+                return []
+
+        results = []
+        for vid in sorted(candidates):
+            book_idx, chapter, num = self.refs[vid]
+            book = self.books[book_idx]
+            texto = self._verse_text(book, chapter, num)
+            if phrases and not _contains_phrases(tokenize(texto), phrases):
+                continue
+            results.append({"libro": book, "capitulo": chapter, "versiculo": num, "texto": texto})
+            if len(results) >= limit:
+                break
+        return results
+
+    def _verse_text(self, book: str, chapter: int, num: int) -> str:
+        if self.processor is None:
+            return ""
+        for n, texto in self.processor.chapter_verses(book, chapter):
+            if n == num:
+                return texto
+        return ""
+
+
+def _contains_phrases(tokens: list, phrases: list) -> bool:
+    for phrase in phrases:
+        n = len(phrase)
+        if not any(tokens[i:i + n] == phrase for i in range(len(tokens) - n + 1)):
+            return False
+    return True
+
+
+def _source_signature(json_path: Path) -> dict:
+    try:
+        st = Path(json_path).stat()
+    except OSError:
+        return {}
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+_SEARCH_INDEXES: dict = {}
+_SEARCH_LOCK = Lock()
+
+
+def get_search_index(processor: BibleJSONProcessor) -> BibleSearchIndex:
+    """
+    Índice de búsqueda compartido por proceso. Se carga del disco si coincide
+    con el JSON de origen; si no, se reconstruye y se guarda. El de memoria se
+    revalida en cada llamada: un refresh del JSON no deja /buscar con texto viejo.
+    """
+    key = str(processor.json_path.resolve())
+    signature = _source_signature(processor.json_path)
+    with _SEARCH_LOCK:
+        index = _SEARCH_INDEXES.get(key)
+        if index is not None:
+            if not signature or index.source == signature:
+                return index
+            del _SEARCH_INDEXES[key]
+            index = None
+
+        path = search_path_for(processor.json_path)
+        if path.exists():
+            try:
+                index = BibleSearchIndex.load(path)
+                if signature and index.source != signature:
+                    log(f"Índice de búsqueda desactualizado: {path}")
+                    index = None
+            except (OSError, ValueError, KeyError) as e:
+                log(f"⚠️ No se pudo leer {path}: {e}")
+                index = None
+
+        if index is None:
+            index = BibleSearchIndex.build(processor)
+            try:
+                index.save(path)
+            except OSError as e:
+                log(f"⚠️ No se pudo guardar el índice de búsqueda {path}: {e}")
+
+        index.processor = processor
+        _SEARCH_INDEXES[key] = index
+        return index
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Herramientas del JSON de la Biblia")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_build = sub.add_parser("build", help="Compila el JSON al índice .rvbi")
+    p_build.add_argument("json_path")
+    p_build.add_argument("-o", "--output", default=None)
+
+    p_search = sub.add_parser("search", help="Busca texto en la Biblia")
+    p_search.add_argument("json_path")
+    p_search.add_argument("query")
+    p_search.add_argument("-n", "--limit", type=int, default=20)
+
+    args = parser.parse_args()
+    if args.cmd == "build":
+        compile_bible(args.json_path, args.output)
+        processor = BibleJSONProcessor(args.json_path)
+        index = BibleSearchIndex.build(processor)
+        index.save(search_path_for(args.json_path))
+    elif args.cmd == "search":
+        processor = BibleJSONProcessor(args.json_path)
+        for r in processor.search(args.query, limit=args.limit):
+            print(f"{r['libro']} {r['capitulo']}:{r['versiculo']}  {r['texto']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,116 @@
 # config.py
 import os
 from pathlib import Path
+from threading import Lock
 from dotenv import load_dotenv
-from mistralai import Mistral
-from elevenlabs.client import ElevenLabs
 
 load_dotenv()
 
 API_KEY_MISTRAL = os.getenv("MISTRAL_API_KEY")
 API_KEY_ELEVENLABS = os.getenv("ELEVEN_LABS_API_KEY")
 
-if not API_KEY_MISTRAL:
-    raise RuntimeError("MISTRAL_API_KEY no está definido en el .env")
+# Los clientes (y sus SDKs) se crean en el primer uso, no al importar config:
+# así /libros, /status, etc. no pagan el costo de importar mistralai/elevenlabs.
+_CLIENTS = {}
+_LOCK = Lock()
 
-if not API_KEY_ELEVENLABS:
-    raise RuntimeError("ELEVEN_LABS_API_KEY no está definido en el .env")
 
-client_mistral = Mistral(api_key=API_KEY_MISTRAL)
-client_eleven = ElevenLabs(api_key=API_KEY_ELEVENLABS)
+def get_mistral_client():
+    with _LOCK:
+        if "mistral" not in _CLIENTS:
+            if not API_KEY_MISTRAL:
+                raise RuntimeError("MISTRAL_API_KEY no está definido en el .env")
+            from mistralai import Mistral
+            _CLIENTS["mistral"] = Mistral(api_key=API_KEY_MISTRAL)
+        return _CLIENTS["mistral"]
+
+
+def new_mistral_client():
+    """
+    Cliente Mistral nuevo, fuera de la caché. Para el trabajo async: el pool
+    de conexiones async de httpx queda atado al event loop donde se abrió, así
+    que cada asyncio.run usa su propio cliente y lo cierra al terminar.
+    """
+    if not API_KEY_MISTRAL:
+        raise RuntimeError("MISTRAL_API_KEY no está definido en el .env")
+    from mistralai import Mistral
+    return Mistral(api_key=API_KEY_MISTRAL)
+
+
+def get_eleven_client():
+    with _LOCK:
+        if "eleven" not in _CLIENTS:
+            if not API_KEY_ELEVENLABS:
+                raise RuntimeError("ELEVEN_LABS_API_KEY no está definido en el .env")
+            from elevenlabs.client import ElevenLabs
+            _CLIENTS["eleven"] = ElevenLabs(api_key=API_KEY_ELEVENLABS)
+        return _CLIENTS["eleven"]
+
+
+def __getattr__(name):
+    # Compatibilidad: `from config import client_mistral` sigue funcionando
+    if name == "client_mistral":
+        return get_mistral_client()
+    if name == "client_eleven":
+        return get_eleven_client()
+    raise AttributeError(f"module 'config' has no attribute '{name}'")
+
 
 # Rutas base que usas en todo el proyecto
 BASE_DIR = Path(__file__).resolve().parent
 BIBLE_JSON_PATH = Path(r"D:\\Video_bib_pipeline\\biblia_completa_rv1960.json")
 ZIMAGE_GGUF = Path(r"D:\\Video_bib_pipeline\\z_image_turbo-Q8_0.gguf")
+# Frames por llamada al pipeline: "auto" = según la memoria libre (hasta IMAGE_BATCH_MAX; de a uno si
+# no se puede medir, p. ej. mps o CPU en Windows), o un número fijo que se respeta tal cual.
+# IMAGE_MB_POR_IMAGEN es la memoria estimada de activaciones por imagen de 1280x720; si se queda corta,
+# un OOM parte el lote a la mitad y el tamaño seguro se recuerda para el resto del proceso.
+IMAGE_BATCH = os.getenv("IMAGE_BATCH", "auto")
+IMAGE_BATCH_MAX = int(os.getenv("IMAGE_BATCH_MAX", "6"))
+IMAGE_MB_POR_IMAGEN = int(os.getenv("IMAGE_MB_POR_IMAGEN", "1500"))
+
+# Worker residente de imágenes (ver image_worker.py). Opt-in: IMAGE_WORKER=1.
+# La clave sale de IMAGE_WORKER_AUTHKEY o, si no está, de un archivo aleatorio por instalación
+# (solo legible por el usuario): la conexión deserializa con pickle, una clave pública = ejecución de código.
+IMAGE_WORKER = os.getenv("IMAGE_WORKER", "0") == "1"
+IMAGE_WORKER_ADDRESS = ("127.0.0.1", int(os.getenv("IMAGE_WORKER_PORT", "6011")))
+IMAGE_WORKER_AUTHKEY = os.getenv("IMAGE_WORKER_AUTHKEY")
+IMAGE_WORKER_KEY_PATH = Path(os.getenv("IMAGE_WORKER_KEY_PATH", BASE_DIR / "output" / "image_worker.key"))
+IMAGE_WORKER_IDLE_S = float(os.getenv("IMAGE_WORKER_IDLE_S", "900"))
+
+# Caché de respuestas LLM (ver disk_cache.py). LLM_CACHE_MODE: on | off | refresh
+LLM_CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR", BASE_DIR / "cache" / "llm"))
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "256"))
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "on")
+
+# Cascada de modelos (ver llm_pipeline.py): cada etapa prueba primero el modelo
+# rápido y solo escala al configurado si la salida no pasa el chequeo de la etapa
+LLM_CASCADE = os.getenv("LLM_CASCADE", "0") == "1"
+LLM_CASCADE_FAST_MODEL = os.getenv("LLM_CASCADE_FAST_MODEL", "mistral-small-latest")
+
+# Límites por proveedor compartidos por todo el proceso (ver rate_limit.py). 0 = sin límite de tokens
+MISTRAL_RPS = float(os.getenv("MISTRAL_RPS", "5"))
+MISTRAL_TOKENS_PER_MIN = float(os.getenv("MISTRAL_TOKENS_PER_MIN", "500000")) or None
+ELEVEN_RPS = float(os.getenv("ELEVEN_RPS", "2"))
+ELEVEN_CHARS_PER_MIN = float(os.getenv("ELEVEN_CHARS_PER_MIN", "0")) or None
+# Audios sintetizados a la vez (procesar_lote_audios / procesar_stream_audios)
+TTS_MAX_WORKERS = int(os.getenv("TTS_MAX_WORKERS", "3"))
+
+# Caché de audios TTS (texto normalizado + voz + modelo + ajustes -> MP3). TTS_CACHE_MODE: on | off | refresh
+TTS_CACHE_DIR = Path(os.getenv("TTS_CACHE_DIR", BASE_DIR / "cache" / "tts"))
+TTS_CACHE_MAX_MB = int(os.getenv("TTS_CACHE_MAX_MB", "2048"))
+TTS_CACHE_MODE = os.getenv("TTS_CACHE_MODE", "on")
+
+# Síntesis por frases (ver tts_pipeline.py): guiones de más de TTS_CHUNK_CHARS
+# caracteres se parten y sus fragmentos se sintetizan en paralelo
+TTS_CHUNKED = os.getenv("TTS_CHUNKED", "0") == "1"
+TTS_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", "400"))
+TTS_CHUNK_WORKERS = int(os.getenv("TTS_CHUNK_WORKERS", "4"))
+
+# Hedging contra la cola de latencia (ver hedging.py). Vacío = desactivado.
+# HEDGE_MAX_EXTRA: fracción máxima de peticiones duplicadas
+HEDGE_PROVIDERS = os.getenv("HEDGE_PROVIDERS", "")
+HEDGE_MAX_EXTRA = float(os.getenv("HEDGE_MAX_EXTRA", "0.05"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+
+# Telemetría de llamadas LLM (ver llm_metrics.py). Vacío = desactivada
+LLM_METRICS_PATH = os.getenv("LLM_METRICS_PATH", str(BASE_DIR / "output" / "llm_metrics.jsonl"))
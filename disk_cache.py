@@ -0,0 +1,265 @@
+# disk_cache.py
+"""
+Caché persistente direccionada por contenido.
+
+    <dir>/index.sqlite        clave -> (namespace, tamaño, último acceso)
+    <dir>/<ab>/<clave>.bin    valor en bruto
+
+La clave es un sha256 de las entradas (make_key). Cada namespace (p. ej. la
+etapa del pipeline LLM) lleva sus propios contadores de aciertos/fallos, que
+se guardan en el índice para ver la tasa de aciertos entre ejecuciones.
+Al superar max_bytes se expulsan las entradas menos usadas recientemente (LRU).
+
+Una lectura no escribe en el índice: el último acceso y los contadores se
+acumulan en memoria y se vuelcan juntos (cada FLUSH_EVERY lecturas o
+FLUSH_INTERVAL segundos, y antes de un put, stats, clear o close). Si el
+proceso muere, se pierden como mucho esos accesos, nunca entradas.
+
+CLI:
+    python disk_cache.py stats <dir>
+    python disk_cache.py clear <dir> [--namespace contenido]
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from threading import Lock
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+FLUSH_EVERY = 64
+FLUSH_INTERVAL = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key         TEXT PRIMARY KEY,
+    namespace   TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    created     REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access);
+CREATE TABLE IF NOT EXISTS stats (
+    namespace TEXT PRIMARY KEY,
+    hits      INTEGER NOT NULL DEFAULT 0,
+    misses    INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def make_key(*parts) -> str:
+    """sha256 estable de cualquier estructura serializable a JSON."""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    def __init__(self, directory: str | Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = Lock()
+        self._db = sqlite3.connect(self.directory / "index.sqlite", check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        # Pendientes de volcar al índice: {clave: último acceso}, {(namespace, acierto): n}
+        self._accesos = {}
+        self._conteos = {}
+        self._pendientes = 0
+        self._ultimo_flush = time.monotonic()
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.bin"
+
+    def _count(self, namespace: str, hit: bool):
+        self._conteos[(namespace, hit)] = self._conteos.get((namespace, hit), 0) + 1
+        self._pendientes += 1
+
+    def _touch(self, key: str):
+        self._accesos[key] = time.time()
+        self._pendientes += 1
+
+    def _flush(self):
+        """Vuelca accesos y contadores pendientes (sin commit; lo hace quien llama)."""
+        if self._accesos:
+            self._db.executemany(
+                "UPDATE entries SET last_access = ? WHERE key = ?",
+                [(ts, key) for key, ts in self._accesos.items()],
+            )
+            self._accesos.clear()
+        for (namespace, hit), n in self._conteos.items():
+            column = "hits" if hit else "misses"
+            self._db.execute(
+                f"INSERT INTO stats (namespace, {column}) VALUES (?, ?) "
+                f"ON CONFLICT(namespace) DO UPDATE SET {column} = {column} + excluded.{column}",
+                (namespace, n),
+            )
+        self._conteos.clear()
+        self._pendientes = 0
+        self._ultimo_flush = time.monotonic()
+
+    def _flush_si_toca(self):
+        if self._pendientes >= FLUSH_EVERY or time.monotonic() - self._ultimo_flush >= FLUSH_INTERVAL:
+            self._flush()
+            self._db.commit()
+
+    def get(self, key: str, namespace: str = "default") -> bytes | None:
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone()
+            data = None
+            if row:
+                try:
+                    data = self.path_for(key).read_bytes()
+                except FileNotFoundError:
+                    self._forget(key)
+                    self._db.commit()
+            if data is not None:
+                self._touch(key)
+            self._count(namespace, data is not None)
+            self._flush_si_toca()
+            return data
+
+    def link_to(self, key: str, dest: str | Path, namespace: str = "default", count: bool = True) -> bool:
+        """
+        Deja el valor de `key` en `dest` como hard link al blob (copia si el sistema
+        de archivos no lo permite), sin leerlo a memoria. False si no está.
+        Quien escriba después en `dest` debe reemplazar el archivo (os.replace),
+        no sobrescribirlo, para no modificar el blob compartido.
+        """
+        dest = Path(dest)
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone()
+            src = self.path_for(key)
+            ok = bool(row) and src.exists()
+            if row and not ok:
+                self._forget(key)
+                self._db.commit()
+            if ok:
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                tmp = dest.with_name(f"{dest.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                tmp.unlink(missing_ok=True)
+                try:
+                    os.link(src, tmp)
+                except OSError:
+                    shutil.copyfile(src, tmp)
+                os.replace(tmp, dest)
+                self._touch(key)
+            if count:
+                self._count(namespace, ok)
+            self._flush_si_toca()
+            return ok
+
+    def put(self, key: str, value: bytes, namespace: str = "default"):
+        path = self.path_for(key)
+        path.parent.mkdir(exist_ok=True)
+        # Temporal único: dos hilos guardando la misma clave no se pisan el archivo
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f"{key}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+        now = time.time()
+        with self._lock:
+            self._flush()  # el LRU de _evict necesita los accesos al día
+            old = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._total += len(value) - (old[0] if old else 0)
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, namespace, size, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, namespace, len(value), now, now),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _forget(self, key: str):
+        row = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        if row:
+            self._total -= row[0]
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self.path_for(key).unlink(missing_ok=True)
+
+    def _evict(self):
+        if self._total <= self.max_bytes:
+            return
+        rows = self._db.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall()
+        for key, size in rows:
+            if self._total <= self.max_bytes:
+                break
+            self._forget(key)
+
+    def clear(self, namespace: str | None = None) -> int:
+        with self._lock:
+            self._flush()
+            if namespace is None:
+                keys = [k for (k,) in self._db.execute("SELECT key FROM entries")]
+                self._db.execute("DELETE FROM stats")
+            else:
+                keys = [k for (k,) in self._db.execute(
+                    "SELECT key FROM entries WHERE namespace = ?", (namespace,))]
+                self._db.execute("DELETE FROM stats WHERE namespace = ?", (namespace,))
+            for key in keys:
+                self._forget(key)
+            self._db.commit()
+            return len(keys)
+
+    def stats(self) -> dict:
+        """{namespace: {entries, bytes, hits, misses, hit_rate}}"""
+        with self._lock:
+            self._flush()
+            self._db.commit()
+            out = {}
+            for ns, n, size in self._db.execute(
+                "SELECT namespace, COUNT(*), SUM(size) FROM entries GROUP BY namespace"
+            ):
+                out[ns] = {"entries": n, "bytes": size, "hits": 0, "misses": 0}
+            for ns, hits, misses in self._db.execute("SELECT namespace, hits, misses FROM stats"):
+                s = out.setdefault(ns, {"entries": 0, "bytes": 0})
+                s.update(hits=hits, misses=misses)
+        for s in out.values():
+            total = s["hits"] + s["misses"]
+            s["hit_rate"] = s["hits"] / total if total else 0.0
+        return out
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._db.commit()
+            self._db.close()
+
+
+def _print_stats(cache: DiskCache):
+    stats = cache.stats()
+    if not stats:
+        print("Caché vacía.")
+        return
+    print(f"{'namespace':14} {'entradas':>8} {'KB':>10} {'aciertos':>9} {'fallos':>7} {'tasa':>6}")
+    for ns, s in sorted(stats.items()):
+        print(f"{ns:14} {s['entries']:8} {s['bytes'] / 1024:10.1f} {s['hits']:9} {s['misses']:7} {s['hit_rate']:6.0%}")
+    print(f"Total: {cache._total / 1024 / 1024:.1f} MB de {cache.max_bytes / 1024 / 1024:.0f} MB")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Caché en disco del pipeline")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_stats = sub.add_parser("stats", help="Entradas, tamaño y tasa de aciertos por namespace")
+    p_stats.add_argument("directory")
+    p_clear = sub.add_parser("clear", help="Vacía la caché (o un namespace)")
+    p_clear.add_argument("directory")
+    p_clear.add_argument("--namespace", default=None)
+    args = parser.parse_args()
+
+    cache = DiskCache(args.directory)
+    if args.cmd == "stats":
+        _print_stats(cache)
+    else:
+        print(f"{cache.clear(args.namespace)} entradas eliminadas.")
@@ -0,0 +1,239 @@
+# hedging.py
+"""
+Peticiones "hedged" contra la cola de latencia de Mistral y ElevenLabs.
+
+Si una llamada no volvió en el p95 de su latencia observada, se lanza un
+duplicado y se usa la primera que termine; la perdedora se cancela en async.
+En sync no hay cancelación real: solo se activa un Event y se descarta el
+resultado; la petición perdedora sigue corriendo en su hilo (y consumiendo
+cuota del proveedor) hasta que `fn` mire el Event o termine sola.
+
+La petición original siempre deja su muestra de latencia, aunque pierda: si
+se la corta, cuenta lo que llevaba (una cota inferior de su latencia real).
+Sin eso las lentas nunca entrarían a la ventana, el p95 bajaría solo y se
+duplicaría cada vez más. El duplicado solo cuenta si termina.
+
+Opt-in por proveedor (HEDGE_PROVIDERS=mistral,elevenlabs) y con tope de
+peticiones extra: cada petición original suma `max_extra` créditos y cada
+duplicado gasta uno, así los duplicados nunca pasan de ~max_extra del total.
+
+    hedger = get_hedger("mistral")          # None si no está activado
+    resultado, ganador = hedger.call("refinar:mistral-medium-latest", fn, before_extra=...)
+    # ganador: None (no hizo falta duplicar), "original" o "duplicado"
+
+`fn` recibe un threading.Event que se activa si la llamada perdió (para dejar
+de leer un stream, por ejemplo). `before_extra` se ejecuta antes de lanzar el
+duplicado (el limitador del proveedor: el duplicado también cuenta).
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Lock
+
+from config import HEDGE_PROVIDERS, HEDGE_MAX_EXTRA, HEDGE_MIN_SAMPLES
+
+
+class LatencyTracker:
+    """Ventana móvil de latencias por clave (etapa:modelo) para estimar el p95."""
+
+    def __init__(self, window: int = 200, min_samples: int = HEDGE_MIN_SAMPLES):
+        self.window = window
+        self.min_samples = min_samples
+        self._muestras = {}
+        self._lock = Lock()
+
+    def add(self, key: str, segundos: float):
+        with self._lock:
+            self._muestras.setdefault(key, deque(maxlen=self.window)).append(segundos)
+
+    def p95(self, key: str) -> float | None:
+        """None mientras no haya suficientes muestras (no se duplica a ciegas)."""
+        with self._lock:
+            muestras = sorted(self._muestras.get(key, ()))
+        if len(muestras) < self.min_samples:
+            return None
+        return muestras[min(len(muestras) - 1, int(0.95 * len(muestras)))]
+
+
+class Hedger:
+    def __init__(
+        self,
+        name: str,
+        max_extra: float = HEDGE_MAX_EXTRA,
+        min_delay: float = 0.05,
+        burst: float = 3.0,
+        tracker: LatencyTracker | None = None,
+        max_workers: int = 16,
+    ):
+        self.name = name
+        self.max_extra = max_extra
+        self.min_delay = min_delay
+        self.burst = burst
+        self.tracker = tracker or LatencyTracker()
+        self._credito = 0.0
+        self._lock = Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"hedge-{name}")
+        self.stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "original_wins": 0, "denied": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _delay(self, key: str) -> float | None:
+        p95 = self.tracker.p95(key)
+        return None if p95 is None else max(p95, self.min_delay)
+
+    def _nueva_peticion(self):
+        with self._lock:
+            self.stats["requests"] += 1
+            self._credito = min(self.burst, self._credito + self.max_extra)
+
+    def _gastar_credito(self) -> bool:
+        with self._lock:
+            if self._credito < 1.0:
+                self.stats["denied"] += 1
+                return False
+            self._credito -= 1.0
+            self.stats["hedged"] += 1
+            return True
+
+    def _ganador(self, ganador: str) -> str:
+        self._count("hedge_wins" if ganador == "duplicado" else "original_wins")
+        return ganador
+
+    # ---------- sync ----------
+
+    def _lanzar(self, key: str, fn, original: bool):
+        cancelado = threading.Event()
+        ctx = contextvars.copy_context()
+
+        def intento():
+            t0 = time.perf_counter()
+            try:
+                return ctx.run(fn, cancelado)
+            finally:
+                if original or not cancelado.is_set():
+                    self.tracker.add(key, time.perf_counter() - t0)
+
+        return self._pool.submit(intento), cancelado
+
+    def call(self, key: str, fn, before_extra=None):
+        """Devuelve (resultado, ganador). Si ambas fallan, propaga el error de la última."""
+        self._nueva_peticion()
+        delay = self._delay(key)
+        if delay is None:
+            # Sin estadística todavía: llamada directa en este hilo, sin costo extra
+            t0 = time.perf_counter()
+            resultado = fn(threading.Event())
+            self.tracker.add(key, time.perf_counter() - t0)
+            return resultado, None
+
+        original = self._lanzar(key, fn, original=True)
+        hechas, _ = wait([original[0]], timeout=delay)
+        if hechas or not self._gastar_credito():
+            return original[0].result(), None
+
+        if before_extra is not None:
+            try:
+                before_extra()
+            except Exception:
+                # Sin cupo para el duplicado (circuito abierto o a prueba): solo la original
+                return original[0].result(), None
+        duplicado = self._lanzar(key, fn, original=False)
+        intentos = {original[0]: ("original", original[1]), duplicado[0]: ("duplicado", duplicado[1])}
+        pendientes = set(intentos)
+        error = None
+        while pendientes:
+            hechas, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futuro in hechas:
+                if futuro.exception() is not None:
+                    error = futuro.exception()
+                    continue
+                for otro in pendientes:
+                    otro.cancel()
+                    intentos[otro][1].set()
+                return futuro.result(), self._ganador(intentos[futuro][0])
+        raise error
+
+    # ---------- async ----------
+
+    async def _intento_async(self, key: str, fn, original: bool):
+        t0 = time.perf_counter()
+        try:
+            resultado = await fn()
+        except asyncio.CancelledError:
+            if original:
+                self.tracker.add(key, time.perf_counter() - t0)
+            raise
+        self.tracker.add(key, time.perf_counter() - t0)
+        return resultado
+
+    async def call_async(self, key: str, fn, before_extra=None):
+        """Como call, con fn() -> corrutina; la perdedora se cancela."""
+        self._nueva_peticion()
+        delay = self._delay(key)
+        original = asyncio.ensure_future(self._intento_async(key, fn, original=True))
+        try:
+            if delay is None:
+                return await original, None
+            hechas, _ = await asyncio.wait({original}, timeout=delay)
+        except BaseException:
+            # Cancelaron al llamador: la original no debe seguir gastando cuota
+            original.cancel()
+            raise
+        if hechas or not self._gastar_credito():
+            return await original, None
+
+        try:
+            if before_extra is not None:
+                try:
+                    await before_extra()
+                except Exception:
+                    return await original, None
+            duplicado = asyncio.ensure_future(self._intento_async(key, fn, original=False))
+        except BaseException:
+            original.cancel()
+            raise
+        nombres = {original: "original", duplicado: "duplicado"}
+        pendientes = set(nombres)
+        error = None
+        try:
+            while pendientes:
+                hechas, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+                for tarea in hechas:
+                    if tarea.exception() is not None:
+                        error = tarea.exception()
+                        continue
+                    return tarea.result(), self._ganador(nombres[tarea])
+            raise error
+        finally:
+            for tarea in pendientes:
+                tarea.cancel()
+
+
+_HEDGERS = {}
+_HEDGERS_LOCK = Lock()
+_ACTIVOS = {p.strip() for p in HEDGE_PROVIDERS.split(",") if p.strip()}
+
+
+def get_hedger(name: str) -> Hedger | None:
+    """Hedger único del proceso para `name`, o None si el hedging no está activado para él."""
+    with _HEDGERS_LOCK:
+        if name not in _HEDGERS:
+            _HEDGERS[name] = Hedger(name) if name in _ACTIVOS else None
+        return _HEDGERS[name]
+
+
+def set_hedger(name: str, hedger: Hedger | None):
+    """Activa (Hedger) o desactiva (None) el hedging de `name`."""
+    with _HEDGERS_LOCK:
+        _HEDGERS[name] = hedger
+
+
+def hedge_stats() -> dict:
+    with _HEDGERS_LOCK:
+        hedgers = [h for h in _HEDGERS.values() if h is not None]
+    return {h.name: dict(h.stats) for h in hedgers}
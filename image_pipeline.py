@@ -2,21 +2,25 @@
 import json
 import os
 import gc
+import inspect
 from pathlib import Path
 
-import torch
-from diffusers import ZImagePipeline, ZImageTransformer2DModel, GGUFQuantizationConfig
-
 from pipeline_cancel import should_cancel
-from config import ZIMAGE_GGUF
+from config import ZIMAGE_GGUF, IMAGE_BATCH, IMAGE_BATCH_MAX, IMAGE_MB_POR_IMAGEN
 
 
 def cargar_zimage_pipeline(
     gguf_path: str | Path = ZIMAGE_GGUF,
     model_name: str = "Tongyi-MAI/Z-Image-Turbo",
-    torch_dtype=torch.bfloat16,
+    torch_dtype=None,
     device: str = "cuda",
 ):
+    # Imports pesados diferidos hasta que realmente se carga el modelo
+    import torch
+    from diffusers import ZImagePipeline, ZImageTransformer2DModel, GGUFQuantizationConfig
+
+    if torch_dtype is None:
+        torch_dtype = torch.bfloat16
     gguf_path = Path(gguf_path)
 
     if not gguf_path.exists():
@@ -45,31 +49,136 @@ CONFIG = {
     "num_inference_steps": 8,
     "guidance_scale": 0.0,
 }
+SEED = 33442
+
+# Tope de lote aprendido con los OOM (None = todavía ninguno)
+_lote_seguro = None
+
+
+def _memoria_libre(device) -> int | None:
+    """Bytes libres en el device del pipeline (VRAM o RAM), o None si no se puede saber."""
+    import torch
+
+    if device.type == "cuda":
+        libre, _ = torch.cuda.mem_get_info(device)
+        return libre
+    if device.type != "cpu":
+        return None  # mps y otros: sin una medida confiable
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None  # p. ej. Windows
+
+
+def tamano_lote(pipeline, pendientes: int) -> int:
+    """
+    Cuántos frames mandar en la próxima llamada al pipeline. IMAGE_BATCH=N se
+    respeta tal cual (solo lo baja un OOM ya visto); en "auto" se estima con la
+    memoria libre hasta IMAGE_BATCH_MAX, y si no se puede medir, de a uno.
+    """
+    if IMAGE_BATCH != "auto":
+        tope = int(IMAGE_BATCH)
+    else:
+        device = next(pipeline.transformer.parameters()).device
+        libre = _memoria_libre(device)
+        if libre is None:
+            tope = _lote_seguro or 1
+        else:
+            tope = min(IMAGE_BATCH_MAX, libre // (IMAGE_MB_POR_IMAGEN * 1024 * 1024))
+    if _lote_seguro is not None and tope > _lote_seguro:
+        if IMAGE_BATCH != "auto":
+            print(f"⚠ IMAGE_BATCH={tope} bajado a {_lote_seguro} por un OOM anterior")
+        tope = _lote_seguro
+    return max(1, min(tope, pendientes))
 
 
-def generar_imagen(pipeline, prompt: str, carpeta: str | Path, nombre: str):
-    carpeta = Path(carpeta)
-    carpeta.mkdir(parents=True, exist_ok=True)
-    print(f"Generando: {nombre}...")
+def _cortar_si_cancelado(pipe, step, timestep, callback_kwargs):
+    # Callback de fin de paso de diffusers: con /cancel el lote se corta en el
+    # paso siguiente en vez de esperar a que termine la difusión entera.
+    if should_cancel():
+        pipe._interrupt = True
+    return callback_kwargs
 
-    # Usa el mismo device que el pipeline
-    device = next(pipeline.transformer.parameters()).device
-    generator = torch.Generator(device=device).manual_seed(33442)
 
-    with torch.inference_mode():
-        img = pipeline(
-            prompt=prompt,
-            **CONFIG,
-            generator=generator,
-        ).images[0]
+def _admite_callback(pipeline) -> bool:
+    return "callback_on_step_end" in inspect.signature(pipeline.__call__).parameters
+
+
+def _es_oom(e: Exception) -> bool:
+    import torch
+
+    if isinstance(e, torch.cuda.OutOfMemoryError):
+        return True
+    # En CPU el allocator lanza RuntimeError ("DefaultCPUAllocator: can't allocate memory")
+    return isinstance(e, RuntimeError) and ("out of memory" in str(e) or "can't allocate memory" in str(e))
+
 
-    ruta = carpeta / nombre
-    img.save(ruta)
-    print(f"✅ Guardado: {ruta}\n")
+def _liberar():
+    import torch
 
-    del img
-    torch.cuda.empty_cache()
     gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def generar_lote(pipeline, trabajos: list) -> bool:
+    """
+    Genera varios frames en una sola llamada al pipeline. `trabajos` es una
+    lista de (prompt, carpeta, nombre). Cada frame tiene su propio generator
+    con la semilla fija, así la imagen no depende del lote en el que cayó.
+    Si no entra en memoria, parte el lote a la mitad (y recuerda el tope).
+    La cancelación se revisa en cada paso de difusión si el pipeline acepta
+    callback_on_step_end (si no, al terminar el lote); un lote cortado no se
+    guarda. Devuelve False si se canceló.
+    """
+    global _lote_seguro
+    import torch
+
+    for _, _, nombre in trabajos:
+        print(f"Generando: {nombre}...")
+
+    # Usa el mismo device que el pipeline
+    device = next(pipeline.transformer.parameters()).device
+    generators = [torch.Generator(device=device).manual_seed(SEED) for _ in trabajos]
+    extra = {"callback_on_step_end": _cortar_si_cancelado} if _admite_callback(pipeline) else {}
+
+    try:
+        with torch.inference_mode():
+            imgs = pipeline(
+                prompt=[prompt for prompt, _, _ in trabajos],
+                **CONFIG,
+                generator=generators,
+                **extra,
+            ).images
+    except Exception as e:
+        if len(trabajos) == 1 or not _es_oom(e):
+            raise
+        _liberar()
+        mitad = len(trabajos) // 2
+        _lote_seguro = mitad
+        print(f"⚠ Sin memoria con {len(trabajos)} frames por lote, se baja a {mitad}")
+        return generar_lote(pipeline, trabajos[:mitad]) and generar_lote(pipeline, trabajos[mitad:])
+
+    if should_cancel():
+        # Difusión interrumpida a mitad: las imágenes salen con ruido
+        del imgs
+        _liberar()
+        return False
+
+    for (_, carpeta, nombre), img in zip(trabajos, imgs):
+        carpeta = Path(carpeta)
+        carpeta.mkdir(parents=True, exist_ok=True)
+        ruta = carpeta / nombre
+        img.save(ruta)
+        print(f"✅ Guardado: {ruta}\n")
+
+    del imgs
+    _liberar()
+    return True
+
+
+def generar_imagen(pipeline, prompt: str, carpeta: str | Path, nombre: str) -> bool:
+    return generar_lote(pipeline, [(prompt, carpeta, nombre)])
 
 
 def generar_imagenes_desde_json(pipeline, json_path: str | Path, output_root: str = "output" , libro: str | None = None, capitulo: int | None = None):
@@ -80,46 +189,42 @@ def generar_imagenes_desde_json(pipeline, json_path: str | Path, output_root: st
     print("Iniciando generación de imágenes...\n")
     cancelado = False
 
-    for i, bloque in enumerate(data, 1):
-        if should_cancel():
-            print("⛔ Cancelado por el usuario antes de procesar el siguiente bloque de imágenes.")
-            cancelado = True
-            break
+    libro_slug = (libro or "libro").lower()
+    cap_slug = f"cap_{capitulo}" if capitulo is not None else "cap"
 
+    # Todos los frames del capítulo en orden; se generan en lotes aunque crucen bloques
+    trabajos = []
+    for i, bloque in enumerate(data, 1):
         tipo = bloque["tipo"]
         referencia = bloque.get("referencia", "")
-
-        print("=" * 50)
         print(f"Bloque {i}/{len(data)}: {tipo} - {referencia}")
-        print("=" * 50 + "\n")
 
         if tipo in ["HISTORIA", "CURIOSIDAD"]:
-            frames = bloque["secuencia_visual"]
-            libro_slug = (libro or "libro").lower()
-            cap_slug = f"cap_{capitulo}" if capitulo is not None else "cap"
             carpeta = Path(output_root) / libro_slug / cap_slug / tipo
-
-            for frame_name, prompt in frames.items():
-                if should_cancel():
-                    print("⛔ Cancelado por el usuario durante generación de frames.")
-                    cancelado = True
-                    break
-
-                generar_imagen(pipeline, prompt, carpeta, f"{frame_name}.png")
-
-            if cancelado:
-                break
+            for frame_name, prompt in bloque["secuencia_visual"].items():
+                trabajos.append((prompt, carpeta, f"{frame_name}.png"))
 
         elif tipo == "ORACION":
-            if should_cancel():
-                print("⛔ Cancelado por el usuario antes de generar imagen de ORACION.")
-                cancelado = True
-                break
-
             carpeta = Path(output_root) / libro_slug / cap_slug / "ORACION"
             # Evita overwrite si hubiera varias ORACION:
-            nombre = f"oracion_{i}.png"
-            generar_imagen(pipeline, bloque["prompt_imagen"], carpeta, nombre)
+            trabajos.append((bloque["prompt_imagen"], carpeta, f"oracion_{i}.png"))
+
+    hechos = 0
+    while hechos < len(trabajos):
+        if should_cancel():
+            print("⛔ Cancelado por el usuario durante generación de frames.")
+            cancelado = True
+            break
+
+        n = tamano_lote(pipeline, len(trabajos) - hechos)
+        print("=" * 50)
+        print(f"Frames {hechos + 1}-{hechos + n} de {len(trabajos)} (lote de {n})")
+        print("=" * 50 + "\n")
+        if not generar_lote(pipeline, trabajos[hechos:hechos + n]):
+            print("⛔ Cancelado por el usuario a mitad de un lote (no se guardó).")
+            cancelado = True
+            break
+        hechos += n
 
     print("\n" + "=" * 50)
     if cancelado:
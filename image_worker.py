@@ -0,0 +1,351 @@
+# image_worker.py
+"""
+Proceso residente de generación de imágenes: carga Z-Image una sola vez y
+atiende trabajos por un canal local (multiprocessing.connection, 127.0.0.1
+con authkey). Así el GGUF Q8 y el ZImagePipeline no se recargan en cada
+capítulo ni en cada comando del bot. Opt-in con IMAGE_WORKER=1.
+
+    python image_worker.py serve [--idle 900] [--precargar]   # arranca el worker
+    python image_worker.py ping                    # estado (cargado, trabajos, inactividad)
+    python image_worker.py unload | shutdown
+
+Mensajes (dicts por la conexión):
+    {"op": "ping"}                                  -> estado
+    {"op": "generar", json_path, output_root, libro, capitulo}
+                                                    -> {"ok", "cancelled", "load_s", "gen_s"}
+    {"op": "cancel"}    cancela el trabajo en curso (desde otra conexión)
+    {"op": "unload"}    libera el modelo (se recarga con el próximo trabajo)
+    {"op": "shutdown"}
+
+Tras `idle` segundos sin trabajos el modelo se descarga solo (libera la VRAM);
+el proceso sigue vivo y lo vuelve a cargar cuando llega otro trabajo.
+Los trabajos se atienden de a uno (una sola GPU); un ping nunca espera a un trabajo.
+
+La conexión deserializa con pickle: quien tenga la clave puede ejecutar código
+en el worker. La clave es IMAGE_WORKER_AUTHKEY o, si no está definida, una
+aleatoria por instalación en IMAGE_WORKER_KEY_PATH (modo 0600), creada la
+primera vez que se usa.
+"""
+import gc
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+
+from config import IMAGE_WORKER_ADDRESS, IMAGE_WORKER_AUTHKEY, IMAGE_WORKER_IDLE_S, IMAGE_WORKER_KEY_PATH
+from pipeline_cancel import request_cancel, reset_cancel, should_cancel
+
+
+class WorkerNoDisponible(RuntimeError):
+    """No hay worker escuchando (y no se pudo arrancar), o se cayó a mitad de un trabajo."""
+
+
+def _clave(authkey: bytes | None = None) -> bytes:
+    """authkey explícita, IMAGE_WORKER_AUTHKEY, o la clave aleatoria de la instalación."""
+    if authkey is not None:
+        return authkey
+    if IMAGE_WORKER_AUTHKEY:
+        return IMAGE_WORKER_AUTHKEY.encode("utf-8")
+    path = Path(IMAGE_WORKER_KEY_PATH)
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        # O_EXCL: si el worker y el bot la crean a la vez, gana uno y el otro la lee
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return path.read_bytes()
+    with os.fdopen(fd, "wb") as f:
+        f.write(secrets.token_bytes(32))
+    return path.read_bytes()
+
+
+def _cargar_zimage():
+    from image_pipeline import cargar_zimage_pipeline
+    return cargar_zimage_pipeline()
+
+
+def _generar_desde_json(pipeline, json_path, output_root, libro, capitulo):
+    from image_pipeline import generar_imagenes_desde_json
+    generar_imagenes_desde_json(pipeline, json_path, output_root=output_root, libro=libro, capitulo=capitulo)
+
+
+def _liberar_memoria():
+    gc.collect()
+    try:
+        import torch
+    except ImportError:
+        return
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+class ImageWorker:
+    """
+    Servidor. `cargar` y `generar` son inyectables (benchmarks sin torch);
+    por defecto usan image_pipeline.
+    """
+
+    def __init__(
+        self,
+        address=IMAGE_WORKER_ADDRESS,
+        authkey: bytes | None = None,
+        idle_timeout: float = IMAGE_WORKER_IDLE_S,
+        cargar=_cargar_zimage,
+        generar=_generar_desde_json,
+    ):
+        self.address = address
+        self.authkey = _clave(authkey)
+        self.idle_timeout = idle_timeout
+        self.cargar = cargar
+        self.generar = generar
+        self.pipeline = None
+        self.started = time.time()
+        self.last_used = time.monotonic()
+        self.stats = {"jobs": 0, "loads": 0, "unloads": 0, "load_s": 0.0}
+        self._job_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._listener = None
+
+    # ---------- modelo ----------
+
+    def _asegurar_pipeline(self) -> float:
+        if self.pipeline is not None:
+            return 0.0
+        t0 = time.perf_counter()
+        self.pipeline = self.cargar()
+        dt = time.perf_counter() - t0
+        self.stats["loads"] += 1
+        self.stats["load_s"] += dt
+        return dt
+
+    def _descargar(self, motivo: str):
+        with self._job_lock:
+            if self.pipeline is None:
+                return
+            self.pipeline = None
+            self.stats["unloads"] += 1
+        _liberar_memoria()
+        print(f"[worker] Modelo descargado ({motivo})")
+
+    def _precargar(self):
+        with self._job_lock:
+            print(f"[worker] Modelo cargado en {self._asegurar_pipeline():.1f} s")
+            self.last_used = time.monotonic()
+
+    def _vigilar_inactividad(self):
+        while not self._stop.wait(min(30.0, max(1.0, self.idle_timeout / 4))):
+            if self.pipeline is not None and time.monotonic() - self.last_used > self.idle_timeout:
+                self._descargar(f"{self.idle_timeout:.0f} s sin trabajos")
+
+    # ---------- operaciones ----------
+
+    def estado(self) -> dict:
+        return {
+            "ok": True,
+            "pid": os.getpid(),
+            "loaded": self.pipeline is not None,
+            "busy": self._job_lock.locked(),
+            "idle_s": round(time.monotonic() - self.last_used, 1),
+            "uptime_s": round(time.time() - self.started, 1),
+            **self.stats,
+        }
+
+    def _trabajo(self, msg: dict) -> dict:
+        with self._job_lock:
+            reset_cancel()
+            load_s = self._asegurar_pipeline()
+            t0 = time.perf_counter()
+            try:
+                self.generar(self.pipeline, msg["json_path"], msg.get("output_root", "output"),
+                             msg.get("libro"), msg.get("capitulo"))
+            finally:
+                self.last_used = time.monotonic()
+                self.stats["jobs"] += 1
+            return {"ok": True, "cancelled": should_cancel(), "load_s": load_s,
+                    "gen_s": time.perf_counter() - t0}
+
+    def _atender(self, conn):
+        with conn:
+            try:
+                msg = conn.recv()
+            except (EOFError, OSError):
+                return
+            op = msg.get("op")
+            try:
+                if op == "ping":
+                    respuesta = self.estado()
+                elif op == "generar":
+                    respuesta = self._trabajo(msg)
+                elif op == "cancel":
+                    request_cancel()
+                    respuesta = {"ok": True}
+                elif op == "unload":
+                    self._descargar("pedido")
+                    respuesta = {"ok": True}
+                elif op == "shutdown":
+                    respuesta = {"ok": True}
+                    self._stop.set()
+                else:
+                    respuesta = {"ok": False, "error": f"Operación desconocida: {op!r}"}
+            except Exception as e:
+                respuesta = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            try:
+                conn.send(respuesta)
+            except (EOFError, OSError):
+                pass  # el cliente se fue (p. ej. el bot se reinició)
+        if op == "shutdown":
+            self._cerrar_listener()
+
+    def _cerrar_listener(self):
+        if self._listener is not None:
+            try:
+                # accept() no se despierta solo: una conexión propia lo desbloquea
+                Client(self.address, authkey=self.authkey).close()
+            except OSError:
+                pass
+
+    def serve(self, precargar: bool = False):
+        self._listener = Listener(self.address, authkey=self.authkey)
+        print(f"[worker] Escuchando en {self.address} (descarga tras {self.idle_timeout:.0f} s inactivo)")
+        threading.Thread(target=self._vigilar_inactividad, daemon=True).start()
+        if precargar:
+            # En otro hilo: los ping se responden mientras carga; un trabajo espera al lock
+            threading.Thread(target=self._precargar, daemon=True).start()
+        try:
+            while not self._stop.is_set():
+                try:
+                    conn = self._listener.accept()
+                except OSError:
+                    continue  # authkey inválida u otra conexión rota
+                if self._stop.is_set():
+                    conn.close()
+                    break
+                threading.Thread(target=self._atender, args=(conn,), daemon=True).start()
+        finally:
+            self._listener.close()
+            self.pipeline = None
+            _liberar_memoria()
+            print("[worker] Terminado")
+
+
+# ============ CLIENTE ============
+
+def _pedir(msg: dict, address=IMAGE_WORKER_ADDRESS, authkey: bytes | None = None) -> dict:
+    try:
+        conn = Client(address, authkey=_clave(authkey))
+    except OSError as e:
+        raise WorkerNoDisponible(f"Worker de imágenes no disponible en {address}: {e}") from e
+    with conn:
+        try:
+            conn.send(msg)
+            return conn.recv()
+        except (EOFError, OSError) as e:
+            raise WorkerNoDisponible(f"Se perdió la conexión con el worker de imágenes: {e!r}") from e
+
+
+def ping(address=IMAGE_WORKER_ADDRESS, authkey: bytes | None = None) -> dict | None:
+    """Health check: estado del worker, o None si no responde."""
+    try:
+        return _pedir({"op": "ping"}, address, authkey)
+    except (WorkerNoDisponible, EOFError, OSError):
+        return None
+
+
+def asegurar_worker(timeout: float = 30.0, address=IMAGE_WORKER_ADDRESS, authkey: bytes | None = None) -> dict:
+    """Devuelve el estado del worker; si no hay ninguno, lo arranca en segundo plano y espera."""
+    estado = ping(address, authkey)
+    if estado is not None:
+        return estado
+
+    print("[IMG] Arrancando worker de imágenes...")
+    flags = {}
+    if os.name == "nt":
+        flags["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.DETACHED_PROCESS
+    else:
+        flags["start_new_session"] = True
+    subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve()), "serve", "--precargar"],
+        cwd=str(Path.cwd()),
+        **flags,
+    )
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        time.sleep(0.25)
+        estado = ping(address, authkey)
+        if estado is not None:
+            return estado
+    raise WorkerNoDisponible(f"El worker de imágenes no respondió en {timeout:.0f} s")
+
+
+def generar_en_worker(
+    json_path: str | Path,
+    output_root: str = "output",
+    libro: str | None = None,
+    capitulo: int | None = None,
+    address=IMAGE_WORKER_ADDRESS,
+    authkey: bytes | None = None,
+) -> dict:
+    """
+    Manda el JSON de un capítulo al worker y espera el resultado. Si en este
+    proceso se pide cancelar (should_cancel), se reenvía el cancel al worker.
+    """
+    authkey = _clave(authkey)
+    try:
+        conn = Client(address, authkey=authkey)
+    except OSError as e:
+        raise WorkerNoDisponible(f"Worker de imágenes no disponible en {address}: {e}") from e
+
+    with conn:
+        try:
+            conn.send({
+                "op": "generar",
+                "json_path": str(Path(json_path).resolve()),
+                "output_root": str(Path(output_root).resolve()),
+                "libro": libro,
+                "capitulo": capitulo,
+            })
+            cancel_enviado = False
+            while not conn.poll(0.5):
+                if should_cancel() and not cancel_enviado:
+                    _pedir({"op": "cancel"}, address, authkey)
+                    cancel_enviado = True
+            respuesta = conn.recv()
+        except (EOFError, OSError) as e:
+            # El worker murió a mitad del trabajo (OOM, kill) o se cortó la conexión
+            raise WorkerNoDisponible(f"Se perdió la conexión con el worker de imágenes: {e!r}") from e
+
+    if not respuesta.get("ok"):
+        raise RuntimeError(f"Worker de imágenes: {respuesta.get('error')}")
+    return respuesta
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Worker residente de Z-Image")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_serve = sub.add_parser("serve", help="Carga el modelo a demanda y atiende trabajos")
+    p_serve.add_argument("--idle", type=float, default=IMAGE_WORKER_IDLE_S,
+                         help="Segundos sin trabajos antes de descargar el modelo")
+    p_serve.add_argument("--precargar", action="store_true", help="Cargar el modelo al arrancar")
+    sub.add_parser("ping", help="Estado del worker")
+    sub.add_parser("unload", help="Libera el modelo sin terminar el proceso")
+    sub.add_parser("shutdown", help="Termina el worker")
+    args = parser.parse_args()
+
+    if args.cmd == "serve":
+        ImageWorker(idle_timeout=args.idle).serve(precargar=args.precargar)
+    elif args.cmd == "ping":
+        print(ping() or "Worker no disponible")
+    else:
+        try:
+            print(_pedir({"op": args.cmd}))
+        except WorkerNoDisponible as e:
+            print(e)
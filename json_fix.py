@@ -0,0 +1,182 @@
+# json_fix.py
+"""
+Reparación local de JSON mal formado devuelto por el LLM, antes de pagar
+otra llamada:
+
+  - bloques ```json ... ``` y texto antes/después del objeto
+  - comentarios // y /* */ fuera de strings (el prompt del refinador los trae)
+  - comas colgantes antes de } o ]
+  - saltos de línea crudos dentro de strings
+  - solo con allow_truncated=True: objetos y arrays truncados (respuesta
+    cortada por max_tokens); se descarta el último valor incompleto (un string
+    o número a medias nunca se da por bueno) y se cierra lo abierto. Por
+    defecto una respuesta truncada es irreparable: el objeto cerrado parece
+    válido pero le faltan items o campos, mejor repetir que perder contenido.
+
+Uso:
+    obj = loads_lenient(texto)        # ValueError si no hay forma de repararlo
+
+    with contar_reparaciones() as conteo:
+        ...                           # conteo.reparados / conteo.irreparables
+"""
+import json
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+_CLOSERS = {"{": "}", "[": "]"}
+
+_CONTEO = ContextVar("json_fix_conteo", default=None)
+
+
+class Conteo:
+    def __init__(self):
+        self.reparados = 0
+        self.irreparables = 0
+
+
+@contextmanager
+def contar_reparaciones():
+    """Cuenta las reparaciones hechas dentro del bloque (por llamada, para telemetría)."""
+    conteo = Conteo()
+    token = _CONTEO.set(conteo)
+    try:
+        yield conteo
+    finally:
+        _CONTEO.reset(token)
+
+
+def _anotar(resultado: str):
+    conteo = _CONTEO.get()
+    if conteo is not None:
+        setattr(conteo, resultado, getattr(conteo, resultado) + 1)
+
+
+def _recortar(texto: str) -> str:
+    """Quita fences de markdown y el texto fuera del primer objeto/array."""
+    m = _FENCE_RE.search(texto)
+    if m and m.group(1).strip():
+        texto = m.group(1)
+    inicios = [i for i in (texto.find("{"), texto.find("[")) if i != -1]
+    return texto[min(inicios):] if inicios else texto
+
+
+def _escanear(texto: str):
+    """
+    Recorre el texto fuera/dentro de strings y devuelve:
+      salida   : texto sin comentarios, sin comas colgantes, con \\n escapados en strings
+      pila     : aperturas { [ sin cerrar al final
+      en_string: si terminó dentro de un string
+      cortes   : [(largo_salida, pila)] justo antes de cada coma, puntos seguros para truncar
+    """
+    salida = []
+    pila = []
+    cortes = []
+    en_string = escape = False
+    i, n = 0, len(texto)
+    while i < n:
+        c = texto[i]
+        if en_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                en_string = False
+            elif c == "\n":
+                c = "\\n"
+            elif c == "\r":
+                c = ""
+            salida.append(c)
+            i += 1
+            continue
+
+        if c == '"':
+            en_string = True
+        elif c == "/" and texto.startswith("//", i):
+            fin = texto.find("\n", i)
+            i = n if fin == -1 else fin
+            continue
+        elif c == "/" and texto.startswith("/*", i):
+            fin = texto.find("*/", i + 2)
+            i = n if fin == -1 else fin + 2
+            continue
+        elif c in "{[":
+            pila.append(c)
+        elif c in "}]":
+            # coma colgante: "a": 1, }
+            while salida and salida[-1].isspace():
+                salida.pop()
+            if salida and salida[-1] == ",":
+                salida.pop()
+            if pila and _CLOSERS[pila[-1]] == c:
+                pila.pop()
+            else:
+                i += 1
+                continue  # cierre sobrante
+            if not pila:
+                salida.append(c)
+                break  # fin del valor raíz: lo que sigue es texto ajeno
+        elif c == ",":
+            cortes.append((len(salida), list(pila)))
+        salida.append(c)
+        i += 1
+
+    if escape and salida:
+        salida.pop()  # barra invertida suelta al final de un string cortado
+    return "".join(salida), pila, en_string, cortes
+
+
+def _cerrar(texto: str, pila: list) -> str:
+    texto = texto.rstrip()
+    while texto.endswith(","):
+        texto = texto[:-1].rstrip()
+    return texto + "".join(_CLOSERS[c] for c in reversed(pila))
+
+
+def _final_completo(salida: str) -> bool:
+    # Un string cerrado, un objeto/array o un literal completo; un número puede estar a medias
+    final = salida.rstrip()
+    return final.endswith(('"', "}", "]", "true", "false", "null"))
+
+
+def repair_json(texto: str, allow_truncated: bool = False):
+    """Devuelve el objeto reparado o lanza ValueError."""
+    recortado = _recortar(texto)
+    salida, pila, en_string, cortes = _escanear(recortado)
+
+    truncado = en_string or bool(pila)
+    if truncado and not allow_truncated:
+        raise ValueError("JSON truncado")
+
+    candidatos = []
+    if not en_string and (not pila or _final_completo(salida)):
+        candidatos.append(_cerrar(salida, pila))
+    # El último valor quedó a medias (o la clave sin valor): se retrocede
+    # hasta la última coma y se cierra desde ahí.
+    if truncado:
+        candidatos += [_cerrar(salida[:largo], p) for largo, p in reversed(cortes)]
+
+    for candidato in candidatos:
+        try:
+            return json.loads(candidato, strict=False)
+        except ValueError:
+            continue
+    raise ValueError("JSON irreparable")
+
+
+def loads_lenient(texto: str, allow_truncated: bool = False):
+    """json.loads, y si falla, reparación local. ValueError si tampoco se puede."""
+    try:
+        return json.loads(texto)
+    except ValueError:
+        pass
+    try:
+        obj = repair_json(texto, allow_truncated=allow_truncated)
+    except ValueError:
+        _anotar("irreparables")
+        raise
+    _anotar("reparados")
+    return obj
+
@@ -0,0 +1,329 @@
+# llm_batch.py
+"""
+Generación de JSON para muchos capítulos a la vez con la API de batch de Mistral.
+
+En vez de ~10 llamadas síncronas por capítulo, cada etapa del pipeline se manda
+como un único job por modelo con las peticiones de todos los capítulos:
+
+    [fragmentos] -> contenido -> refinar -> guion -> tts
+
+Entre etapas se hace polling del job, se descargan los resultados y se arman
+las peticiones de la etapa siguiente. Si un job entero termina mal (FAILED,
+TIMEOUT_EXCEEDED, CANCELLED) sus líneas sin resultado se reenvían como un
+batch nuevo (BATCH_RESUBMITS veces). Solo unas pocas líneas sueltas (error de
+la línea o JSON que no parsea) se reintentan por la vía síncrona; si faltan
+más, la etapa se corta para esas líneas y se informa, en vez de convertir un
+fallo del batch en una corrida síncrona completa.
+La caché de respuestas (llm_pipeline) se consulta antes de subir nada.
+"""
+import json
+import time
+from typing import Dict, List, Any
+
+from bible_io import log, estimate_tokens, chunk_chapter
+from pipeline_cancel import should_cancel
+from rate_limit import get_provider
+from json_fix import contar_reparaciones
+from llm_metrics import metrics_context, record_call
+from prompts import SYSTEM_PROMPT_CHUNK_ANALYST
+from llm_pipeline import (
+    CONTENT_MAX_TOKENS,
+    CHUNK_MAX_TOKENS,
+    validate_video_structure,
+    reparar_refinado_llm,
+    _cache_lookup,
+    _cache_store,
+    _complete,
+    _parse_json,
+    _parse_text,
+    _req_fragmento,
+    _req_contenido,
+    _req_refinar,
+    _req_guion,
+    _req_tts,
+    _texto_base_guion,
+    _unir_notas,
+)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_POLL_INTERVAL = 30.0
+BATCH_TERMINAL = {"SUCCESS", "FAILED", "TIMEOUT_EXCEEDED", "CANCELLED"}
+BATCH_RESUBMITS = 1
+# Líneas sin resultado que se aceptan reintentar en síncrono: max(mínimo, fracción de la etapa)
+SYNC_FALLBACK_MIN = 5
+SYNC_FALLBACK_FRACTION = 0.1
+
+
+def _capitulo_de(custom_id: str) -> int:
+    # custom_id: "<cap>", "<cap>:<item>" o "<cap>:f<fragmento>"
+    return int(custom_id.split(":")[0])
+
+
+class BatchRunner:
+    """
+    Ejecuta un conjunto de peticiones de chat {custom_id: kwargs} como jobs de batch
+    (uno por modelo) y devuelve {custom_id: resultado parseado | None}.
+    """
+
+    def __init__(self, client, poll_interval: float = BATCH_POLL_INTERVAL, timeout_hours: int = 24):
+        self.client = client
+        self.poll_interval = poll_interval
+        self.timeout_hours = timeout_hours
+        self.stats = {"jobs": 0, "batched": 0, "cached": 0, "fallbacks": 0, "failed": 0,
+                      "resubmitted": 0, "aborted": 0}
+        self.provider = get_provider("mistral")
+
+    def _submit(self, stage: str, model: str, requests: Dict[str, dict]) -> str:
+        lines = []
+        for custom_id, request in requests.items():
+            body = {k: v for k, v in request.items() if k != "model"}
+            lines.append(json.dumps({"custom_id": custom_id, "body": body}, ensure_ascii=False))
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+
+        uploaded = self.provider.call(lambda: self.client.files.upload(
+            file={"file_name": f"{stage}.jsonl", "content": data},
+            purpose="batch",
+        ))
+        job = self.provider.call(lambda: self.client.batch.jobs.create(
+            input_files=[uploaded.id],
+            model=model,
+            endpoint=BATCH_ENDPOINT,
+            metadata={"stage": stage},
+            timeout_hours=self.timeout_hours,
+        ))
+        self.stats["jobs"] += 1
+        log(f"[batch] {stage}: job {job.id} con {len(requests)} peticiones ({model})")
+        return job.id
+
+    def _wait(self, job_ids: List[str]) -> list:
+        pending = set(job_ids)
+        done = []
+        while pending:
+            if should_cancel():
+                for job_id in pending:
+                    self.provider.call(lambda: self.client.batch.jobs.cancel(job_id=job_id))
+                log("⛔ Cancelado: jobs de batch pendientes cancelados.")
+                return done
+            for job_id in list(pending):
+                job = self.provider.call(lambda: self.client.batch.jobs.get(job_id=job_id))
+                if job.status in BATCH_TERMINAL:
+                    log(f"[batch] job {job_id}: {job.status}")
+                    pending.discard(job_id)
+                    done.append(job)
+            if pending:
+                time.sleep(self.poll_interval)
+        return done
+
+    def _download(self, file_id) -> List[dict]:
+        if not file_id:
+            return []
+        raw = self.provider.call(lambda: self.client.files.download(file_id=file_id).read())
+        return [json.loads(line) for line in raw.decode("utf-8").splitlines() if line.strip()]
+
+    def _contents(self, jobs) -> Dict[str, tuple]:
+        """{custom_id: (texto, usage)} de las líneas que salieron bien."""
+        contents = {}
+        for job in jobs:
+            for line in self._download(job.output_file):
+                response = line.get("response") or {}
+                if line.get("error") or response.get("status_code", 200) != 200:
+                    continue
+                try:
+                    body = response["body"]
+                    contents[line["custom_id"]] = (body["choices"][0]["message"]["content"], body.get("usage"))
+                except (KeyError, IndexError, TypeError):
+                    continue
+        return contents
+
+    def run(self, stage: str, requests: Dict[str, dict], parse) -> Dict[str, Any]:
+        results = {}
+        keys = {}
+        by_model: Dict[str, Dict[str, dict]] = {}
+        for custom_id, request in requests.items():
+            key, cached = _cache_lookup(stage, request, parse)
+            keys[custom_id] = key
+            if cached is not None:
+                results[custom_id] = cached
+                self.stats["cached"] += 1
+                record_call(stage, request["model"], attempts=0, cached=True, batch=True,
+                            capitulo=_capitulo_de(custom_id))
+            else:
+                by_model.setdefault(request["model"], {})[custom_id] = request
+
+        if not by_model:
+            return results
+
+        contents = {}
+        pendientes = by_model
+        for intento in range(1 + BATCH_RESUBMITS):
+            job_models = {self._submit(stage, model, reqs): model for model, reqs in pendientes.items()}
+            jobs = self._wait(list(job_models))
+            if should_cancel():
+                return results
+            contents.update(self._contents(jobs))
+            # Jobs que no terminaron bien: sus líneas sin resultado van en un batch nuevo
+            pendientes = {}
+            for job in jobs:
+                if job.status == "SUCCESS":
+                    continue
+                model = job_models[job.id]
+                faltan = {cid: r for cid, r in by_model[model].items() if cid not in contents}
+                if faltan:
+                    pendientes[model] = faltan
+            if not pendientes or intento == BATCH_RESUBMITS:
+                break
+            n = sum(len(reqs) for reqs in pendientes.values())
+            self.stats["resubmitted"] += n
+            log(f"[batch] {stage}: {n} peticiones de jobs fallidos, se reenvían en un batch nuevo")
+
+        sin_resultado = sum(1 for reqs in by_model.values() for cid in reqs if cid not in contents)
+        total = sum(len(reqs) for reqs in by_model.values())
+        sync_max = max(SYNC_FALLBACK_MIN, int(SYNC_FALLBACK_FRACTION * total))
+        abortar = sin_resultado > sync_max
+        if abortar:
+            log(f"❌ [batch] {stage}: {sin_resultado}/{total} peticiones sin resultado del batch; "
+                f"más de {sync_max}, no se reintentan en síncrono")
+
+        for reqs in by_model.values():
+            for custom_id, request in reqs.items():
+                capitulo = _capitulo_de(custom_id)
+                if custom_id in contents:
+                    content, usage = contents[custom_id]
+                    with contar_reparaciones() as conteo:
+                        try:
+                            results[custom_id] = parse(content)
+                        except ValueError:
+                            pass
+                    record_call(stage, request["model"], usage=usage, batch=True,
+                                json_repairs=conteo.reparados, json_failures=conteo.irreparables,
+                                capitulo=capitulo)
+                    if custom_id in results:
+                        _cache_store(stage, keys[custom_id], content)
+                        self.stats["batched"] += 1
+                        continue
+
+                if abortar and custom_id not in contents:
+                    self.stats["aborted"] += 1
+                    results[custom_id] = None
+                    continue
+
+                # Falló en el batch: misma petición por la vía síncrona
+                self.stats["fallbacks"] += 1
+                try:
+                    with metrics_context(capitulo=capitulo):
+                        content, results[custom_id] = _complete(self.client, stage, parse, request)
+                    _cache_store(stage, keys[custom_id], content)
+                except Exception as e:
+                    log(f"⚠ [batch] {stage} {custom_id}: {e}")
+                    self.stats["failed"] += 1
+                    results[custom_id] = None
+        return results
+
+
+def procesar_capitulos_batch(
+    client,
+    PRINCIPAL_PROMPT,
+    SYSTEM_PROMPT_REFINER,
+    SYSTEM_PROMPT_SCRIPT_DOCTOR,
+    SYSTEM_PROMPT_ELEVEN_V3,
+    textos: Dict[int, str],
+    model_text: str = "mistral-large-latest",
+    model_script: str = "mistral-large-latest",
+    model_refiner: str = "mistral-medium-latest",
+    model_voice: str = "mistral-small-latest",
+    chunk_model: str = "mistral-small-latest",
+    max_input_tokens: int = CONTENT_MAX_TOKENS,
+    poll_interval: float = BATCH_POLL_INTERVAL,
+) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Igual que procesar_capitulo para cada capítulo de `textos` ({capitulo: texto}),
+    pero etapa por etapa en batch. Devuelve {capitulo: resultados}; un capítulo
+    sin contenido válido queda con lista vacía.
+    """
+    runner = BatchRunner(client, poll_interval=poll_interval)
+    textos = dict(textos)
+
+    # 0) Capítulos largos: notas por fragmentos (map) antes del contenido
+    largos = {
+        cap: chunk_chapter(texto, CHUNK_MAX_TOKENS)
+        for cap, texto in textos.items()
+        if estimate_tokens(texto) > max_input_tokens
+    }
+    if largos:
+        notas = runner.run("fragmento", {
+            f"{cap}:f{j}": _req_fragmento(SYSTEM_PROMPT_CHUNK_ANALYST, c["texto"], chunk_model, 0.3, 400)
+            for cap, (_, chunks) in largos.items()
+            for j, c in enumerate(chunks)
+        }, _parse_text)
+        for cap, (header, chunks) in largos.items():
+            textos[cap] = _unir_notas(header, chunks, [notas.get(f"{cap}:f{j}") for j in range(len(chunks))])
+    if should_cancel():
+        return {}
+
+    # 1) Contenido base
+    contenidos = runner.run("contenido", {
+        str(cap): _req_contenido(PRINCIPAL_PROMPT, texto, model_text, 0.6)
+        for cap, texto in textos.items()
+    }, _parse_json)
+    if should_cancel():
+        return {}
+
+    items: Dict[str, dict] = {}
+    for cap in textos:
+        contenido = contenidos.get(str(cap))
+        lista = contenido.get("contenido", []) if isinstance(contenido, dict) else []
+        if not lista:
+            log(f"❌ Capítulo {cap}: el LLM no devolvió una lista en 'contenido'.")
+        for i, item in enumerate(lista):
+            items[f"{cap}:{i}"] = item
+
+    # 2) Refinar visuales
+    refinados = runner.run("refinar", {
+        iid: _req_refinar(SYSTEM_PROMPT_REFINER, item, model_refiner, 0.6)
+        for iid, item in items.items()
+    }, _parse_json)
+    if should_cancel():
+        return {}
+    for iid, item in items.items():
+        refinado = refinados.get(iid)
+        if not validate_video_structure(refinado):
+            # Pocos casos: se reparan al momento, pidiendo solo los campos que faltan
+            with metrics_context(capitulo=_capitulo_de(iid)):
+                refinado = reparar_refinado_llm(client, item, refinado, model=model_refiner)
+        if refinado is not None:
+            items[iid] = refinado
+        else:
+            log(f"⚠ JSON inválido en {iid} ({item.get('tipo', 'DESCONOCIDO')}), usando versión base")
+
+    # 3) Script Doctor
+    guion_reqs = {}
+    for iid, item in items.items():
+        texto_base = _texto_base_guion(item)
+        if texto_base:
+            guion_reqs[iid] = _req_guion(SYSTEM_PROMPT_SCRIPT_DOCTOR, item, texto_base, model_script, 0.6, 800)
+    guiones = runner.run("guion", guion_reqs, _parse_text)
+    if should_cancel():
+        return {}
+
+    # 4) TTS-friendly
+    tts = runner.run("tts", {
+        iid: _req_tts(SYSTEM_PROMPT_ELEVEN_V3, items[iid].get("tipo", "DESCONOCIDO"), guion, model_voice, 0.6, 800)
+        for iid, guion in guiones.items()
+        if guion
+    }, _parse_text)
+    if should_cancel():
+        return {}
+
+    resultados: Dict[int, List[Dict[str, Any]]] = {cap: [] for cap in textos}
+    for iid, item in items.items():
+        cap = int(iid.split(":")[0])
+        item["guion_tts"] = tts.get(iid) or ""
+        resultados[cap].append(item)
+
+    log(
+        f"[batch] {runner.stats['jobs']} jobs, {runner.stats['batched']} por batch, "
+        f"{runner.stats['cached']} de caché, {runner.stats['resubmitted']} reenviadas en batch, "
+        f"{runner.stats['fallbacks']} reintentos síncronos, {runner.stats['failed']} fallidas, "
+        f"{runner.stats['aborted']} sin resultado por fallo del batch"
+    )
+    return resultados
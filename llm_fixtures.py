@@ -0,0 +1,247 @@
+# llm_fixtures.py
+"""
+Cliente falso con la misma forma que Mistral (chat.complete / chat.complete_async)
+para probar y medir llm_pipeline sin red ni API key.
+
+Reconoce la etapa por el mensaje de usuario y devuelve respuestas válidas:
+  - "Capítulo a analizar" -> JSON con HISTORIA, CURIOSIDAD y ORACION
+  - "Refine this video"   -> el mismo item con secuencia_visual/transiciones completas
+  - {"faltan": [...]}     -> JSON solo con esas claves (reparación del refinado)
+  - "TEXTO BASE"          -> guion expandido (Script Doctor)
+  - "GUION EXPANDIDO"     -> el mismo guion con etiquetas de voz
+  - resto                 -> texto plano
+
+`latency` simula el tiempo de respuesta del servidor (segundos por llamada, o
+{modelo: segundos});
+con `jitter` cada llamada tarda latency * U(1 - jitter, 1 + jitter) (semilla fija)
+y con `tail` (prob, factor) una fracción de llamadas tarda `factor` veces más.
+`server_rps` imita el límite del servidor: lo que lo excede recibe 429 con
+Retry-After; `down = True` hace que todo responda 503.
+FakeBatchMistral añade files/batch.jobs para probar llm_batch.
+"""
+import asyncio
+import itertools
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+
+def _item(tipo: str) -> dict:
+    item = {"tipo": tipo, "referencia": "Rut 1:1-22"}
+    if tipo == "ORACION":
+        item.update(prompt_imagen="a quiet field at dawn", texto_imagen="Fiel", oracion="Señor, guíanos.")
+        return item
+    item["guion" if tipo == "HISTORIA" else "curiosidad"] = f"Texto base de {tipo.lower()}."
+    item["secuencia_visual"] = {f"frame_{i}": f"escena {i}" for i in range(1, 7)}
+    item["transiciones"] = {f"transicion_{i}_{i+1}": "fade" for i in range(1, 6)}
+    return item
+
+
+def respuesta_por_defecto(request: dict) -> str:
+    user = request["messages"][-1]["content"]
+    if user.startswith("{") and '"faltan"' in user:
+        # Reparación dirigida: solo las claves pedidas
+        return json.dumps({k: f"Repaired {k}, Classic Biblical Art style." for k in json.loads(user)["faltan"]})
+    if user.startswith("Capítulo a analizar"):
+        return json.dumps({"contenido": [_item(t) for t in ("HISTORIA", "CURIOSIDAD", "ORACION")]})
+    if user.startswith("Refine this video"):
+        return user.split("\n", 1)[1]
+    if user.startswith("Fragmento"):
+        return "Notas del fragmento."
+    if "GUION EXPANDIDO:" in user:
+        return "[calm] " + user.split("GUION EXPANDIDO:", 1)[1].strip()
+    if "TEXTO BASE:" in user:
+        return _GUION
+    return "Guion de prueba para la voz."
+
+
+_GUION = (
+    "En los días en que gobernaban los jueces hubo hambre en la tierra, y un hombre de Belén "
+    "de Judá salió con su mujer y sus dos hijos a vivir en los campos de Moab. Lo que parecía "
+    "una huida terminó siendo el comienzo de una historia de lealtad que cambiaría el linaje de David."
+)
+
+
+def _usage(request: dict, content: str) -> dict:
+    # ~4 caracteres por token, suficiente para probar la telemetría
+    prompt = sum(len(m["content"]) for m in request["messages"]) // 4
+    completion = len(content) // 4
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+class FakeAPIError(Exception):
+    """Error HTTP con la forma de los SDKs (status_code + headers)."""
+
+    def __init__(self, status_code: int, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class _Chat:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def complete(self, **request):
+        time.sleep(self._owner._registrar(request))
+        return self._owner._respuesta(request)
+
+    async def complete_async(self, **request):
+        await asyncio.sleep(self._owner._registrar(request))
+        return self._owner._respuesta(request)
+
+
+class FakeMistral:
+    """
+    Uso:
+        client = FakeMistral(latency=0.3)
+        procesar_capitulo(client, ...)
+        client.calls  # nº de llamadas recibidas
+
+    `responder(request) -> str` permite sustituir el contenido devuelto.
+    """
+
+    def __init__(self, latency: float = 0.0, responder=None, jitter: float = 0.0, seed: int = 0,
+                 server_rps: float | None = None, retry_after: float = 1.0, tail=(0.0, 1.0)):
+        self.latency = latency
+        self.jitter = jitter
+        self.tail = tail
+        self._rng = random.Random(seed)
+        self.responder = responder or respuesta_por_defecto
+        self.server_rps = server_rps
+        self.retry_after = retry_after
+        self.down = False
+        self.calls = 0
+        self.rejected = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.requests = []
+        self._recientes = []
+        self._lock = threading.Lock()
+        self.chat = _Chat(self)
+
+    def _registrar(self, request: dict) -> float:
+        """Anota la petición y devuelve cuánto debe tardar (o lanza el error HTTP simulado)."""
+        with self._lock:
+            self.calls += 1
+            if self.down:
+                self.rejected += 1
+                raise FakeAPIError(503)
+            if self.server_rps:
+                now = time.monotonic()
+                self._recientes = [t for t in self._recientes if now - t < 1.0]
+                if len(self._recientes) >= self.server_rps:
+                    self.rejected += 1
+                    raise FakeAPIError(429, {"Retry-After": str(self.retry_after)})
+                self._recientes.append(now)
+            self.requests.append(request)
+            latency = self.latency.get(request["model"], 0.0) if isinstance(self.latency, dict) else self.latency
+            latencia = latency * self._rng.uniform(1 - self.jitter, 1 + self.jitter)
+            if self._rng.random() < self.tail[0]:
+                latencia *= self.tail[1]
+            return latencia
+
+    def _respuesta(self, request: dict):
+        content = self.responder(request)
+        usage = _usage(request, content)
+        with self._lock:
+            self.prompt_tokens += usage["prompt_tokens"]
+            self.completion_tokens += usage["completion_tokens"]
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=SimpleNamespace(**usage))
+
+
+class _Files:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def upload(self, file, purpose="batch"):
+        return SimpleNamespace(id=self._owner._store(file["content"]))
+
+    def download(self, file_id):
+        data = self._owner.files_data[file_id]
+        return SimpleNamespace(read=lambda: data)
+
+
+class _Jobs:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, input_files, model, endpoint, metadata=None, timeout_hours=24):
+        return self._owner._create_job(input_files, model)
+
+    def get(self, job_id):
+        return self._owner._job(job_id)
+
+    def cancel(self, job_id):
+        job = self._owner.jobs[job_id]
+        job.status = "CANCELLED"
+        return job
+
+
+class FakeBatchMistral(FakeMistral):
+    """
+    Batch local: cada job termina `job_latency` segundos después de crearse.
+    Los custom_id en `fail_ids` salen con error en el archivo de salida
+    (para probar el reintento síncrono); los primeros `fail_jobs` jobs terminan
+    FAILED sin salida (para probar el reenvío en batch).
+    """
+
+    def __init__(self, latency: float = 0.0, job_latency: float = 0.0, responder=None, fail_ids=(), fail_jobs=0):
+        super().__init__(latency=latency, responder=responder)
+        self.job_latency = job_latency
+        self.fail_ids = set(fail_ids)
+        self.fail_jobs = fail_jobs
+        self.files_data = {}
+        self.jobs = {}
+        self.batch_requests = 0
+        self._ids = itertools.count(1)
+        self.files = _Files(self)
+        self.batch = SimpleNamespace(jobs=_Jobs(self))
+
+    def _store(self, data: bytes) -> str:
+        file_id = f"file-{next(self._ids)}"
+        self.files_data[file_id] = data
+        return file_id
+
+    def _create_job(self, input_files, model):
+        job_id = f"job-{next(self._ids)}"
+        self.jobs[job_id] = SimpleNamespace(
+            id=job_id, status="QUEUED", model=model, input_files=input_files,
+            output_file=None, error_file=None, created=time.monotonic(),
+        )
+        return self.jobs[job_id]
+
+    def _job(self, job_id):
+        job = self.jobs[job_id]
+        if job.status in ("QUEUED", "RUNNING") and time.monotonic() - job.created >= self.job_latency:
+            self._run_job(job)
+        elif job.status == "QUEUED":
+            job.status = "RUNNING"
+        return job
+
+    def _run_job(self, job):
+        if self.fail_jobs > 0:
+            self.fail_jobs -= 1
+            job.status = "FAILED"
+            return
+        out = []
+        for file_id in job.input_files:
+            for line in self.files_data[file_id].decode("utf-8").splitlines():
+                entry = json.loads(line)
+                with self._lock:
+                    self.batch_requests += 1
+                if entry["custom_id"] in self.fail_ids:
+                    out.append({"custom_id": entry["custom_id"], "response": {"status_code": 500, "body": {}},
+                                "error": {"message": "fallo simulado"}})
+                    continue
+                request = {"model": job.model, **entry["body"]}
+                content = self.responder(request)
+                body = {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}],
+                        "usage": _usage(request, content)}
+                out.append({"custom_id": entry["custom_id"], "response": {"status_code": 200, "body": body},
+                            "error": None})
+        job.output_file = self._store("\n".join(json.dumps(o, ensure_ascii=False) for o in out).encode("utf-8"))
+        job.status = "SUCCESS"
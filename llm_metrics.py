@@ -0,0 +1,241 @@
+# llm_metrics.py
+"""
+Telemetría por llamada del pipeline LLM.
+
+Cada llamada de chat (y cada acierto de caché) agrega una línea JSON a
+LLM_METRICS_PATH:
+
+    {"ts", "libro", "capitulo", "stage", "model", "prompt_tokens",
+     "completion_tokens", "latency_s", "total_s", "attempts", "cached",
+     "batch", "json_repairs", "json_failures", "hedge", "cost_usd", "error"}
+
+  latency_s : duración del último intento (lo que tardó el modelo)
+  total_s   : desde que se pidió hasta que se obtuvo, con esperas del
+              limitador y reintentos incluidos
+  json_repairs  : respuestas con JSON mal formado reparadas localmente
+  json_failures : respuestas irreparables (cada una costó un reintento pagado)
+  cascade_step  : solo con la cascada de modelos: 0 = modelo rápido, 1 = escalada
+  hedge         : None si no se duplicó la petición (hedging.py); si se duplicó,
+                  "original" o "duplicado" según cuál respondió primero
+
+El capítulo se toma del contexto (metrics_context), que se hereda en tareas
+asyncio y en asyncio.to_thread.
+
+Reporte:
+    python llm_metrics.py report [--por capitulo|etapa|modelo] [--libro genesis] [--ultimos 7]
+"""
+import contextvars
+import json
+import statistics
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+
+from config import LLM_METRICS_PATH
+
+# USD por millón de tokens (entrada, salida). La API de batch cobra la mitad.
+MODEL_PRICES = {
+    "mistral-large-latest": (2.0, 6.0),
+    "mistral-medium-latest": (0.4, 2.0),
+    "mistral-small-latest": (0.1, 0.3),
+}
+BATCH_DISCOUNT = 0.5
+
+_CONTEXT = contextvars.ContextVar("llm_metrics_context", default={})
+_LOCK = Lock()
+_PATH = Path(LLM_METRICS_PATH) if LLM_METRICS_PATH else None
+
+
+def set_metrics_path(path: str | Path | None):
+    """Cambia el archivo de métricas (None = no registrar nada)."""
+    global _PATH
+    with _LOCK:
+        _PATH = Path(path) if path else None
+
+
+@contextmanager
+def metrics_context(**campos):
+    """Ej: with metrics_context(libro="genesis", capitulo=3): ..."""
+    token = _CONTEXT.set({**_CONTEXT.get(), **campos})
+    try:
+        yield
+    finally:
+        _CONTEXT.reset(token)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, batch: bool = False) -> float | None:
+    precios = MODEL_PRICES.get(model)
+    if precios is None:
+        return None
+    costo = (prompt_tokens * precios[0] + completion_tokens * precios[1]) / 1_000_000
+    return costo * BATCH_DISCOUNT if batch else costo
+
+
+def _usage_value(usage, campo: str) -> int:
+    if usage is None:
+        return 0
+    valor = usage.get(campo) if isinstance(usage, dict) else getattr(usage, campo, None)
+    return int(valor or 0)
+
+
+def record_call(
+    stage: str,
+    model: str,
+    usage=None,
+    latency_s: float | None = None,
+    total_s: float | None = None,
+    attempts: int = 1,
+    cached: bool = False,
+    batch: bool = False,
+    json_repairs: int = 0,
+    json_failures: int = 0,
+    hedge: str | None = None,
+    error: Exception | None = None,
+    **campos,
+):
+    with _LOCK:
+        path = _PATH
+    if path is None:
+        return
+
+    prompt_tokens = _usage_value(usage, "prompt_tokens")
+    completion_tokens = _usage_value(usage, "completion_tokens")
+    registro = {
+        "ts": time.time(),
+        **_CONTEXT.get(),
+        **campos,
+        "stage": stage,
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "latency_s": round(latency_s, 4) if latency_s is not None else None,
+        "total_s": round(total_s, 4) if total_s is not None else None,
+        "attempts": attempts,
+        "cached": cached,
+        "batch": batch,
+        "json_repairs": json_repairs,
+        "json_failures": json_failures,
+        "hedge": hedge,
+        "cost_usd": 0.0 if cached else estimate_cost(model, prompt_tokens, completion_tokens, batch),
+        "error": f"{type(error).__name__}: {error}" if error else None,
+    }
+    linea = json.dumps(registro, ensure_ascii=False) + "\n"
+    with _LOCK:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(linea)
+
+
+def load_records(path: str | Path | None = None) -> list:
+    path = Path(path) if path else _PATH
+    if path is None or not path.exists():
+        return []
+    registros = []
+    with open(path, "r", encoding="utf-8") as f:
+        for linea in f:
+            try:
+                registros.append(json.loads(linea))
+            except json.JSONDecodeError:
+                continue  # línea a medio escribir
+    return registros
+
+
+_CLAVES = {
+    "capitulo": lambda r: f"{r.get('libro', '?')} {r.get('capitulo', '?')}",
+    "etapa": lambda r: r["stage"],
+    "modelo": lambda r: r["model"],
+}
+
+
+def aggregate(registros: list, por: str = "etapa") -> dict:
+    """
+    {grupo: {calls, cached, errors, retries, json_repairs, json_failures, saved_usd, saved_s,
+             hedged, hedge_wins, cascade, escalated, prompt_tokens, completion_tokens, cost_usd, p50_s, p95_s, total_s}}
+
+    saved_usd / saved_s estiman lo que se habría pagado sin la reparación local:
+    una llamada más (mismo costo y latencia que la reparada) por cada JSON reparado.
+    """
+    clave = _CLAVES[por]
+    grupos = {}
+    for r in registros:
+        grupos.setdefault(clave(r), []).append(r)
+
+    out = {}
+    for grupo, rs in grupos.items():
+        latencias = sorted(r["latency_s"] for r in rs if r.get("latency_s") is not None and not r.get("cached"))
+        out[grupo] = {
+            "calls": len(rs),
+            "cached": sum(1 for r in rs if r.get("cached")),
+            "errors": sum(1 for r in rs if r.get("error")),
+            "retries": sum(max(0, r.get("attempts", 1) - 1) for r in rs),
+            "json_repairs": sum(r.get("json_repairs", 0) for r in rs),
+            "json_failures": sum(r.get("json_failures", 0) for r in rs),
+            "saved_usd": sum((r.get("cost_usd") or 0.0) * r.get("json_repairs", 0) for r in rs),
+            "saved_s": sum((r.get("latency_s") or 0.0) * r.get("json_repairs", 0) for r in rs),
+            "hedged": sum(1 for r in rs if r.get("hedge")),
+            "hedge_wins": sum(1 for r in rs if r.get("hedge") == "duplicado"),
+            "cascade": sum(1 for r in rs if r.get("cascade_step") == 0),
+            "escalated": sum(1 for r in rs if r.get("cascade_step") == 1),
+            "prompt_tokens": sum(r.get("prompt_tokens", 0) for r in rs),
+            "completion_tokens": sum(r.get("completion_tokens", 0) for r in rs),
+            "cost_usd": sum(r.get("cost_usd") or 0.0 for r in rs),
+            "p50_s": statistics.median(latencias) if latencias else 0.0,
+            "p95_s": latencias[min(len(latencias) - 1, int(0.95 * len(latencias)))] if latencias else 0.0,
+            "total_s": sum(r.get("total_s") or 0.0 for r in rs),
+        }
+    return out
+
+
+def print_report(registros: list, por: str = "etapa"):
+    if not registros:
+        print("Sin métricas registradas.")
+        return
+    filas = aggregate(registros, por)
+    print(f"{por:24} {'llamadas':>8} {'caché':>6} {'reint.':>6} {'err':>4} {'json ok':>7} {'json ko':>7} "
+          f"{'tok in':>9} {'tok out':>8} {'p50 s':>6} {'p95 s':>6} {'total s':>8} {'USD':>8}")
+    for grupo, f in sorted(filas.items(), key=lambda x: -x[1]["total_s"]):
+        print(f"{grupo[:24]:24} {f['calls']:8} {f['cached']:6} {f['retries']:6} {f['errors']:4} "
+              f"{f['json_repairs']:7} {f['json_failures']:7} {f['prompt_tokens']:9} {f['completion_tokens']:8} {f['p50_s']:6.2f} {f['p95_s']:6.2f} "
+              f"{f['total_s']:8.1f} {f['cost_usd']:8.4f}")
+    total = aggregate(registros, "etapa")
+    print(f"\nTotal: {len(registros)} llamadas, "
+          f"{sum(f['prompt_tokens'] for f in total.values())} tokens de entrada, "
+          f"{sum(f['completion_tokens'] for f in total.values())} de salida, "
+          f"US$ {sum(f['cost_usd'] for f in total.values()):.4f}")
+    reparados = sum(f["json_repairs"] for f in total.values())
+    if reparados or any(f["json_failures"] for f in total.values()):
+        print(f"JSON: {reparados} reparados localmente, "
+              f"{sum(f['json_failures'] for f in total.values())} reintentados; "
+              f"ahorro estimado {sum(f['saved_s'] for f in total.values()):.1f} s, "
+              f"US$ {sum(f['saved_usd'] for f in total.values()):.4f}")
+    duplicadas = sum(f["hedged"] for f in total.values())
+    if duplicadas:
+        ganadas = sum(f["hedge_wins"] for f in total.values())
+        print(f"Hedging: {duplicadas} peticiones duplicadas ({duplicadas / len(registros):.1%}), "
+              f"el duplicado ganó {ganadas} ({ganadas / duplicadas:.0%})")
+    for etapa, f in sorted(total.items()):
+        if f["cascade"]:
+            print(f"Cascada {etapa}: {f['escalated']}/{f['cascade']} escaladas "
+                  f"({f['escalated'] / f['cascade']:.0%})")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Métricas del pipeline LLM")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_report = sub.add_parser("report", help="Agrega tokens, latencia y costo")
+    p_report.add_argument("--por", choices=sorted(_CLAVES), default="etapa")
+    p_report.add_argument("--libro", default=None)
+    p_report.add_argument("--ultimos", type=float, default=None, help="Solo los últimos N días")
+    p_report.add_argument("--path", default=None, help=f"Por defecto {LLM_METRICS_PATH}")
+    args = parser.parse_args()
+
+    registros = load_records(args.path)
+    if args.libro:
+        registros = [r for r in registros if r.get("libro") == args.libro]
+    if args.ultimos:
+        desde = time.time() - args.ultimos * 86400
+        registros = [r for r in registros if r.get("ts", 0) >= desde]
+    print_report(registros, args.por)
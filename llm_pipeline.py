@@ -1,9 +1,66 @@
 # llm_pipeline.py
+import asyncio
+import contextvars
 import json
-from typing import List, Dict, Any
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import AsyncIterator, List, Dict, Any, Tuple
 
+from config import LLM_CACHE_DIR, LLM_CACHE_MAX_MB, LLM_CACHE_MODE, LLM_CASCADE, LLM_CASCADE_FAST_MODEL
+from disk_cache import DiskCache, make_key
+from hedging import get_hedger
+from json_fix import contar_reparaciones, loads_lenient
+from llm_metrics import metrics_context, record_call
 from pipeline_cancel import should_cancel
-from bible_io import sanitize_text, retry, log
+from rate_limit import get_provider
+from bible_io import log, estimate_tokens, chunk_chapter
+from prompts import SYSTEM_PROMPT_CHUNK_ANALYST, SYSTEM_PROMPT_REFINER_REPAIR
+
+# Presupuesto de tokens del capítulo para mandarlo completo en una sola llamada.
+# Por encima se hace map-reduce: fragmentos analizados en paralelo -> notas -> contenido.
+CONTENT_MAX_TOKENS = 4000
+CHUNK_MAX_TOKENS = 1500
+CHUNK_MAX_WORKERS = 4
+
+# Items (HISTORIA / CURIOSIDAD / ORACION) procesados a la vez en procesar_capitulo_async
+ITEM_MAX_CONCURRENCY = 3
+
+# Rondas de reparación dirigida tras un refinado con campos faltantes o rotos
+REFINE_REPAIR_ROUNDS = 2
+
+
+_CAMPOS_ORACION = ("prompt_imagen", "texto_imagen", "oracion")
+# Campos de ORACION que van en español: si el refinado los pierde se copian del original
+_CAMPOS_ORACION_ORIGINALES = ("texto_imagen", "oracion")
+# Lo que el refinador reescribe: no se rellena desde el original (quedaría en español)
+_CAMPOS_VISUALES = ("secuencia_visual", "transiciones", "prompt_imagen")
+
+
+def _es_texto(valor) -> bool:
+    return isinstance(valor, str) and bool(valor.strip())
+
+
+def campos_invalidos(item: dict) -> List[str]:
+    """
+    Claves que faltan o no son texto no vacío: frame_N / transicion_N_M
+    (HISTORIA, CURIOSIDAD) o prompt_imagen / texto_imagen / oracion (ORACION).
+    """
+    if item.get("tipo", "DESCONOCIDO") == "ORACION":
+        return [k for k in _CAMPOS_ORACION if not _es_texto(item.get(k))]
+
+    secuencia = item.get("secuencia_visual")
+    secuencia = secuencia if isinstance(secuencia, dict) else {}
+    transiciones = item.get("transiciones")
+    transiciones = transiciones if isinstance(transiciones, dict) else {}
+
+    faltan = [f"frame_{i}" for i in range(1, 7) if not _es_texto(secuencia.get(f"frame_{i}"))]
+    faltan += [
+        f"transicion_{i}_{i+1}" for i in range(1, 6)
+        if not _es_texto(transiciones.get(f"transicion_{i}_{i+1}"))
+    ]
+    return faltan
 
 
 def validate_video_structure(item: dict) -> bool:
@@ -11,25 +68,606 @@ def validate_video_structure(item: dict) -> bool:
     Valida que el bloque tenga la estructura mínima esperada
     para poder generar imágenes.
     """
-    tipo = item.get("tipo", "DESCONOCIDO")
+    return isinstance(item, dict) and not campos_invalidos(item)
+
+
+def _fusionar_campos(item: dict, campos: dict) -> dict:
+    """Copia de item con cada frame_N / transicion_N_M / campo de ORACION en su lugar."""
+    out = dict(item)
+    secuencia = dict(out["secuencia_visual"]) if isinstance(out.get("secuencia_visual"), dict) else {}
+    transiciones = dict(out["transiciones"]) if isinstance(out.get("transiciones"), dict) else {}
+    for k, v in campos.items():
+        if k.startswith("frame_"):
+            secuencia[k] = v
+        elif k.startswith("transicion_"):
+            transiciones[k] = v
+        else:
+            out[k] = v
+    if out.get("tipo") != "ORACION":
+        out["secuencia_visual"] = secuencia
+        out["transiciones"] = transiciones
+    return out
+
+
+def _base_reparacion(item: dict, refinado) -> dict:
+    """
+    Punto de partida de la reparación: lo que el refinado sí dejó bien, más los
+    campos no visuales del original que el modelo haya perdido (guion, referencia...).
+    """
+    base = {k: v for k, v in item.items() if k not in _CAMPOS_VISUALES}
+    if isinstance(refinado, dict):
+        base.update(refinado)
+    if base.get("tipo") == "ORACION":
+        base = _fusionar_campos(base, {
+            k: item[k] for k in _CAMPOS_ORACION_ORIGINALES
+            if not _es_texto(base.get(k)) and _es_texto(item.get(k))
+        })
+    return base
+
+
+def _valor_original(item: dict, clave: str):
+    if clave.startswith("frame_"):
+        contenedor = item.get("secuencia_visual")
+    elif clave.startswith("transicion_"):
+        contenedor = item.get("transiciones")
+    else:
+        contenedor = item
+    return contenedor.get(clave) if isinstance(contenedor, dict) else None
+
+
+def _vecinos(actual: dict, faltan: List[str]) -> dict:
+    """Campos ya refinados junto a los que faltan, como ancla de personajes y paleta."""
+    if actual.get("tipo") == "ORACION":
+        return {}
+    secuencia = actual.get("secuencia_visual") or {}
+    numeros = set()
+    for clave in faltan:
+        partes = clave.split("_")[1:]
+        for n in map(int, partes):
+            numeros.update({n - 1, n, n + 1})
+    vecinos = {
+        f"frame_{n}": secuencia[f"frame_{n}"]
+        for n in sorted(numeros)
+        if f"frame_{n}" not in faltan and _es_texto(secuencia.get(f"frame_{n}"))
+    }
+    if not vecinos:
+        # Sin vecinos válidos: al menos el primer frame bueno (define la paleta)
+        for n in range(1, 7):
+            if _es_texto(secuencia.get(f"frame_{n}")):
+                return {f"frame_{n}": secuencia[f"frame_{n}"]}
+    return vecinos
+
+
+# ============ CACHÉ DE RESPUESTAS ============
+#
+# Clave = sha256 de todos los kwargs de la llamada (modelo, mensajes con el
+# system prompt, temperatura, max_tokens, response_format). Se guarda el texto
+# crudo de la respuesta solo si `parse` lo aceptó, así nunca se cachea basura.
+#   on      : lee y escribe
+#   off     : ni lee ni escribe
+#   refresh : ignora lo guardado y lo reemplaza con la respuesta nueva
+
+CACHE_MODES = ("on", "off", "refresh")
+
+_CACHE = None
+_CACHE_MODE = LLM_CACHE_MODE if LLM_CACHE_MODE in CACHE_MODES else "on"
+_CACHE_LOCK = Lock()
+
+
+def set_cache_mode(mode: str):
+    global _CACHE_MODE
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Modo de caché inválido: {mode!r} (usa {', '.join(CACHE_MODES)})")
+    with _CACHE_LOCK:
+        _CACHE_MODE = mode
+
+
+def get_cache_mode() -> str:
+    with _CACHE_LOCK:
+        return _CACHE_MODE
+
+
+def get_llm_cache() -> DiskCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = DiskCache(LLM_CACHE_DIR, max_bytes=LLM_CACHE_MAX_MB * 1024 * 1024)
+        return _CACHE
+
+
+def set_llm_cache(cache: DiskCache | None):
+    """Sustituye la caché (benchmarks, otro directorio). None = volver a la de config."""
+    global _CACHE
+    with _CACHE_LOCK:
+        _CACHE = cache
+
+
+def llm_cache_stats() -> dict:
+    """Entradas, bytes y tasa de aciertos por etapa (contenido, refinar, guion, tts, fragmento)."""
+    return get_llm_cache().stats()
+
+
+def _cache_lookup(stage: str, request: dict, parse):
+    """Devuelve (clave, resultado) si hay acierto válido, (clave, None) si no."""
+    mode = get_cache_mode()
+    if mode == "off":
+        return None, None
+    key = make_key(request)
+    if mode == "refresh":
+        return key, None
+    raw = get_llm_cache().get(key, namespace=stage)
+    if raw is None:
+        return key, None
+    try:
+        return key, parse(raw.decode("utf-8"))
+    except ValueError:
+        return key, None
+
+
+def _cache_store(stage: str, key, content: str):
+    if key is not None:
+        get_llm_cache().put(key, content.encode("utf-8"), namespace=stage)
+
+
+# ============ LLAMADA BASE (sync / async) ============
+#
+# Cada etapa arma sus kwargs de chat (_req_*) una sola vez y los manda por
+# _chat o _chat_async; así la versión sync y la async no divergen.
+
+def _parse_json(content: str):
+    # Reparación local (fences, comas, comentarios) antes de pagar un reintento.
+    # Una respuesta truncada no se cierra a la fuerza: todo lo que se parsea acá
+    # se guarda, y cerrarla perdería items o campos sin que nada lo note.
+    return loads_lenient(content, allow_truncated=False)
+
+
+def _parse_text(content: str) -> str:
+    return content.strip()
+
+
+# Salida supuesta para el límite de tokens/min cuando la petición no fija max_tokens
+DEFAULT_OUTPUT_TOKENS = 1500
+
+
+def _request_tokens(request: dict) -> int:
+    entrada = sum(estimate_tokens(m["content"]) for m in request["messages"])
+    return entrada + request.get("max_tokens", DEFAULT_OUTPUT_TOKENS)
+
+
+class _Medicion:
+    """Intentos, latencia del último intento y usage de una llamada (para llm_metrics)."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.intentos = 0
+        self.latencia = None
+        self.usage = None
+        self.json_reparados = 0
+        self.json_fallidos = 0
+        self.hedge = None
+        self._t = None
+
+    def empezar(self):
+        self.intentos += 1
+        self._t = time.perf_counter()
+
+    def respuesta(self, response):
+        self.latencia = time.perf_counter() - self._t
+        self.usage = getattr(response, "usage", None)
+
+    def parsear(self, parse, content: str):
+        with contar_reparaciones() as conteo:
+            try:
+                return parse(content)
+            finally:
+                self.json_reparados += conteo.reparados
+                self.json_fallidos += conteo.irreparables
+
+    def registrar(self, stage: str, model: str, error=None, **campos):
+        record_call(
+            stage,
+            model,
+            usage=self.usage,
+            latency_s=self.latencia,
+            total_s=time.perf_counter() - self.inicio,
+            attempts=self.intentos,
+            json_repairs=self.json_reparados,
+            json_failures=self.json_fallidos,
+            hedge=self.hedge,
+            error=error,
+            **campos,
+        )
+
+
+def _hedged(stage: str, request: dict, fn):
+    """fn() con hedging si está activado para Mistral (ver hedging.py). Devuelve (respuesta, ganador)."""
+    hedger = get_hedger("mistral")
+    if hedger is None:
+        return fn(), None
+    provider = get_provider("mistral")
+    return hedger.call(
+        f"{stage}:{request['model']}",
+        lambda _cancelado: fn(),
+        before_extra=lambda: provider.acquire(_request_tokens(request)),
+    )
+
+
+async def _hedged_async(stage: str, request: dict, fn):
+    hedger = get_hedger("mistral")
+    if hedger is None:
+        return await fn(), None
+    provider = get_provider("mistral")
+    return await hedger.call_async(
+        f"{stage}:{request['model']}",
+        fn,
+        before_extra=lambda: provider.acquire_async(_request_tokens(request)),
+    )
+
+
+def _complete(client, stage: str, parse, request: dict):
+    """
+    Una llamada síncrona sin caché, por el limitador compartido de Mistral
+    (reintentos, 429/Retry-After, circuit breaker). Devuelve (texto crudo, parseado).
+    """
+    medicion = _Medicion()
+
+    def call():
+        medicion.empezar()
+        response, medicion.hedge = _hedged(stage, request, lambda: client.chat.complete(**request))
+        medicion.respuesta(response)
+        content = response.choices[0].message.content
+        return content, medicion.parsear(parse, content)
+
+    try:
+        content, result = get_provider("mistral").call(call, tokens=_request_tokens(request))
+    except Exception as e:
+        medicion.registrar(stage, request["model"], error=e)
+        raise
+    medicion.registrar(stage, request["model"])
+    return content, result
+
+
+def _chat(client, stage: str, parse, **request):
+    t0 = time.perf_counter()
+    key, cached = _cache_lookup(stage, request, parse)
+    if cached is not None:
+        record_call(stage, request["model"], total_s=time.perf_counter() - t0, attempts=0, cached=True)
+        return cached
+
+    content, result = _complete(client, stage, parse, request)
+    _cache_store(stage, key, content)
+    return result
+
+
+async def _chat_async(client, stage: str, parse, **request):
+    t0 = time.perf_counter()
+    key, cached = _cache_lookup(stage, request, parse)
+    if cached is not None:
+        record_call(stage, request["model"], total_s=time.perf_counter() - t0, attempts=0, cached=True)
+        return cached
+
+    medicion = _Medicion()
+
+    async def call():
+        medicion.empezar()
+        response, medicion.hedge = await _hedged_async(stage, request, lambda: client.chat.complete_async(**request))
+        medicion.respuesta(response)
+        content = response.choices[0].message.content
+        return content, medicion.parsear(parse, content)
+
+    try:
+        content, result = await get_provider("mistral").call_async(call, tokens=_request_tokens(request))
+    except Exception as e:
+        medicion.registrar(stage, request["model"], error=e)
+        raise
+    medicion.registrar(stage, request["model"])
+    _cache_store(stage, key, content)
+    return result
+
+
+def _req_fragmento(system_prompt_chunk, fragmento, model, temperature, max_tokens) -> dict:
+    return dict(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt_chunk},
+            {"role": "user", "content": f"Fragmento:\n{fragmento}"},
+        ],
+        max_tokens=max_tokens,
+        temperature=temperature,
+    )
+
+
+def _req_contenido(principal_prompt, texto, model, temperature) -> dict:
+    return dict(
+        model=model,
+        messages=[
+            {"role": "system", "content": principal_prompt},
+            {"role": "user", "content": f"Capítulo a analizar:\n{texto}"},
+        ],
+        response_format={"type": "json_object"},
+        temperature=temperature,
+    )
+
+
+def _req_refinar(system_prompt_refiner, video_data, model, temperature) -> dict:
+    payload = json.dumps(video_data, ensure_ascii=False)
+    return dict(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt_refiner},
+            {
+                "role": "user",
+                "content": (
+                    "Refine this video visuals (Leave Spanish text alone):\n"
+                    f"{payload}"
+                ),
+            },
+        ],
+        response_format={"type": "json_object"},
+        temperature=temperature,
+    )
+
+
+def _req_reparar(item, actual, faltan, model, temperature) -> dict:
+    texto_base = _texto_base_guion(item) or ""
+    payload = {
+        "tipo": item.get("tipo"),
+        "referencia": item.get("referencia"),
+        "faltan": faltan,
+        "original": {k: v for k in faltan if (v := _valor_original(item, k)) is not None},
+        "vecinos": _vecinos(actual, faltan),
+        "texto_base": texto_base[:600],
+    }
+    if item.get("tipo") == "ORACION":
+        payload["texto_imagen"] = actual.get("texto_imagen")
+    return dict(
+        model=model,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT_REFINER_REPAIR},
+            {"role": "user", "content": json.dumps(payload, ensure_ascii=False)},
+        ],
+        response_format={"type": "json_object"},
+        temperature=temperature,
+    )
+
+
+def _campos_reparados(respuesta, faltan: List[str]) -> dict:
+    if not isinstance(respuesta, dict):
+        return {}
+    return {k: v for k, v in respuesta.items() if k in faltan and _es_texto(v)}
+
+
+def _texto_base_guion(video_data: dict):
+    return (
+        video_data.get("guion")
+        or video_data.get("curiosidad")
+        or video_data.get("oracion")
+    )
+
+
+def _req_guion(system_prompt_script_doctor, video_data, texto_base, model, temperature, max_tokens) -> dict:
+    user_content = f"""
+    TIPO DE VIDEO: {video_data.get('tipo')}
+    REFERENCIA: {video_data.get('referencia')}
+    TEXTO BASE: {texto_base}
+    """
+    return dict(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt_script_doctor},
+            {"role": "user", "content": user_content},
+        ],
+        max_tokens=max_tokens,
+        temperature=temperature,
+    )
+
+
+def _req_tts(system_prompt_eleven_v3, tipo, guion, model, temperature, max_tokens) -> dict:
+    user_content = f"""
+    TIPO: {tipo}
+    GUION EXPANDIDO:
+    {guion}
+    """
+    return dict(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt_eleven_v3},
+            {"role": "user", "content": user_content},
+        ],
+        max_tokens=max_tokens,
+        temperature=temperature,
+    )
+
+
+def _unir_notas(header: str, chunks: list, notas: list) -> str:
+    partes = [
+        f"[Versículos {c['desde']}–{c['hasta']}]\n{nota}"
+        for c, nota in zip(chunks, notas)
+        if nota
+    ]
+    return (
+        f"{header}\n\n"
+        "(Capítulo extenso: notas por fragmentos que cubren TODO el capítulo)\n\n"
+        + "\n\n".join(partes)
+    )
+
+
+# ============ CASCADA DE MODELOS ============
+#
+# Con la cascada activa, cada etapa prueba primero LLM_CASCADE_FAST_MODEL y solo
+# repite con el modelo configurado si la salida no pasa el chequeo de la etapa
+# (o si la llamada falla). Las llamadas escaladas quedan en llm_metrics con
+# cascade_step=1; la tasa de escalado por etapa se loguea al final del capítulo.
+# La vía de batch (llm_batch) no usa cascada: ahí el costo ya es la mitad.
+
+_CASCADE = LLM_CASCADE
+_CASCADE_FAST = LLM_CASCADE_FAST_MODEL
+_CASCADE_STATS = {}
+_CASCADE_LOCK = Lock()
 
-    # Caso ORACION: campos básicos para la imagen estática
-    if tipo == "ORACION":
-        return all(k in item for k in ["prompt_imagen", "texto_imagen", "oracion"])
+# Guiones: por debajo de esto el Script Doctor no expandió nada; por encima, se fue de largo
+GUION_MIN_CHARS = 200
+GUION_MAX_CHARS = 6000
 
-    # Caso HISTORIA / CURIOSIDAD:
-    if "secuencia_visual" not in item or "transiciones" not in item:
+
+def set_cascade_mode(activa: bool, fast_model: str | None = None):
+    global _CASCADE, _CASCADE_FAST
+    with _CASCADE_LOCK:
+        _CASCADE = bool(activa)
+        if fast_model:
+            _CASCADE_FAST = fast_model
+
+
+def get_cascade_mode() -> Tuple[bool, str]:
+    with _CASCADE_LOCK:
+        return _CASCADE, _CASCADE_FAST
+
+
+def cascade_stats(reset: bool = False) -> Dict[str, Dict[str, int]]:
+    """{etapa: {"llamadas": n, "escaladas": m}} desde el arranque (o el último reset)."""
+    global _CASCADE_STATS
+    with _CASCADE_LOCK:
+        stats = {etapa: dict(s) for etapa, s in _CASCADE_STATS.items()}
+        if reset:
+            _CASCADE_STATS = {}
+    return stats
+
+
+def log_cascade_stats():
+    activa, fast = get_cascade_mode()
+    if not activa:
+        return
+    for etapa, s in sorted(cascade_stats().items()):
+        tasa = s["escaladas"] / s["llamadas"] if s["llamadas"] else 0.0
+        log(f"[cascada] {etapa}: {s['escaladas']}/{s['llamadas']} escaladas desde {fast} ({tasa:.0%})")
+
+
+def _modelos(model: str) -> List[str]:
+    activa, fast = get_cascade_mode()
+    return [fast, model] if activa and model != fast else [model]
+
+
+def _anotar_cascada(stage: str, escalada: bool):
+    with _CASCADE_LOCK:
+        s = _CASCADE_STATS.setdefault(stage, {"llamadas": 0, "escaladas": 0})
+        s["llamadas"] += 1
+        s["escaladas"] += int(escalada)
+
+
+def _contenido_valido(contenido) -> bool:
+    if not isinstance(contenido, dict):
         return False
+    items = contenido.get("contenido")
+    return (
+        isinstance(items, list) and bool(items)
+        and all(isinstance(i, dict) and _es_texto(i.get("tipo")) and _texto_base_guion(i) for i in items)
+    )
+
+
+def _guion_valido(guion, texto_base: str) -> bool:
+    if not _es_texto(guion):
+        return False
+    guion = guion.strip()
+    if not GUION_MIN_CHARS <= len(guion) <= GUION_MAX_CHARS or len(guion) < len(texto_base.strip()) * 0.8:
+        return False  # no expandió (o resumió) el texto base, o se fue de largo
+    if guion.startswith(("{", "[", "```", "#")):
+        return False  # JSON o markdown en vez de texto para locución
+    return guion[-1] in ".!?…»\"')]"  # cortado por max_tokens
+
+
+def _tts_valido(tts, guion: str) -> bool:
+    if not _es_texto(tts):
+        return False
+    tts = tts.strip()
+    if tts.startswith(("{", "[", "```", "#")):
+        return False
+    # El ajuste para ElevenLabs agrega etiquetas y pausas, no reescribe ni recorta
+    return 0.7 * len(guion) <= len(tts) <= 2.0 * len(guion)
+
+
+def _chat_cascada(client, stage: str, parse, valido, **request):
+    modelos = _modelos(request["model"])
+    for paso, modelo in enumerate(modelos):
+        ultimo = paso == len(modelos) - 1
+        with metrics_context(cascade_step=paso) if len(modelos) > 1 else nullcontext():
+            try:
+                resultado = _chat(client, stage, parse, **{**request, "model": modelo})
+            except Exception as e:
+                if ultimo:
+                    raise
+                log(f"[cascada] {stage}: {modelo} falló ({e}), escalando a {modelos[-1]}")
+                continue
+        if ultimo or valido(resultado):
+            if len(modelos) > 1:
+                _anotar_cascada(stage, escalada=paso > 0)
+            return resultado
+        log(f"[cascada] {stage}: salida de {modelo} no pasó el chequeo, escalando a {modelos[-1]}")
+
+
+async def _chat_cascada_async(client, stage: str, parse, valido, **request):
+    modelos = _modelos(request["model"])
+    for paso, modelo in enumerate(modelos):
+        ultimo = paso == len(modelos) - 1
+        with metrics_context(cascade_step=paso) if len(modelos) > 1 else nullcontext():
+            try:
+                resultado = await _chat_async(client, stage, parse, **{**request, "model": modelo})
+            except Exception as e:
+                if ultimo:
+                    raise
+                log(f"[cascada] {stage}: {modelo} falló ({e}), escalando a {modelos[-1]}")
+                continue
+        if ultimo or valido(resultado):
+            if len(modelos) > 1:
+                _anotar_cascada(stage, escalada=paso > 0)
+            return resultado
+        log(f"[cascada] {stage}: salida de {modelo} no pasó el chequeo, escalando a {modelos[-1]}")
 
-    for i in range(1, 7):
-        if f"frame_{i}" not in item["secuencia_visual"]:
-            return False
 
-    for i in range(1, 6):
-        if f"transicion_{i}_{i+1}" not in item["transiciones"]:
-            return False
+# ============ ETAPAS (sync) ============
 
-    return True
+def analizar_fragmento_llm(
+    client,
+    system_prompt_chunk: str,
+    fragmento: str,
+    model: str = "mistral-small-latest",
+    temperature: float = 0.3,
+    max_tokens: int = 400,
+) -> str:
+    """
+    Map: extrae notas breves (personajes, visuales, conflicto, versículos clave)
+    de un fragmento de capítulo.
+    """
+    if should_cancel():
+        return ""
+
+    request = _req_fragmento(system_prompt_chunk, fragmento, model, temperature, max_tokens)
+    return _chat(client, "fragmento", _parse_text, **request)
+
+
+def resumir_capitulo_por_fragmentos(
+    client,
+    texto_capitulo: str,
+    system_prompt_chunk: str = SYSTEM_PROMPT_CHUNK_ANALYST,
+    model: str = "mistral-small-latest",
+    max_chunk_tokens: int = CHUNK_MAX_TOKENS,
+    max_workers: int = CHUNK_MAX_WORKERS,
+) -> str:
+    """
+    Divide el capítulo en fragmentos por versículos, los analiza en paralelo
+    y devuelve un único texto (header + notas por fragmento) para el reduce.
+    """
+    header, chunks = chunk_chapter(texto_capitulo, max_chunk_tokens)
+    log(f"Capítulo largo (~{estimate_tokens(texto_capitulo)} tokens): {len(chunks)} fragmentos en paralelo...")
+
+    def analizar(c):
+        return analizar_fragmento_llm(client, system_prompt_chunk, c["texto"], model=model)
+
+    # copy_context: los hilos heredan el capítulo de metrics_context
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as ex:
+        futuros = [ex.submit(contextvars.copy_context().run, analizar, c) for c in chunks]
+        notas = [f.result() for f in futuros]
+
+    return _unir_notas(header, chunks, notas)
 
 
 def generar_contenido_llm(
@@ -38,29 +676,27 @@ def generar_contenido_llm(
     texto_capitulo: str,
     model: str = "mistral-small-latest",
     temperature: float = 0.6,
+    max_input_tokens: int = CONTENT_MAX_TOKENS,
+    chunk_model: str = "mistral-small-latest",
 ) -> Dict[str, Any]:
     """
     Primer llamado: genera la estructura base "contenido" a partir del capítulo.
+    Si el capítulo excede max_input_tokens se resume por fragmentos antes (map-reduce)
+    en lugar de truncarlo.
     """
     if should_cancel():
         log("⛔ Cancelado antes de generar_contenido_llm.")
         return {}
 
-    texto = sanitize_text(texto_capitulo)
-
-    def call():
-        response = client.chat.complete(
-            model=model,
-            messages=[
-                {"role": "system", "content": principal_prompt},
-                {"role": "user", "content": f"Capítulo a analizar:\n{texto}"},
-            ],
-            response_format={"type": "json_object"},
-            temperature=temperature,
-        )
-        return json.loads(response.choices[0].message.content)
+    texto = texto_capitulo
+    if estimate_tokens(texto) > max_input_tokens:
+        texto = resumir_capitulo_por_fragmentos(client, texto_capitulo, model=chunk_model)
+        if should_cancel():
+            log("⛔ Cancelado tras analizar fragmentos.")
+            return {}
 
-    return retry(call)
+    request = _req_contenido(principal_prompt, texto, model, temperature)
+    return _chat_cascada(client, "contenido", _parse_json, _contenido_valido, **request)
 
 
 def refinar_video_llm(
@@ -77,27 +713,38 @@ def refinar_video_llm(
         log("⛔ Cancelado antes de refinar_video_llm.")
         return video_data
 
-    payload = json.dumps(video_data, ensure_ascii=False)
+    request = _req_refinar(system_prompt_refiner, video_data, model, temperature)
+    return _chat_cascada(client, "refinar", _parse_json, validate_video_structure, **request)
 
-    def call():
-        response = client.chat.complete(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt_refiner},
-                {
-                    "role": "user",
-                    "content": (
-                        "Refine this video visuals (Leave Spanish text alone):\n"
-                        f"{payload}"
-                    ),
-                },
-            ],
-            response_format={"type": "json_object"},
-            temperature=temperature,
-        )
-        return json.loads(response.choices[0].message.content)
 
-    return retry(call)
+def reparar_refinado_llm(
+    client,
+    item: dict,
+    refinado,
+    model: str = "mistral-small-latest",
+    temperature: float = 0.3,
+    rounds: int = REFINE_REPAIR_ROUNDS,
+) -> Dict[str, Any] | None:
+    """
+    Si el refinado tiene frame_N / transicion_N_M (o campos de ORACION) faltantes
+    o rotos, pide al modelo SOLO esos campos y los fusiona con lo que sí salió bien.
+    Devuelve el item completo, o None si no se pudo reparar.
+    """
+    actual = _base_reparacion(item, refinado)
+    for _ in range(rounds):
+        faltan = campos_invalidos(actual)
+        if not faltan or should_cancel():
+            break
+        log(f"🔧 Reparando {len(faltan)} campos de {item.get('tipo', 'DESCONOCIDO')}: {', '.join(faltan)}")
+        request = _req_reparar(item, actual, faltan, model, temperature)
+        try:
+            respuesta = _chat(client, "reparar", _parse_json, **request)
+        except Exception as e:
+            log(f"⚠ Reparación fallida: {e}")
+            break
+        actual = _fusionar_campos(actual, _campos_reparados(respuesta, faltan))
+
+    return actual if validate_video_structure(actual) else None
 
 
 def expandir_guion_llm(
@@ -112,11 +759,7 @@ def expandir_guion_llm(
     Convierte el texto base (guion/curiosidad/oracion) en un script finalizado
     para ser luego pasado a TTS.
     """
-    texto_base = (
-        video_data.get("guion")
-        or video_data.get("curiosidad")
-        or video_data.get("oracion")
-    )
+    texto_base = _texto_base_guion(video_data)
 
     if not texto_base:
         log("⚠️ expandir_guion_llm: texto_base vacío o inexistente.")
@@ -126,25 +769,10 @@ def expandir_guion_llm(
         log("⛔ Cancelado antes de expandir_guion_llm.")
         return ""
 
-    user_content = f"""
-    TIPO DE VIDEO: {video_data.get('tipo')}
-    REFERENCIA: {video_data.get('referencia')}
-    TEXTO BASE: {texto_base}
-    """
-
-    def call():
-        response = client.chat.complete(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt_script_doctor},
-                {"role": "user", "content": user_content},
-            ],
-            max_tokens=max_tokens,
-            temperature=temperature,
-        )
-        return response.choices[0].message.content.strip()
-
-    return retry(call)
+    request = _req_guion(system_prompt_script_doctor, video_data, texto_base, model, temperature, max_tokens)
+    return _chat_cascada(
+        client, "guion", _parse_text, lambda g: _guion_valido(g, texto_base), **request
+    )
 
 
 def generar_tts_llm(
@@ -167,25 +795,276 @@ def generar_tts_llm(
         log("⛔ Cancelado antes de generar_tts_llm.")
         return ""
 
-    user_content = f"""
-    TIPO: {tipo}
-    GUION EXPANDIDO:
-    {guion}
+    request = _req_tts(system_prompt_eleven_v3, tipo, guion, model, temperature, max_tokens)
+    return _chat_cascada(client, "tts", _parse_text, lambda t: _tts_valido(t, guion), **request)
+
+
+# ============ ETAPAS (async, cliente Mistral async) ============
+
+async def analizar_fragmento_llm_async(
+    client,
+    system_prompt_chunk: str,
+    fragmento: str,
+    model: str = "mistral-small-latest",
+    temperature: float = 0.3,
+    max_tokens: int = 400,
+) -> str:
+    if should_cancel():
+        return ""
+
+    request = _req_fragmento(system_prompt_chunk, fragmento, model, temperature, max_tokens)
+    return await _chat_async(client, "fragmento", _parse_text, **request)
+
+
+async def generar_contenido_llm_async(
+    client,
+    principal_prompt: str,
+    texto_capitulo: str,
+    model: str = "mistral-small-latest",
+    temperature: float = 0.6,
+    max_input_tokens: int = CONTENT_MAX_TOKENS,
+    chunk_model: str = "mistral-small-latest",
+) -> Dict[str, Any]:
+    if should_cancel():
+        log("⛔ Cancelado antes de generar_contenido_llm.")
+        return {}
+
+    texto = texto_capitulo
+    if estimate_tokens(texto) > max_input_tokens:
+        header, chunks = chunk_chapter(texto_capitulo, CHUNK_MAX_TOKENS)
+        log(f"Capítulo largo (~{estimate_tokens(texto_capitulo)} tokens): {len(chunks)} fragmentos en paralelo...")
+        notas = await asyncio.gather(*(
+            analizar_fragmento_llm_async(client, SYSTEM_PROMPT_CHUNK_ANALYST, c["texto"], model=chunk_model)
+            for c in chunks
+        ))
+        texto = _unir_notas(header, chunks, notas)
+        if should_cancel():
+            log("⛔ Cancelado tras analizar fragmentos.")
+            return {}
+
+    request = _req_contenido(principal_prompt, texto, model, temperature)
+    return await _chat_cascada_async(client, "contenido", _parse_json, _contenido_valido, **request)
+
+
+async def refinar_video_llm_async(
+    client,
+    system_prompt_refiner: str,
+    video_data: dict,
+    model: str = "mistral-small-latest",
+    temperature: float = 0.6,
+) -> Dict[str, Any]:
+    if should_cancel():
+        log("⛔ Cancelado antes de refinar_video_llm.")
+        return video_data
+
+    request = _req_refinar(system_prompt_refiner, video_data, model, temperature)
+    return await _chat_cascada_async(client, "refinar", _parse_json, validate_video_structure, **request)
+
+
+async def reparar_refinado_llm_async(
+    client,
+    item: dict,
+    refinado,
+    model: str = "mistral-small-latest",
+    temperature: float = 0.3,
+    rounds: int = REFINE_REPAIR_ROUNDS,
+) -> Dict[str, Any] | None:
+    actual = _base_reparacion(item, refinado)
+    for _ in range(rounds):
+        faltan = campos_invalidos(actual)
+        if not faltan or should_cancel():
+            break
+        log(f"🔧 Reparando {len(faltan)} campos de {item.get('tipo', 'DESCONOCIDO')}: {', '.join(faltan)}")
+        request = _req_reparar(item, actual, faltan, model, temperature)
+        try:
+            respuesta = await _chat_async(client, "reparar", _parse_json, **request)
+        except Exception as e:
+            log(f"⚠ Reparación fallida: {e}")
+            break
+        actual = _fusionar_campos(actual, _campos_reparados(respuesta, faltan))
+
+    return actual if validate_video_structure(actual) else None
+
+
+async def expandir_guion_llm_async(
+    client,
+    system_prompt_script_doctor: str,
+    video_data: dict,
+    model: str = "mistral-medium-latest",
+    temperature: float = 0.6,
+    max_tokens: int = 800,
+) -> str:
+    texto_base = _texto_base_guion(video_data)
+
+    if not texto_base:
+        log("⚠️ expandir_guion_llm: texto_base vacío o inexistente.")
+        return ""
+
+    if should_cancel():
+        log("⛔ Cancelado antes de expandir_guion_llm.")
+        return ""
+
+    request = _req_guion(system_prompt_script_doctor, video_data, texto_base, model, temperature, max_tokens)
+    return await _chat_cascada_async(
+        client, "guion", _parse_text, lambda g: _guion_valido(g, texto_base), **request
+    )
+
+
+async def generar_tts_llm_async(
+    client,
+    system_prompt_eleven_v3: str,
+    tipo: str,
+    guion: str,
+    model: str = "mistral-medium-latest",
+    temperature: float = 0.6,
+    max_tokens: int = 800,
+) -> str:
+    if not guion:
+        log("⚠️ generar_tts_llm: guion vacío; se omite ajuste para TTS.")
+        return ""
+
+    if should_cancel():
+        log("⛔ Cancelado antes de generar_tts_llm.")
+        return ""
+
+    request = _req_tts(system_prompt_eleven_v3, tipo, guion, model, temperature, max_tokens)
+    return await _chat_cascada_async(
+        client, "tts", _parse_text, lambda t: _tts_valido(t, guion), **request
+    )
+
+
+# ============ ORQUESTACIÓN POR ITEM ============
+
+def _procesar_item(
+    client,
+    SYSTEM_PROMPT_REFINER,
+    SYSTEM_PROMPT_SCRIPT_DOCTOR,
+    SYSTEM_PROMPT_ELEVEN_V3,
+    item: dict,
+    model_script: str,
+    model_refiner: str,
+    model_voice: str,
+) -> Dict[str, Any] | None:
     """
+    Refinar -> Script Doctor -> TTS-friendly para un item.
+    Devuelve el item listo, o None si se canceló a mitad.
+    """
+    tipo = item.get("tipo", "DESCONOCIDO")
+    log(f"--- Procesando: {tipo} ---")
 
-    def call():
-        response = client.chat.complete(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt_eleven_v3},
-                {"role": "user", "content": user_content},
-            ],
-            max_tokens=max_tokens,
-            temperature=temperature,
-        )
-        return response.choices[0].message.content.strip()
+    # 1) Refinar visuales
+    log("Refinando visuales (Traduciendo a Prompts de IA)...")
+    refinado = refinar_video_llm(
+        client,
+        SYSTEM_PROMPT_REFINER,
+        item,
+        model=model_refiner,
+    )
 
-    return retry(call)
+    if not validate_video_structure(refinado):
+        reparado = reparar_refinado_llm(client, item, refinado, model=model_refiner)
+        if reparado is None:
+            log(
+                f"⚠ JSON inválido en {tipo}, usando versión base "
+                "(puede que los prompts no estén en inglés)"
+            )
+            reparado = item
+        refinado = reparado
+
+    if should_cancel():
+        log("⛔ Cancelado justo después de refinar visuales.")
+        return None
+
+    # 2) Script Doctor
+    log("Generando guion expandido (Script Doctor)...")
+    guion_expandido = expandir_guion_llm(
+        client,
+        SYSTEM_PROMPT_SCRIPT_DOCTOR,
+        refinado,
+        model=model_script,
+    )
+
+    if not guion_expandido:
+        log(f"⚠ No se pudo generar guion expandido para {tipo}, se omite TTS.")
+        refinado["guion_tts"] = ""
+        return refinado
+
+    if should_cancel():
+        log("⛔ Cancelado antes de optimizar para TTS.")
+        return None
+
+    # 3) TTS-friendly
+    log("Optimizando para TTS (Emotion Lite)...")
+    refinado["guion_tts"] = generar_tts_llm(
+        client,
+        SYSTEM_PROMPT_ELEVEN_V3,
+        tipo,
+        guion_expandido,
+        model=model_voice,
+    )
+    return refinado
+
+
+async def _procesar_item_async(
+    client,
+    SYSTEM_PROMPT_REFINER,
+    SYSTEM_PROMPT_SCRIPT_DOCTOR,
+    SYSTEM_PROMPT_ELEVEN_V3,
+    item: dict,
+    model_script: str,
+    model_refiner: str,
+    model_voice: str,
+) -> Dict[str, Any] | None:
+    """Misma cadena que _procesar_item, con el cliente async."""
+    tipo = item.get("tipo", "DESCONOCIDO")
+    log(f"--- Procesando: {tipo} ---")
+
+    refinado = await refinar_video_llm_async(
+        client,
+        SYSTEM_PROMPT_REFINER,
+        item,
+        model=model_refiner,
+    )
+
+    if not validate_video_structure(refinado):
+        reparado = await reparar_refinado_llm_async(client, item, refinado, model=model_refiner)
+        if reparado is None:
+            log(
+                f"⚠ JSON inválido en {tipo}, usando versión base "
+                "(puede que los prompts no estén en inglés)"
+            )
+            reparado = item
+        refinado = reparado
+
+    if should_cancel():
+        log(f"⛔ Cancelado justo después de refinar visuales ({tipo}).")
+        return None
+
+    guion_expandido = await expandir_guion_llm_async(
+        client,
+        SYSTEM_PROMPT_SCRIPT_DOCTOR,
+        refinado,
+        model=model_script,
+    )
+
+    if not guion_expandido:
+        log(f"⚠ No se pudo generar guion expandido para {tipo}, se omite TTS.")
+        refinado["guion_tts"] = ""
+        return refinado
+
+    if should_cancel():
+        log(f"⛔ Cancelado antes de optimizar para TTS ({tipo}).")
+        return None
+
+    refinado["guion_tts"] = await generar_tts_llm_async(
+        client,
+        SYSTEM_PROMPT_ELEVEN_V3,
+        tipo,
+        guion_expandido,
+        model=model_voice,
+    )
+    log(f"✅ Item listo: {tipo}")
+    return refinado
 
 
 def procesar_capitulo(
@@ -229,59 +1108,122 @@ def procesar_capitulo(
             log("⛔ Cancelado por el usuario durante procesar_capitulo.")
             break
 
-        tipo = item.get("tipo", "DESCONOCIDO")
-        log(f"--- Procesando: {tipo} ---")
-
-        # 1) Refinar visuales
-        log("Refinando visuales (Traduciendo a Prompts de IA)...")
-        refinado = refinar_video_llm(
+        refinado = _procesar_item(
             client,
             SYSTEM_PROMPT_REFINER,
+            SYSTEM_PROMPT_SCRIPT_DOCTOR,
+            SYSTEM_PROMPT_ELEVEN_V3,
             item,
-            model=model_refiner,
+            model_script=model_script,
+            model_refiner=model_refiner,
+            model_voice=model_voice,
         )
+        if refinado is None:
+            break
+        resultados.append(refinado)
 
-        if not validate_video_structure(refinado):
-            log(
-                f"⚠ JSON inválido en {tipo}, usando versión base "
-                "(puede que los prompts no estén en inglés)"
-            )
-            refinado = item
+    log_cascade_stats()
+    return resultados
 
-        if should_cancel():
-            log("⛔ Cancelado justo después de refinar visuales.")
-            break
 
-        # 2) Script Doctor
-        log("Generando guion expandido (Script Doctor)...")
-        guion_expandido = expandir_guion_llm(
-            client,
-            SYSTEM_PROMPT_SCRIPT_DOCTOR,
-            refinado,
-            model=model_script,
-        )
+async def iter_capitulo_async(
+    client,
+    PRINCIPAL_PROMPT,
+    SYSTEM_PROMPT_REFINER,
+    SYSTEM_PROMPT_SCRIPT_DOCTOR,
+    SYSTEM_PROMPT_ELEVEN_V3,
+    texto_capitulo: str,
+    model_text: str = "mistral-large-latest",
+    model_script: str = "mistral-large-latest",
+    model_refiner: str = "mistral-medium-latest",
+    model_voice: str = "mistral-small-latest",
+    max_concurrency: int = ITEM_MAX_CONCURRENCY,
+) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Genera el contenido y va entregando (indice, item) a medida que cada cadena
+    refinar -> guion -> TTS termina, sin esperar al resto. Así la etapa de audio
+    puede empezar con el primer item mientras los demás siguen en el LLM.
+    `indice` es la posición del item en 'contenido', para reconstruir el orden.
+    """
+    log("Generando contenido base (Estructura + Conceptos en Español)...")
 
-        if not guion_expandido:
-            log(f"⚠ No se pudo generar guion expandido para {tipo}, se omite TTS.")
-            refinado["guion_tts"] = ""
-            resultados.append(refinado)
-            continue
+    contenido = await generar_contenido_llm_async(
+        client,
+        PRINCIPAL_PROMPT,
+        texto_capitulo,
+        model=model_text,
+    )
 
-        if should_cancel():
-            log("⛔ Cancelado antes de optimizar para TTS.")
-            break
+    items_list = contenido.get("contenido", [])
+    if not items_list:
+        log("❌ Error: El LLM no devolvió una lista en 'contenido'.")
+        return
 
-        # 3) TTS-friendly
-        log("Optimizando para TTS (Emotion Lite)...")
-        guion_tts = generar_tts_llm(
-            client,
-            SYSTEM_PROMPT_ELEVEN_V3,
-            tipo,
-            guion_expandido,
-            model=model_voice,
-        )
+    semaforo = asyncio.Semaphore(max(1, max_concurrency))
 
-        refinado["guion_tts"] = guion_tts
-        resultados.append(refinado)
+    async def run(indice, item):
+        async with semaforo:
+            if should_cancel():
+                return indice, None
+            return indice, await _procesar_item_async(
+                client,
+                SYSTEM_PROMPT_REFINER,
+                SYSTEM_PROMPT_SCRIPT_DOCTOR,
+                SYSTEM_PROMPT_ELEVEN_V3,
+                item,
+                model_script=model_script,
+                model_refiner=model_refiner,
+                model_voice=model_voice,
+            )
 
-    return resultados
+    tareas = [asyncio.create_task(run(i, item)) for i, item in enumerate(items_list)]
+    try:
+        for siguiente in asyncio.as_completed(tareas):
+            indice, refinado = await siguiente
+            if refinado is not None:
+                yield indice, refinado
+    finally:
+        # El consumidor puede dejar de iterar (cancelación): no dejar cadenas colgando
+        for tarea in tareas:
+            tarea.cancel()
+
+
+async def procesar_capitulo_async(
+    client,
+    PRINCIPAL_PROMPT,
+    SYSTEM_PROMPT_REFINER,
+    SYSTEM_PROMPT_SCRIPT_DOCTOR,
+    SYSTEM_PROMPT_ELEVEN_V3,
+    texto_capitulo: str,
+    model_text: str = "mistral-large-latest",
+    model_script: str = "mistral-large-latest",
+    model_refiner: str = "mistral-medium-latest",
+    model_voice: str = "mistral-small-latest",
+    max_concurrency: int = ITEM_MAX_CONCURRENCY,
+) -> List[Dict[str, Any]]:
+    """
+    Igual que procesar_capitulo, pero las cadenas refinar -> guion -> TTS de
+    cada item corren en paralelo (como mucho max_concurrency a la vez).
+    El tiempo total queda en ~contenido + la cadena del item más lento.
+    Mantiene el orden de los items; con cancelación devuelve solo los terminados.
+    """
+    resultados = {}
+    async for indice, item in iter_capitulo_async(
+        client,
+        PRINCIPAL_PROMPT,
+        SYSTEM_PROMPT_REFINER,
+        SYSTEM_PROMPT_SCRIPT_DOCTOR,
+        SYSTEM_PROMPT_ELEVEN_V3,
+        texto_capitulo,
+        model_text=model_text,
+        model_script=model_script,
+        model_refiner=model_refiner,
+        model_voice=model_voice,
+        max_concurrency=max_concurrency,
+    ):
+        resultados[indice] = item
+
+    if should_cancel():
+        log("⛔ Cancelado por el usuario durante procesar_capitulo_async.")
+    log_cascade_stats()
+    return [resultados[i] for i in sorted(resultados)]
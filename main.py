@@ -1,8 +1,9 @@
 # main.py
 from pathlib import Path
+import asyncio
 import json
 
-from config import client_mistral, client_eleven, BIBLE_JSON_PATH
+from config import get_mistral_client, get_eleven_client, new_mistral_client, BIBLE_JSON_PATH, IMAGE_WORKER
 from prompts import (
     PRINCIPAL_PROMPT,
     SYSTEM_PROMPT_REFINER,
@@ -10,11 +11,24 @@ from prompts import (
     SYSTEM_PROMPT_SCRIPT_DOCTOR,
 )
 from bible_io import BibleJSONProcessor
-from llm_pipeline import procesar_capitulo
-from tts_pipeline import extraer_guiones_para_tts, procesar_lote_audios
-from image_pipeline import cargar_zimage_pipeline, generar_imagenes_desde_json
+from llm_pipeline import procesar_capitulo_async, iter_capitulo_async
+from llm_batch import procesar_capitulos_batch
+from tts_pipeline import extraer_guiones_para_tts, procesar_lote_audios, procesar_stream_audios
 from pipeline_status import mark_stage_done
 from pipeline_cancel import should_cancel
+from llm_metrics import metrics_context
+
+
+# Voz y ajustes de ElevenLabs para todos los audios del canal
+TTS_SETTINGS = dict(
+    voice_id="NOpBlnGInO9m6vDvFkFC",
+    model_id="eleven_flash_v2_5",
+    speed=1.1,
+    stability=0.6,
+    similarity_boost=0.9,
+    style=0.2,
+    use_speaker_boost=True,
+)
 
 
 def guardar_json(data, filename: str):
@@ -25,6 +39,13 @@ def guardar_json(data, filename: str):
 
 # ============ ETAPA 1: JSON (LLM) ============
 
+async def _con_mistral_propio(fn):
+    # Cada asyncio.run (un loop nuevo, quizás en otro hilo del executor) con su
+    # propio cliente: el pool async del cliente cacheado no sobrevive al loop.
+    async with new_mistral_client() as client:
+        return await fn(client)
+
+
 def run_json(libro: str, capitulo: int):
     """
     Genera el JSON completo (con prompts y guion_tts) y lo guarda en disco.
@@ -36,14 +57,17 @@ def run_json(libro: str, capitulo: int):
     texto = processor.format_chapter(libro, capitulo)
     print(texto)
 
-    resultados = procesar_capitulo(
-        client_mistral,
-        PRINCIPAL_PROMPT,
-        SYSTEM_PROMPT_REFINER,
-        SYSTEM_PROMPT_SCRIPT_DOCTOR,
-        SYSTEM_PROMPT_ELEVEN_V3,
-        texto,
-    )
+    # Los items (HISTORIA / CURIOSIDAD / ORACION) se procesan en paralelo.
+    # run_json corre en un hilo del executor del bot, sin loop propio.
+    with metrics_context(libro=libro, capitulo=capitulo):
+        resultados = asyncio.run(_con_mistral_propio(lambda client: procesar_capitulo_async(
+            client,
+            PRINCIPAL_PROMPT,
+            SYSTEM_PROMPT_REFINER,
+            SYSTEM_PROMPT_SCRIPT_DOCTOR,
+            SYSTEM_PROMPT_ELEVEN_V3,
+            texto,
+        )))
 
     # Si se canceló o no hubo nada, NO intentes guardar archivo
     if should_cancel() or not resultados:
@@ -72,6 +96,49 @@ def run_json(libro: str, capitulo: int):
     }
 
 
+def run_json_libro(libro: str, desde: int = 1, hasta: int | None = None):
+    """
+    Genera los JSON de un rango de capítulos con la API de batch:
+    una petición por etapa y modelo para todo el rango, en vez de
+    ~10 llamadas síncronas por capítulo. Pensado para correr de noche.
+    """
+    processor = BibleJSONProcessor(BIBLE_JSON_PATH)
+    capitulos = [c for c in processor.list_chapters(libro) if c >= desde and (hasta is None or c <= hasta)]
+    print(f"=== [JSON-BATCH] {libro} {capitulos[0] if capitulos else '-'}..{capitulos[-1] if capitulos else '-'} ({len(capitulos)} capítulos) ===")
+
+    textos = {cap: processor.format_chapter(libro, cap) for cap in capitulos}
+    with metrics_context(libro=libro):
+        por_capitulo = procesar_capitulos_batch(
+            get_mistral_client(),
+            PRINCIPAL_PROMPT,
+            SYSTEM_PROMPT_REFINER,
+            SYSTEM_PROMPT_SCRIPT_DOCTOR,
+            SYSTEM_PROMPT_ELEVEN_V3,
+            textos,
+        )
+
+    json_paths = []
+    if should_cancel():
+        print(f"=== [JSON-BATCH] Cancelado para {libro} ===")
+        por_capitulo = {}
+
+    for cap, resultados in sorted(por_capitulo.items()):
+        if not resultados:
+            continue
+        out_json = f"{libro}_{cap}_videos.json"
+        guardar_json(resultados, out_json)
+        mark_stage_done(libro, cap, "json")
+        json_paths.append(out_json)
+
+    print(f"=== [JSON-BATCH] Terminado {libro} – {len(json_paths)}/{len(capitulos)} capítulos ===")
+    return {
+        "libro": libro,
+        "capitulos": capitulos,
+        "json_paths": json_paths,
+        "num_items": sum(len(r) for r in por_capitulo.values()),
+    }
+
+
 # ============ ETAPA 2: TTS (audios ElevenLabs) ============
 
 def run_tts_from_resultados(resultados, libro: str, capitulo: int):
@@ -92,15 +159,9 @@ def run_tts_from_resultados(resultados, libro: str, capitulo: int):
 
     lote_tts = extraer_guiones_para_tts(resultados)
     reporte_tts = procesar_lote_audios(
-        client_eleven,
+        get_eleven_client(),
         lote_tts,
-        voice_id="NOpBlnGInO9m6vDvFkFC",
-        model_id="eleven_flash_v2_5",
-        speed=1.1,
-        stability=0.6,
-        similarity_boost=0.9,
-        style=0.2,
-        use_speaker_boost=True,
+        **TTS_SETTINGS,
     )
     num_audios = len(reporte_tts["procesados"])
 
@@ -162,40 +223,95 @@ def run_tts_from_json(libro: str, capitulo: int):
 
 # ============ ETAPA 1+2: JSON + TTS ============
 
+async def _json_tts_stream(client_mistral, client_eleven, texto: str):
+    """LLM y TTS en tubería: cada item pasa a TTS apenas sale del LLM."""
+    por_indice = {}
+
+    async def items():
+        async for indice, item in iter_capitulo_async(
+            client_mistral,
+            PRINCIPAL_PROMPT,
+            SYSTEM_PROMPT_REFINER,
+            SYSTEM_PROMPT_SCRIPT_DOCTOR,
+            SYSTEM_PROMPT_ELEVEN_V3,
+            texto,
+        ):
+            por_indice[indice] = item
+            yield item
+
+    reporte = await procesar_stream_audios(client_eleven, items(), **TTS_SETTINGS)
+    return [por_indice[i] for i in sorted(por_indice)], reporte
+
+
 def run_json_tts(libro: str, capitulo: int):
     """
-    Ejecuta JSON (LLM) y luego TTS, usando resultados en memoria.
+    Ejecuta JSON (LLM) y TTS en tubería: el audio de cada item se genera
+    mientras los demás items siguen en el LLM.
     No genera imágenes.
     Respeta señal de cancelación.
     """
-    info_json = run_json(libro, capitulo)
+    print(f"=== [JSON+TTS] Iniciando para {libro} {capitulo} ===")
+
+    processor = BibleJSONProcessor(BIBLE_JSON_PATH)
+    texto = processor.format_chapter(libro, capitulo)
 
-    # Si se canceló o no hay resultados, no seguimos a TTS
-    if should_cancel() or not info_json.get("resultados"):
-        print(f"=== [JSON+TTS] Cortado tras JSON para {libro} {capitulo} ===")
+    with metrics_context(libro=libro, capitulo=capitulo):
+        resultados, reporte_tts = asyncio.run(
+            _con_mistral_propio(lambda client: _json_tts_stream(client, get_eleven_client(), texto))
+        )
+    audio_files = [item["file"] for item in reporte_tts["procesados"]]
+
+    # Si se canceló o no hubo nada, NO guardamos el JSON (igual que run_json)
+    if should_cancel() or not resultados:
+        print(f"=== [JSON+TTS] Cortado para {libro} {capitulo} ===")
         return {
             "libro": libro,
             "capitulo": capitulo,
-            "json_path": info_json.get("json_path"),
-            "num_items": info_json.get("num_items", 0),
-            "num_audios": 0,
-            "audio_files": [],
+            "json_path": None,
+            "num_items": len(resultados),
+            "num_audios": len(audio_files),
+            "audio_files": audio_files,
         }
 
-    info_tts = run_tts_from_resultados(info_json["resultados"], libro, capitulo)
+    out_json = f"{libro}_{capitulo}_videos.json"
+    guardar_json(resultados, out_json)
+    mark_stage_done(libro, capitulo, "json")
+
+    if not reporte_tts["cancelled"]:
+        mark_stage_done(libro, capitulo, "tts")
+    print(f"=== [JSON+TTS] Terminado {libro} {capitulo} – items: {len(resultados)}, audios: {len(audio_files)} ===")
 
     return {
         "libro": libro,
         "capitulo": capitulo,
-        "json_path": info_json["json_path"],
-        "num_items": info_json["num_items"],
-        "num_audios": info_tts["num_audios"],
-        "audio_files": info_tts["audio_files"],
+        "json_path": out_json,
+        "num_items": len(resultados),
+        "num_audios": len(audio_files),
+        "audio_files": audio_files,
     }
 
 
 # ============ ETAPA 3: IMÁGENES ============
 
+def _generar_imagenes(json_path: Path, output_root: str, libro: str, capitulo: int):
+    # Con el worker residente el modelo ya está cargado: no se paga la carga por capítulo
+    if IMAGE_WORKER:
+        from image_worker import WorkerNoDisponible, asegurar_worker, generar_en_worker
+        try:
+            asegurar_worker()
+            r = generar_en_worker(json_path, output_root=output_root, libro=libro, capitulo=capitulo)
+            print(f"[IMG] Worker: carga {r['load_s']:.1f} s, generación {r['gen_s']:.1f} s")
+            return
+        except WorkerNoDisponible as e:
+            print(f"⚠ {e}. Se carga el modelo en este proceso.")
+
+    # Import diferido: torch/diffusers solo se cargan si realmente hay imágenes que generar
+    from image_pipeline import cargar_zimage_pipeline, generar_imagenes_desde_json
+
+    pipeline = cargar_zimage_pipeline()
+    generar_imagenes_desde_json(pipeline, str(json_path), output_root=output_root, libro=libro, capitulo=capitulo)
+
+
 def run_imagenes_from_json(libro: str, capitulo: int, output_root: str = "output"):
     """
     Carga Z-Image y genera imágenes a partir del JSON correspondiente al libro/capítulo.
@@ -216,8 +332,7 @@ def run_imagenes_from_json(libro: str, capitulo: int, output_root: str = "output
             "output_root": output_root,
         }
 
-    pipeline = cargar_zimage_pipeline()
-    generar_imagenes_desde_json(pipeline, str(json_path), output_root=output_root, libro=libro, capitulo=capitulo)
+    _generar_imagenes(json_path, output_root, libro, capitulo)
 
     if should_cancel():
         print(f"=== [IMG] Cancelado después de generar algunas imágenes para {libro} {capitulo} ===")
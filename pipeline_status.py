@@ -61,3 +61,25 @@ def next_pending(libro: str, stage: str) -> int | None:
     if not caps:
         return 1
     return max(caps) + 1
+
+
+def invalidate_chapters(chapters, videos_dir: str | Path = ".") -> list:
+    """
+    Invalida artefactos de capítulos cuyo texto cambió (ver BibleScraper.refresh):
+    borra {libro}_{capitulo}_videos.json y quita el capítulo de todas las etapas.
+    chapters: iterable de (libro, capitulo). Devuelve los JSON borrados.
+    """
+    removed = []
+    with _LOCK:
+        status = _load_status()
+        for libro, capitulo in chapters:
+            capitulo = int(capitulo)
+            json_path = Path(videos_dir) / f"{libro}_{capitulo}_videos.json"
+            if json_path.exists():
+                json_path.unlink()
+                removed.append(str(json_path))
+            for caps in status.get(libro.lower(), {}).values():
+                if capitulo in caps:
+                    caps.remove(capitulo)
+        _save_status(status)
+    return removed
@@ -0,0 +1,341 @@
+# rate_limit.py
+"""
+Límite de peticiones y circuit breaker compartidos por proveedor (mistral, elevenlabs).
+
+Todas las llamadas a una API pasan por el mismo Provider, sin importar desde qué
+hilo, comando del bot o event loop vengan:
+
+    provider = get_provider("mistral")
+    respuesta = provider.call(lambda: client.chat.complete(...), tokens=1200)
+    respuesta = await provider.call_async(lambda: client.chat.complete_async(...), tokens=1200)
+
+  - Token bucket de peticiones/s y otro de tokens/min (en ElevenLabs, caracteres/min).
+  - Un 429 con Retry-After pausa al proveedor entero, no solo al hilo que lo recibió.
+  - Tras `failure_threshold` errores de servidor/red seguidos el circuito se abre y
+    las llamadas fallan al instante con CircuitOpenError durante `reset_timeout` s;
+    después se deja pasar una llamada de prueba (half-open).
+"""
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from threading import Lock
+
+from config import (
+    MISTRAL_RPS,
+    MISTRAL_TOKENS_PER_MIN,
+    ELEVEN_RPS,
+    ELEVEN_CHARS_PER_MIN,
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """El proveedor falló demasiadas veces seguidas; no se intenta la llamada."""
+
+
+class TokenBucket:
+    """
+    Bucket thread-safe por reserva: reserve(n) descuenta ya los tokens (el saldo
+    puede quedar negativo) y devuelve cuánto hay que esperar antes de usarlos.
+    Así la espera puede hacerse con time.sleep o asyncio.sleep según el llamador.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def reserve(self, n: float = 1.0) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Una petición mayor que el bucket entero igual debe poder pasar alguna vez
+            n = min(n, self.capacity)
+            self._tokens -= n
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def before(self, name: str, trial: bool = True) -> bool:
+        """
+        Lanza CircuitOpenError si el circuito no deja pasar la llamada. Devuelve
+        True si esta es la llamada de prueba del half-open: quien la hace debe
+        cerrarla con success(), failure() o release(). Con trial=False (peticiones
+        extra que no informan su resultado) el half-open tampoco deja pasar.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            restante = self.reset_timeout - (time.monotonic() - self.opened_at)
+            if restante > 0 or self._trial or not trial:
+                raise CircuitOpenError(
+                    f"{name}: circuito abierto tras {self.failures} fallos seguidos "
+                    f"(reintento en {max(restante, 0):.0f} s)"
+                )
+            self._trial = True  # half-open: una sola llamada de prueba
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def release(self):
+        """La llamada de prueba terminó sin veredicto (JSON inválido, 429, cancelada): otra puede probar."""
+        with self._lock:
+            self._trial = False
+
+    def failure(self) -> bool:
+        """Registra un fallo; devuelve True si con este el circuito se abre."""
+        with self._lock:
+            self.failures += 1
+            reabre = self._trial
+            self._trial = False
+            if reabre or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+
+# ============ CLASIFICACIÓN DE ERRORES ============
+#
+# Los SDKs (mistralai, elevenlabs, httpx) exponen el status y los headers con
+# nombres distintos; se buscan por atributo para no importar ninguno aquí.
+
+def _status_of(exc) -> int | None:
+    for obj in (exc, getattr(exc, "raw_response", None), getattr(exc, "response", None)):
+        status = getattr(obj, "status_code", None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def _retry_after_of(exc) -> float | None:
+    for obj in (exc, getattr(exc, "raw_response", None), getattr(exc, "response", None)):
+        headers = getattr(obj, "headers", None)
+        if not headers:
+            continue
+        value = headers.get("Retry-After") or headers.get("retry-after")
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def _is_transport_error(exc) -> bool:
+    if isinstance(exc, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    nombre = type(exc).__name__
+    return any(p in nombre for p in ("Timeout", "Connect", "Network", "Transport", "RemoteProtocol"))
+
+
+class Provider:
+    def __init__(
+        self,
+        name: str,
+        requests_per_second: float,
+        tokens_per_minute: float | None = None,
+        burst: float | None = None,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        attempts: int = 3,
+        backoff: float = 1.5,
+        max_rate_limited: int = 6,
+    ):
+        self.name = name
+        self.requests = TokenBucket(requests_per_second, burst or max(1.0, requests_per_second))
+        self.tokens = (
+            TokenBucket(tokens_per_minute / 60.0, tokens_per_minute) if tokens_per_minute else None
+        )
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_rate_limited = max_rate_limited
+        self._paused_until = 0.0
+        self._lock = Lock()
+        self.stats = {"calls": 0, "waited_s": 0.0, "rate_limited": 0, "retries": 0, "circuit_opened": 0}
+
+    def _count(self, key: str, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def pause(self, seconds: float):
+        """Retry-After: nadie llama a este proveedor hasta dentro de `seconds`."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _wait_time(self, tokens: float) -> float:
+        with self._lock:
+            pausa = self._paused_until - time.monotonic()
+        espera = max(pausa, self.requests.reserve(1))
+        if self.tokens is not None and tokens:
+            espera = max(espera, self.tokens.reserve(tokens))
+        if espera > 0:
+            self._count("waited_s", espera)
+        return max(espera, 0.0)
+
+    def acquire(self, tokens: float = 0):
+        """Cupo para una petición extra sin reintentos (el duplicado de hedging.py)."""
+        self.breaker.before(self.name, trial=False)
+        espera = self._wait_time(tokens)
+        if espera:
+            time.sleep(espera)
+        self._count("calls")
+
+    async def acquire_async(self, tokens: float = 0):
+        self.breaker.before(self.name, trial=False)
+        espera = self._wait_time(tokens)
+        if espera:
+            await asyncio.sleep(espera)
+        self._count("calls")
+
+    def _on_error(self, exc, attempt: int, rate_limited: int) -> float | None:
+        """
+        Decide qué hacer con un error: devuelve los segundos a esperar antes de
+        reintentar, o None si hay que propagarlo.
+        """
+        status = _status_of(exc)
+
+        if status == 429:
+            self._count("rate_limited")
+            if rate_limited >= self.max_rate_limited:
+                return None
+            espera = _retry_after_of(exc)
+            if espera is None:
+                espera = self.backoff ** rate_limited + random.uniform(0, 0.5)
+            self.pause(espera)
+            return espera
+
+        if status is not None and status < 500 and status != 408:
+            # 4xx: la petición está mal; el proveedor responde bien
+            self.breaker.success()
+            return None
+
+        if status is not None or _is_transport_error(exc):
+            if self.breaker.failure():
+                self._count("circuit_opened")
+                return None
+
+        # Errores de parseo (JSON inválido, etc.) se reintentan como antes
+        if attempt >= self.attempts - 1:
+            return None
+        self._count("retries")
+        espera = _retry_after_of(exc)
+        return espera if espera is not None else self.backoff ** attempt + random.uniform(0, 0.2)
+
+    def call(self, fn, tokens: float = 0):
+        attempt = rate_limited = 0
+        while True:
+            prueba = self.breaker.before(self.name)
+            try:
+                espera = self._wait_time(tokens)
+                if espera:
+                    time.sleep(espera)
+                self._count("calls")
+                try:
+                    result = fn()
+                except CircuitOpenError:
+                    raise
+                except Exception as e:
+                    espera = self._on_error(e, attempt, rate_limited)
+                    if espera is None:
+                        raise
+                    if _status_of(e) == 429:
+                        rate_limited += 1
+                    else:
+                        attempt += 1
+                else:
+                    self.breaker.success()
+                    return result
+            finally:
+                # Pase lo que pase (error de parseo, cancelación), la prueba no queda abierta
+                if prueba:
+                    self.breaker.release()
+            time.sleep(espera)
+
+    async def call_async(self, fn, tokens: float = 0):
+        attempt = rate_limited = 0
+        while True:
+            prueba = self.breaker.before(self.name)
+            try:
+                espera = self._wait_time(tokens)
+                if espera:
+                    await asyncio.sleep(espera)
+                self._count("calls")
+                try:
+                    result = await fn()
+                except CircuitOpenError:
+                    raise
+                except Exception as e:
+                    espera = self._on_error(e, attempt, rate_limited)
+                    if espera is None:
+                        raise
+                    if _status_of(e) == 429:
+                        rate_limited += 1
+                    else:
+                        attempt += 1
+                else:
+                    self.breaker.success()
+                    return result
+            finally:
+                if prueba:
+                    self.breaker.release()
+            await asyncio.sleep(espera)
+
+_PROVIDERS = {}
+_PROVIDERS_LOCK = Lock()
+
+_DEFAULTS = {
+    "mistral": dict(requests_per_second=MISTRAL_RPS, tokens_per_minute=MISTRAL_TOKENS_PER_MIN),
+    "elevenlabs": dict(requests_per_second=ELEVEN_RPS, tokens_per_minute=ELEVEN_CHARS_PER_MIN),
+}
+
+
+def get_provider(name: str) -> Provider:
+    """Provider único del proceso para `name` (límites según config)."""
+    with _PROVIDERS_LOCK:
+        if name not in _PROVIDERS:
+            _PROVIDERS[name] = Provider(name, **_DEFAULTS.get(name, {"requests_per_second": 1.0}))
+        return _PROVIDERS[name]
+
+
+def set_provider(name: str, provider: Provider | None):
+    """Sustituye el Provider de `name` (benchmarks, otros límites). None = volver al de config."""
+    with _PROVIDERS_LOCK:
+        if provider is None:
+            _PROVIDERS.pop(name, None)
+        else:
+            _PROVIDERS[name] = provider
+
+
+def provider_stats() -> dict:
+    with _PROVIDERS_LOCK:
+        providers = list(_PROVIDERS.values())
+    return {p.name: {**p.stats, "circuit": p.breaker.state} for p in providers}
@@ -1,10 +1,21 @@
 import asyncio
+import hashlib
 import json
+import os
 import re
+import time
+from html.parser import HTMLParser
 from pathlib import Path
+import httpx
 from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 from datetime import datetime
 
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# Número de versículo candidato: seguido de una letra (cualquier caja) o de ¿, ¡, comillas...
+_VERSE_MARK_RE = re.compile(r'(\d+)(\s*)(?=[^\W\d_]|[¿¡«"“(])')
+_VERSE_OPENERS = '¿¡«"“('
+
 # Estructura de la Biblia
 BIBLE_STRUCTURE = {
     "genesis": 50, "exodo": 40, "levitico": 27, "numeros": 36, "deuteronomio": 34,
@@ -24,100 +35,488 @@ BIBLE_STRUCTURE = {
     "judas": 1, "apocalipsis": 22
 }
 
+class AsyncRateLimiter:
+    """Token bucket: como mucho `rate` peticiones por segundo, ráfagas de hasta `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class _PageTextParser(HTMLParser):
+    """
+    Aproxima inner_text() de <main> y <body> en una sola pasada:
+    ignora script/style y mete saltos de línea en elementos de bloque.
+    """
+
+    BLOCK_TAGS = {
+        "p", "div", "br", "li", "ul", "ol", "h1", "h2", "h3", "h4", "h5", "h6",
+        "section", "article", "header", "footer", "nav", "tr", "table", "main",
+    }
+    SKIP_TAGS = {"script", "style", "noscript", "template", "head"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.main_parts = []
+        self.body_parts = []
+        self.in_main = 0
+        self.in_body = 0
+        self.skip = 0
+
+    def _newline(self):
+        if self.in_body:
+            self.body_parts.append("\n")
+        if self.in_main:
+            self.main_parts.append("\n")
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skip += 1
+        elif tag == "body":
+            self.in_body += 1
+        if tag in self.BLOCK_TAGS:
+            self._newline()
+        if tag == "main":
+            self.in_main += 1
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in self.BLOCK_TAGS:
+            self._newline()
+
+    def handle_endtag(self, tag):
+        if tag == "main" and self.in_main:
+            self.in_main -= 1
+        if tag in self.BLOCK_TAGS:
+            self._newline()
+        if tag in self.SKIP_TAGS and self.skip:
+            self.skip -= 1
+        elif tag == "body" and self.in_body:
+            self.in_body -= 1
+
+    def handle_data(self, data):
+        if self.skip:
+            return
+        if self.in_body:
+            self.body_parts.append(data)
+        if self.in_main:
+            self.main_parts.append(data)
+
+
+def extract_page_text(html):
+    """Devuelve (texto_de_main, texto_de_body) de una página de capítulo."""
+    parser = _PageTextParser()
+    parser.feed(html)
+    parser.close()
+    return "".join(parser.main_parts), "".join(parser.body_parts)
+
+
+class ScrapeCheckpoint:
+    """
+    Log append-only (JSONL) con un capítulo por línea:
+        {"libro": ..., "capitulo": ..., "versiculos": {...}}
+    En memoria solo se guarda (libro, capítulo) -> (offset, nº versículos), así
+    que el consumo no crece con el texto extraído. Si un capítulo aparece
+    varias veces (reintento tras error), gana la última línea.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.index = {}
+        self._load()
+        self._file = open(self.path, "ab")
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        valid_end = 0
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    self.index[(rec["libro"], int(rec["capitulo"]))] = (offset, len(rec["versiculos"]))
+                    valid_end = offset + len(line)
+                except (ValueError, KeyError, TypeError):
+                    # Línea cortada por un crash a mitad de escritura: se descarta
+                    pass
+                offset += len(line)
+        if valid_end < self.path.stat().st_size:
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_end)
+
+    def is_done(self, book, chapter):
+        entry = self.index.get((book, int(chapter)))
+        return bool(entry and entry[1])
+
+    def append(self, book, chapter, verses):
+        line = json.dumps(
+            {"libro": book, "capitulo": int(chapter), "versiculos": verses},
+            ensure_ascii=False,
+        ).encode("utf-8") + b"\n"
+        offset = self._file.tell()
+        self._file.write(line)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.index[(book, int(chapter))] = (offset, len(verses))
+
+    def books(self):
+        """{libro: {capitulo: n_versiculos}} de lo que hay en el log."""
+        out = {}
+        for (book, chapter), (_, n) in self.index.items():
+            out.setdefault(book, {})[chapter] = n
+        return out
+
+    def iter_book(self, book):
+        """(capitulo_str, versiculos) en orden, leyendo cada línea del disco."""
+        chapters = sorted(c for (b, c) in self.index if b == book)
+        with open(self.path, "rb") as f:
+            for chapter in chapters:
+                f.seek(self.index[(book, chapter)][0])
+                yield str(chapter), json.loads(f.readline())["versiculos"]
+
+    def close(self):
+        self._file.close()
+
+
+def verses_hash(verses):
+    return hashlib.sha256(
+        json.dumps(verses, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+class ScrapeManifest:
+    """
+    Por capítulo: hash del contenido extraído y validadores HTTP (ETag,
+    Last-Modified) de la última descarga. Es la base del refresh incremental.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def _key(book, chapter):
+        return f"{book}:{int(chapter)}"
+
+    def get(self, book, chapter):
+        return self.entries.get(self._key(book, chapter))
+
+    def update(self, book, chapter, verses, validators=None):
+        """Registra el capítulo. Devuelve True si el contenido cambió (o es nuevo)."""
+        key = self._key(book, chapter)
+        digest = verses_hash(verses)
+        prev = self.entries.get(key) or {}
+        self.entries[key] = {"sha256": digest, **(validators or {})}
+        return prev.get("sha256") != digest
+
+    def seed(self, bible_json):
+        """
+        Completa los hashes que faltan a partir de una Biblia ya extraída
+        ({"libros": {libro: {cap: versiculos}}}): los capítulos scrapeados antes
+        de existir el manifest no cuentan como cambiados en el primer refresh.
+        Devuelve cuántas entradas se sembraron.
+        """
+        with open(bible_json, "r", encoding="utf-8") as f:
+            libros = json.load(f).get("libros", {})
+        seeded = 0
+        for book, chapters in libros.items():
+            for chapter, verses in chapters.items():
+                if not chapter.isdigit() or not verses:
+                    continue
+                entry = self.entries.setdefault(self._key(book, chapter), {})
+                if "sha256" not in entry:
+                    entry["sha256"] = verses_hash(verses)
+                    seeded += 1
+        return seeded
+
+    def touch(self, book, chapter, validators):
+        """304 / contenido igual: solo refresca los validadores."""
+        entry = self.entries.setdefault(self._key(book, chapter), {})
+        entry.update(validators or {})
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+def _validators_from(headers):
+    validators = {}
+    etag = headers.get("etag") or headers.get("ETag")
+    last_modified = headers.get("last-modified") or headers.get("Last-Modified")
+    if etag:
+        validators["etag"] = etag
+    if last_modified:
+        validators["last_modified"] = last_modified
+    return validators
+
+
+# Marca de "sin cambios" (HTTP 304) devuelta por _fetch_http en modo condicional
+NOT_MODIFIED = object()
+
+
+def _write_streamed_json(f, head_key, head, body_key, items, depth):
+    """
+    Escribe {head_key: head, body_key: {k: v, ...}} sin armar el dict completo.
+    items: iterable de (clave, valor) o de (clave, iterable anidado) si depth == 2.
+    """
+    ind = "  "
+    f.write("{\n" + ind + json.dumps(head_key) + ": ")
+    f.write(json.dumps(head, ensure_ascii=False, indent=2).replace("\n", "\n" + ind))
+    f.write(",\n" + ind + json.dumps(body_key) + ": {")
+    first = True
+    for key, value in items:
+        f.write(("" if first else ",") + "\n" + ind * 2 + json.dumps(key, ensure_ascii=False) + ": ")
+        first = False
+        if depth == 2:
+            f.write("{")
+            inner_first = True
+            for k2, v2 in value:
+                f.write(("" if inner_first else ",") + "\n" + ind * 3 + json.dumps(k2) + ": ")
+                f.write(json.dumps(v2, ensure_ascii=False, indent=2).replace("\n", "\n" + ind * 3))
+                inner_first = False
+            f.write(("" if inner_first else "\n" + ind * 2) + "}")
+        else:
+            f.write(json.dumps(value, ensure_ascii=False, indent=2).replace("\n", "\n" + ind * 2))
+    f.write(("" if first else "\n" + ind) + "}\n}\n")
+
+
 class BibleScraper:
-    def __init__(self, headless=True, delay=0.5):
+    def __init__(self, headless=True, delay=0.5, concurrency=1, rate=None, burst=1,
+                 base_url=None, record_dir=None, fetch_mode="browser",
+                 checkpoint_path=None,
+                 manifest_path="output/biblia_manifest.json"):
         self.headless = headless
         self.delay = delay
-        self.base_url = "https://www.biblia.es/biblia-buscar-libros-1.php"
+        self.concurrency = max(1, concurrency)
+        self.base_url = base_url or "https://www.biblia.es/biblia-buscar-libros-1.php"
         self.version = "rv60"
         self.bible_data = {}
-        self.stats = {"success": 0, "errors": 0, "total": 0}
+        self.stats = {"success": 0, "errors": 0, "total": 0, "fallbacks": 0, "skipped": 0}
+        # Checkpoint por capítulo (opt-in): permite reanudar y no guarda el texto en
+        # memoria; self.bible_data queda vacío y el texto se lee con iter_book().
+        # checkpoint_path=None (por defecto) -> todo en self.bible_data.
+        self.checkpoint = ScrapeCheckpoint(checkpoint_path) if checkpoint_path else None
+        # Libros pedidos en el último scrape_all: el log puede tener otros de corridas anteriores
+        self.run_books = None
+        # Hash + ETag/Last-Modified por capítulo para refresh() incremental
+        self.manifest = ScrapeManifest(manifest_path) if manifest_path else None
+        self._validators = {}
+        # "browser": Playwright para todo. "http": GET directo + parser HTML,
+        # con Playwright solo para capítulos donde el parser no encuentra versículos.
+        if fetch_mode not in ("browser", "http"):
+            raise ValueError(f"fetch_mode inválido: {fetch_mode}")
+        self.fetch_mode = fetch_mode
+        self._http = None
+        self._browser = self._context = self._page_for_fallback = None
+        self._playwright = None
+        # Límite por host: `rate` peticiones/s. Por defecto equivale al antiguo
+        # sleep fijo (1/delay), pero compartido entre todas las páginas del pool.
+        if rate is None and delay:
+            rate = 1 / delay
+        self.limiter = AsyncRateLimiter(rate, burst)
+        # Si se indica, guarda el HTML de cada capítulo (fixtures para pruebas locales)
+        self.record_dir = Path(record_dir) if record_dir else None
         
     def parse_verses(self, text):
-        """Extrae versículos del texto usando regex"""
+        """
+        Extrae versículos en una sola pasada sobre el texto.
+
+        Una marca de versículo es un número pegado (o separado por espacios) al
+        inicio del versículo: "1En el principio" / "2 Y la tierra" / "2que él".
+        Se acepta si es el siguiente número de la secuencia (con cualquier letra
+        detrás), un 1 ante mayúscula (reinicia) o un número mayor pegado al texto
+        o a principio de línea (se salta hasta él, así un versículo no detectado
+        no arrastra a todos los siguientes). Los números dentro del texto
+        ("vivió 930 años") no cortan el versículo.
+        """
         verses = {}
-        
-        # Limpiar el texto
-        text = text.strip()
-        
-        # Patrón para detectar versículos: número seguido de texto
-        # Formato: "1Texto del versículo" o "1 Texto del versículo"
-        pattern = r'(\d+)\s*([^0-9]+?)(?=\d+\s*[A-ZÁÉÍÓÚÑ]|$)'
-        
-        matches = re.finditer(pattern, text, re.DOTALL)
-        
-        for match in matches:
-            verse_num = match.group(1)
-            verse_text = match.group(2).strip()
-            
-            # Limpiar texto del versículo
-            verse_text = re.sub(r'\s+', ' ', verse_text)
-            verse_text = verse_text.strip()
-            
+        current = None
+        start = 0
+        expected = None
+
+        for match in _VERSE_MARK_RE.finditer(text):
+            num = int(match.group(1))
+            siguiente = text[match.end()]
+            fuerte = siguiente.isupper() or siguiente in _VERSE_OPENERS
+            anclado = not match.group(2) or match.start() == 0 or text[match.start() - 1] == "\n"
+            if expected is None:
+                if not fuerte:
+                    continue
+            elif not (num == expected or (num == 1 and fuerte) or (num > expected and anclado)):
+                continue
+
+            if current is not None:
+                # Limpiar texto del versículo (colapsar espacios)
+                verse_text = " ".join(text[start:match.start()].split())
+                if verse_text:
+                    verses[current] = verse_text
+
+            current = str(num)
+            start = match.end()
+            expected = num + 1
+
+        if current is not None:
+            verse_text = " ".join(text[start:].split())
             if verse_text:
-                verses[verse_num] = verse_text
-        
+                verses[current] = verse_text
+
         return verses
         
-    async def scrape_chapter(self, page, book, chapter):
-        """Extrae un capítulo específico"""
-        url = f"{self.base_url}?libro={book}&capitulo={chapter}&version={self.version}"
-        
+    def _chapter_url(self, book, chapter):
+        return f"{self.base_url}?libro={book}&capitulo={chapter}&version={self.version}"
+
+    def _extract_verses(self, main_text, body_text, chapter):
+        """Métodos 1 y 2 de extracción, comunes al navegador y al modo HTTP."""
+        # Método 1: Buscar en el main content
+        verses = self.parse_verses(main_text) if main_text else {}
+
+        # Método 2: Si no encuentra nada, buscar en todo el body
+        if not verses and body_text:
+            text = body_text
+            # Extraer solo la sección relevante (después de "Capítulo X"),
+            # hasta el siguiente "Capítulo" o el final: un solo slice del body
+            chapter_pattern = f"Capítulo {chapter}"
+            begin = text.find(chapter_pattern)
+            if begin >= 0:
+                begin += len(chapter_pattern)
+                end = text.find("Capítulo", begin)
+                text = text[begin:end] if end > begin else text[begin:]
+
+            verses = self.parse_verses(text)
+        return verses
+
+    def _report(self, book, chapter, verses):
+        """Actualiza stats e imprime. verses=None -> error ya informado."""
+        if verses:
+            print(f"  ✓ {book.title():20} Cap {chapter:3}: {len(verses):3} versículos")
+            self.stats["success"] += 1
+            return verses
+        if verses is not None:
+            print(f"  ⚠ {book.title():20} Cap {chapter:3}: No se encontraron versículos")
+        self.stats["errors"] += 1
+        return {}
+
+    async def _fetch_browser(self, page, book, chapter):
+        """Navega con Playwright. Devuelve versículos, {} si no hubo, o None si falló."""
+        url = self._chapter_url(book, chapter)
+
         try:
-            self.stats["total"] += 1
+            await self.limiter.acquire()
             
             # Navegar a la página
             response = await page.goto(url, wait_until="domcontentloaded", timeout=30000)
             
             if response.status != 200:
                 print(f"  ✗ Error HTTP {response.status}: {book} {chapter}")
-                self.stats["errors"] += 1
-                return {}
+                return None
+            self._validators[(book, chapter)] = _validators_from(response.headers)
             
             # Esperar a que cargue el contenido
             await page.wait_for_load_state("networkidle", timeout=10000)
+
+            if self.record_dir:
+                self._record_html(book, chapter, await page.content())
             
-            # Método 1: Buscar en el main content
-            verses = {}
             main_content = await page.query_selector('main')
-            
-            if main_content:
-                text = await main_content.inner_text()
-                verses = self.parse_verses(text)
-            
-            # Método 2: Si no encuentra nada, buscar en todo el body
+            main_text = await main_content.inner_text() if main_content else ""
+            verses = self._extract_verses(main_text, None, chapter)
             if not verses:
                 body = await page.query_selector('body')
                 if body:
-                    text = await body.inner_text()
-                    # Extraer solo la sección relevante (después de "Capítulo X")
-                    chapter_pattern = f"Capítulo {chapter}"
-                    if chapter_pattern in text:
-                        text = text.split(chapter_pattern, 1)[1]
-                        # Tomar hasta el siguiente "Capítulo" o hasta el final
-                        next_chapter = text.find("Capítulo")
-                        if next_chapter > 0:
-                            text = text[:next_chapter]
-                    
-                    verses = self.parse_verses(text)
-            
-            if verses:
-                print(f"  ✓ {book.title():20} Cap {chapter:3}: {len(verses):3} versículos")
-                self.stats["success"] += 1
-            else:
-                print(f"  ⚠ {book.title():20} Cap {chapter:3}: No se encontraron versículos")
-                self.stats["errors"] += 1
-            
+                    verses = self._extract_verses(None, await body.inner_text(), chapter)
             return verses
             
         except PlaywrightTimeoutError:
             print(f"  ✗ Timeout: {book} {chapter}")
-            self.stats["errors"] += 1
-            return {}
+            return None
         except Exception as e:
             print(f"  ✗ Error en {book} {chapter}: {str(e)[:50]}")
-            self.stats["errors"] += 1
+            return None
+
+    async def _fetch_http(self, book, chapter, conditional=None):
+        """
+        GET directo con httpx (keep-alive). Devuelve versículos o {} si hay que caer al navegador.
+        Con `conditional` (entrada del manifest) manda If-None-Match/If-Modified-Since
+        y devuelve NOT_MODIFIED ante un 304.
+        """
+        headers = {}
+        if conditional:
+            if conditional.get("etag"):
+                headers["If-None-Match"] = conditional["etag"]
+            if conditional.get("last_modified"):
+                headers["If-Modified-Since"] = conditional["last_modified"]
+        try:
+            await self.limiter.acquire()
+            response = await self._http.get(self._chapter_url(book, chapter), headers=headers)
+            self._validators[(book, chapter)] = _validators_from(response.headers)
+            if response.status_code == 304:
+                return NOT_MODIFIED
+            if response.status_code != 200:
+                return {}
+            html = response.text
+            if self.record_dir:
+                self._record_html(book, chapter, html)
+            main_text, body_text = extract_page_text(html)
+            return self._extract_verses(main_text, body_text, chapter)
+        except Exception as e:
+            print(f"  ✗ HTTP {book} {chapter}: {str(e)[:50]} (se usará el navegador)")
             return {}
+
+    async def _fallback_page(self):
+        """Página de Playwright creada solo cuando el modo HTTP la necesita por primera vez."""
+        async with self._fallback_lock:
+            if self._page_for_fallback is None:
+                context = await self._browser_context()
+                self._page_for_fallback = await context.new_page()
+            return self._page_for_fallback
+
+    async def _browser_context(self):
+        if self._context is None:
+            self._browser = await self._playwright.chromium.launch(headless=self.headless)
+            self._context = await self._browser.new_context(user_agent=USER_AGENT)
+        return self._context
+
+    async def scrape_chapter(self, page, book, chapter):
+        """Extrae un capítulo específico"""
+        # Los contadores se actualizan sin await de por medio: son seguros
+        # aunque haya varias corrutinas del pool scrapeando a la vez.
+        self.stats["total"] += 1
+
+        if self.fetch_mode == "http":
+            verses = await self._fetch_http(book, chapter)
+            if verses:
+                return self._report(book, chapter, verses)
+            self.stats["fallbacks"] += 1
+            page = await self._fallback_page()
+            async with self._fallback_lock:
+                verses = await self._fetch_browser(page, book, chapter)
+            return self._report(book, chapter, verses)
+
+        verses = await self._fetch_browser(page, book, chapter)
+        return self._report(book, chapter, verses)
     
     async def scrape_book(self, page, book, num_chapters):
         """Extrae todos los capítulos de un libro"""
@@ -127,25 +526,164 @@ class BibleScraper:
         
         book_data = {}
         for chapter in range(1, num_chapters + 1):
+            # El rate limiter dentro de scrape_chapter evita sobrecargar el servidor
             verses = await self.scrape_chapter(page, book, chapter)
             book_data[str(chapter)] = verses
-            
-            # Delay para no sobrecargar el servidor
-            await asyncio.sleep(self.delay)
         
         return book_data
+
+    def _record_html(self, book, chapter, html):
+        path = self.record_dir / book / f"{chapter}.html"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(html, encoding="utf-8")
+
+    async def _worker(self, page, queue, on_done):
+        """Toma capítulos de la cola compartida hasta que se vacía."""
+        while True:
+            try:
+                book, chapter = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                verses = await self.scrape_chapter(page, book, chapter)
+                on_done(book, chapter, verses)
+            finally:
+                queue.task_done()
     
+    async def _start_session(self, p, force_http=False):
+        """Prepara cliente HTTP y/o páginas de navegador. Devuelve un 'page' por worker."""
+        self._playwright = p
+        self._browser = self._context = self._page_for_fallback = None
+        self._fallback_lock = asyncio.Lock()
+
+        if self.fetch_mode == "http" or force_http:
+            # Sin navegador: un cliente HTTP con pool keep-alive; Chromium solo
+            # se lanza si algún capítulo necesita el fallback.
+            self._http = httpx.AsyncClient(
+                headers={"User-Agent": USER_AGENT},
+                timeout=30,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.concurrency,
+                    max_keepalive_connections=self.concurrency,
+                ),
+            )
+            return [None] * self.concurrency
+
+        context = await self._browser_context()
+        # Pool de páginas: cada una consume capítulos de la misma cola
+        return [await context.new_page() for _ in range(self.concurrency)]
+
+    async def _close_session(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = self._context = self._page_for_fallback = None
+
+    async def refresh(self, books_list=None, seed_from=None):
+        """
+        Refresh incremental: pide cada capítulo con If-None-Match/If-Modified-Since
+        y solo re-parsea/re-escribe los que cambiaron (304 o mismo hash = sin cambios).
+        Devuelve {"changed": [...], "new": [...], "unchanged": n, "errors": [...]}:
+          changed : (libro, cap) cuyo contenido difiere del hash registrado
+          new     : (libro, cap) sin hash previo; no hay con qué comparar, así que
+                    no se deben invalidar (sus JSON de videos siguen valiendo)
+        seed_from: JSON de la Biblia ya extraída. Siembra los hashes que faltan en
+        el manifest y, sin checkpoint, se carga en bible_data para que
+        save_progress() escriba la Biblia completa con los cambios aplicados.
+        Los capítulos cambiados o nuevos se agregan al checkpoint (o a bible_data).
+        refresh_biblia() hace la corrida completa: guarda y, con invalidar=True,
+        pasa report["changed"] a pipeline_status.invalidate_chapters().
+        """
+        if not self.manifest:
+            raise ValueError("refresh() necesita manifest_path")
+        if seed_from:
+            seeded = self.manifest.seed(seed_from)
+            if seeded:
+                print(f"🌱 Hashes sembrados desde {seed_from}: {seeded}")
+            if not self.checkpoint:
+                with open(seed_from, "r", encoding="utf-8") as f:
+                    self.bible_data = json.load(f).get("libros", {})
+
+        if books_list:
+            books = [(book, BIBLE_STRUCTURE[book]) for book in books_list if book in BIBLE_STRUCTURE]
+        else:
+            books = list(BIBLE_STRUCTURE.items())
+
+        report = {"changed": [], "new": [], "unchanged": 0, "errors": []}
+        queue = asyncio.Queue()
+        for book, num_chapters in books:
+            for chapter in range(1, num_chapters + 1):
+                queue.put_nowait((book, chapter))
+
+        async def refresh_one(_page, book, chapter):
+            prev = self.manifest.get(book, chapter)
+            verses = await self._fetch_http(book, chapter, conditional=prev)
+            validators = self._validators.pop((book, chapter), None)
+
+            if verses is NOT_MODIFIED:
+                self.manifest.touch(book, chapter, validators)
+                report["unchanged"] += 1
+                return
+            if not verses:
+                self.stats["fallbacks"] += 1
+                page = await self._fallback_page()
+                async with self._fallback_lock:
+                    verses = await self._fetch_browser(page, book, chapter)
+                validators = self._validators.pop((book, chapter), validators)
+            if not verses:
+                report["errors"].append((book, chapter))
+                return
+
+            known = "sha256" in (prev or {})
+            if not self.manifest.update(book, chapter, verses, validators):
+                report["unchanged"] += 1
+                return
+            if known:
+                print(f"  ↻ {book.title():20} Cap {chapter:3}: cambió ({len(verses)} versículos)")
+                report["changed"].append((book, chapter))
+            else:
+                report["new"].append((book, chapter))
+            if self.checkpoint:
+                self.checkpoint.append(book, chapter, verses)
+            else:
+                self.bible_data.setdefault(book, {})[str(chapter)] = verses
+
+        async def worker(page):
+            while True:
+                try:
+                    book, chapter = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    await refresh_one(page, book, chapter)
+                finally:
+                    queue.task_done()
+
+        async with async_playwright() as p:
+            print("🔄 Refresh incremental de la Biblia Reina Valera 1960")
+            pages = await self._start_session(p, force_http=True)
+            try:
+                await asyncio.gather(*(worker(page) for page in pages))
+            finally:
+                await self._close_session()
+                self.manifest.save()
+
+        for key in ("changed", "new"):
+            report[key].sort(key=lambda bc: (list(BIBLE_STRUCTURE).index(bc[0]) if bc[0] in BIBLE_STRUCTURE else 0, bc[1]))
+        print(f"\n🔄 Cambiados: {len(report['changed'])} – nuevos (sin hash previo): {len(report['new'])} – "
+              f"sin cambios: {report['unchanged']} – errores: {len(report['errors'])}")
+        return report
+
     async def scrape_all(self, start_from=None, limit=None, books_list=None):
         """Extrae toda la Biblia o libros específicos"""
         async with async_playwright() as p:
             print("🚀 Iniciando scraper de la Biblia Reina Valera 1960")
             print("="*60)
-            
-            browser = await p.chromium.launch(headless=self.headless)
-            context = await browser.new_context(
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            )
-            page = await context.new_page()
+
+            pages = await self._start_session(p)
             
             # Determinar qué libros extraer
             if books_list:
@@ -163,17 +701,66 @@ class BibleScraper:
                 books = books[:limit]
             
             total_books = len(books)
+            self.run_books = [book for book, _ in books]
             start_time = datetime.now()
-            
-            for idx, (book, num_chapters) in enumerate(books, 1):
-                print(f"\n📚 Progreso: {idx}/{total_books} libros")
-                self.bible_data[book] = await self.scrape_book(page, book, num_chapters)
-                
+            print(f"📄 Modo: {self.fetch_mode} – {len(pages)} en paralelo")
+
+            queue = asyncio.Queue()
+            remaining = {book: 0 for book, _ in books}
+            for book, num_chapters in books:
+                for chapter in range(1, num_chapters + 1):
+                    if self.checkpoint and self.checkpoint.is_done(book, chapter):
+                        self.stats["skipped"] += 1
+                        continue
+                    queue.put_nowait((book, chapter))
+                    remaining[book] += 1
+            if self.stats["skipped"]:
+                print(f"⏭️  Capítulos ya guardados en el checkpoint: {self.stats['skipped']}")
+
+            pending = {book: {} for book, _ in books}
+            expected = dict(books)
+            done_books = [book for book, n in remaining.items() if n == 0]
+
+            def on_done(book, chapter, verses):
+                remaining[book] -= 1
+                validators = self._validators.pop((book, chapter), None)
+                if self.manifest and verses:
+                    self.manifest.update(book, chapter, verses, validators)
+                if self.checkpoint:
+                    # Se escribe al terminar cada capítulo: un crash pierde como mucho uno
+                    self.checkpoint.append(book, chapter, verses)
+                else:
+                    pending[book][str(chapter)] = verses
+                if remaining[book] > 0:
+                    return
+                done_books.append(book)
+                print(f"\n📚 Progreso: {len(done_books)}/{total_books} libros ({book} completo)")
+                if self.manifest:
+                    self.manifest.save()
+                if self.checkpoint:
+                    return
+
+                # Libro completo: capítulos en orden y fuera de `pending`
+                chapters = pending.pop(book)
+                self.bible_data[book] = {str(c): chapters[str(c)] for c in range(1, expected[book] + 1)}
+
                 # Guardar progreso cada 5 libros
-                if idx % 5 == 0:
-                    self.save_progress(f"biblia_progreso_{idx}_libros.json")
-            
-            await browser.close()
+                if len(done_books) % 5 == 0:
+                    self.save_progress(f"biblia_progreso_{len(done_books)}_libros.json")
+
+            try:
+                await asyncio.gather(*(self._worker(page, queue, on_done) for page in pages))
+            finally:
+                await self._close_session()
+                if self.manifest:
+                    self.manifest.save()
+
+            # Orden canónico de libros, independiente del orden en que terminaron
+            order = [book for book, _ in books]
+            self.bible_data = {
+                book: self.bible_data[book]
+                for book in sorted(self.bible_data, key=lambda b: order.index(b) if b in order else len(order))
+            }
             
             # Estadísticas finales
             end_time = datetime.now()
@@ -186,70 +773,140 @@ class BibleScraper:
             print(f"📊 Capítulos exitosos: {self.stats['success']}")
             print(f"❌ Capítulos con error: {self.stats['errors']}")
             print(f"📈 Total intentado: {self.stats['total']}")
-            print(f"✨ Tasa de éxito: {(self.stats['success']/self.stats['total']*100):.1f}%")
+            if self.stats["skipped"]:
+                print(f"⏭️  Reanudados desde checkpoint: {self.stats['skipped']}")
+            if self.fetch_mode == "http":
+                print(f"🧭 Fallbacks a navegador: {self.stats['fallbacks']}")
+            if self.stats["total"]:
+                print(f"✨ Tasa de éxito: {(self.stats['success']/self.stats['total']*100):.1f}%")
     
-    def save_progress(self, filename="biblia_reina_valera_1960.json"):
-        """Guarda el progreso en JSON"""
+    def _book_summary(self):
+        """{libro: n_capitulos, n_versiculos} en orden canónico, sin cargar el texto."""
+        if self.checkpoint:
+            books = {
+                book: (len(chapters), sum(chapters.values()))
+                for book, chapters in self.checkpoint.books().items()
+                if self.run_books is None or book in self.run_books
+            }
+        else:
+            books = {
+                book: (len(chapters), sum(len(verses) for verses in chapters.values()))
+                for book, chapters in self.bible_data.items()
+            }
+        order = list(BIBLE_STRUCTURE)
+        return {b: books[b] for b in sorted(books, key=lambda b: order.index(b) if b in order else len(order))}
+
+    def iter_book(self, book):
+        """(capitulo_str, versiculos) de un libro, desde el checkpoint o la memoria."""
+        if self.checkpoint:
+            yield from self.checkpoint.iter_book(book)
+        else:
+            yield from self.bible_data.get(book, {}).items()
+
+    def save_progress(self, filename="biblia_reina_valera_1960.json", allow_shrink=False):
+        """
+        Guarda el progreso en JSON (en streaming, libro por libro).
+        No pisa un archivo existente con más capítulos que lo que hay para
+        escribir (p. ej. la Biblia completa con solo los capítulos de un
+        refresh), salvo allow_shrink=True. Devuelve True si escribió.
+        """
         output_dir = Path("output")
         output_dir.mkdir(exist_ok=True)
         
         filepath = output_dir / filename
         
         # Calcular estadísticas
-        total_chapters = sum(len(chapters) for chapters in self.bible_data.values())
-        total_verses = sum(
-            len(verses) 
-            for book in self.bible_data.values() 
-            for verses in book.values()
-        )
+        summary = self._book_summary()
+        total_chapters = sum(n_caps for n_caps, _ in summary.values())
+        total_verses = sum(n_verses for _, n_verses in summary.values())
+
+        if filepath.exists() and not allow_shrink:
+            try:
+                with open(filepath, "r", encoding="utf-8") as f:
+                    previos = json.load(f).get("metadata", {}).get("total_capitulos", 0)
+            except (OSError, ValueError, AttributeError):
+                previos = 0
+            if previos > total_chapters:
+                print(f"\n⚠ No se guarda {filepath}: tiene {previos} capítulos y solo hay {total_chapters} "
+                      f"para escribir (allow_shrink=True para forzar)")
+                return False
         
-        data = {
-            "metadata": {
-                "version": "Reina Valera 1960",
-                "fecha_extraccion": datetime.now().isoformat(),
-                "total_libros": len(self.bible_data),
-                "total_capitulos": total_chapters,
-                "total_versiculos": total_verses,
-                "fuente": "https://www.biblia.es"
-            },
-            "libros": self.bible_data
+        metadata = {
+            "version": "Reina Valera 1960",
+            "fecha_extraccion": datetime.now().isoformat(),
+            "total_libros": len(summary),
+            "total_capitulos": total_chapters,
+            "total_versiculos": total_verses,
+            "fuente": "https://www.biblia.es"
         }
         
         with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+            _write_streamed_json(
+                f, "metadata", metadata, "libros",
+                ((book, self.iter_book(book)) for book in summary),
+                depth=2,
+            )
         
         size_kb = filepath.stat().st_size / 1024
         print(f"\n💾 Guardado: {filepath}")
-        print(f"   📚 Libros: {len(self.bible_data)}")
+        print(f"   📚 Libros: {len(summary)}")
         print(f"   📖 Capítulos: {total_chapters}")
         print(f"   📝 Versículos: {total_verses}")
         print(f"   💿 Tamaño: {size_kb:.2f} KB")
+        return True
     
     def save_by_book(self):
         """Guarda cada libro en un archivo JSON separado"""
         output_dir = Path("output/por_libro")
         output_dir.mkdir(parents=True, exist_ok=True)
         
-        for book, chapters in self.bible_data.items():
+        summary = self._book_summary()
+        for book, (n_chapters, total_verses) in summary.items():
             filepath = output_dir / f"{book}.json"
             
-            total_verses = sum(len(verses) for verses in chapters.values())
-            
-            data = {
-                "metadata": {
-                    "libro": book,
-                    "version": "Reina Valera 1960",
-                    "total_capitulos": len(chapters),
-                    "total_versiculos": total_verses,
-                    "fecha_extraccion": datetime.now().isoformat()
-                },
-                "capitulos": chapters
+            metadata = {
+                "libro": book,
+                "version": "Reina Valera 1960",
+                "total_capitulos": n_chapters,
+                "total_versiculos": total_verses,
+                "fecha_extraccion": datetime.now().isoformat()
             }
             
             with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+                _write_streamed_json(f, "metadata", metadata, "capitulos", self.iter_book(book), depth=1)
         
-        print(f"\n✅ {len(self.bible_data)} libros guardados en {output_dir}")
+        print(f"\n✅ {len(summary)} libros guardados en {output_dir}")
+
+
+async def refresh_biblia(filename="biblia_completa_rv1960.json", books_list=None, invalidar=False,
+                         videos_dir=".", **scraper_kwargs):
+    """
+    Refresh incremental de output/<filename>: aplica los capítulos que cambiaron,
+    reescribe el JSON (y los archivos por libro) y, con invalidar=True, borra los
+    JSON de videos y el estado del pipeline de los capítulos cuyo texto cambió.
+    Si el JSON no se pudo guardar no se invalida nada (se regenerarían con el
+    texto viejo). Devuelve el reporte de refresh() con "invalidated" (JSON borrados).
+    """
+    json_path = Path("output") / filename
+    scraper = BibleScraper(fetch_mode="http", **scraper_kwargs)
+    reporte = await scraper.refresh(books_list, seed_from=json_path if json_path.exists() else None)
+    reporte["invalidated"] = []
+
+    guardado = True
+    if reporte["changed"] or reporte["new"]:
+        guardado = scraper.save_progress(filename)
+        if guardado:
+            scraper.save_by_book()
+
+    if invalidar and reporte["changed"]:
+        if not guardado:
+            print("⚠ JSON no guardado: no se invalidan los capítulos cambiados")
+        else:
+            from pipeline_status import invalidate_chapters
+            reporte["invalidated"] = invalidate_chapters(reporte["changed"], videos_dir)
+            print(f"🗑 Capítulos invalidados: {len(reporte['changed'])} "
+                  f"(JSON de videos borrados: {len(reporte['invalidated'])})")
+    return reporte
 
 
 async def main():
@@ -288,6 +945,18 @@ async def main():
     #scraper.save_progress("biblia_completa_rv1960.json")
     #scraper.save_by_book()
     
+    # MODO 4b: TODA LA BIBLIA CON 4 PÁGINAS EN PARALELO (máx. 2 peticiones/s al host)
+    # (checkpoint_path: si se corta, la próxima corrida reanuda desde el log)
+    #scraper = BibleScraper(headless=True, concurrency=4, rate=2, burst=2,
+    #                       checkpoint_path="output/biblia_checkpoint.jsonl")
+    #await scraper.scrape_all()
+    #scraper.save_progress("biblia_completa_rv1960.json")
+    
+    # MODO 4c: REFRESH INCREMENTAL (solo capítulos cuyo contenido cambió)
+    # También desde consola: python scraper.py refresh --invalidar
+    #await refresh_biblia("biblia_completa_rv1960.json", invalidar=True,
+    #                     concurrency=4, rate=2, burst=2)
+    
     # MODO 5: CONTINUAR DESDE UN LIBRO ESPECÍFICO
     # scraper = BibleScraper(headless=True, delay=0.5)
     # await scraper.scrape_all(start_from="mateo")
@@ -297,4 +966,22 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Scraper de la Biblia Reina Valera 1960")
+    sub = parser.add_subparsers(dest="cmd")
+    p_refresh = sub.add_parser("refresh", help="Refresh incremental de un JSON ya extraído")
+    p_refresh.add_argument("--archivo", default="biblia_completa_rv1960.json", help="JSON dentro de output/")
+    p_refresh.add_argument("--libros", nargs="+", default=None)
+    p_refresh.add_argument("--invalidar", action="store_true",
+                           help="Borra los JSON de videos y el estado del pipeline de los capítulos cambiados")
+    p_refresh.add_argument("--videos-dir", default=".")
+    p_refresh.add_argument("--concurrency", type=int, default=4)
+    p_refresh.add_argument("--rate", type=float, default=2.0)
+    args = parser.parse_args()
+
+    if args.cmd == "refresh":
+        asyncio.run(refresh_biblia(args.archivo, args.libros, args.invalidar, args.videos_dir,
+                                   concurrency=args.concurrency, rate=args.rate, burst=2))
+    else:
+        asyncio.run(main())
\ No newline at end of file
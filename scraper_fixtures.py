@@ -0,0 +1,156 @@
+# scraper_fixtures.py
+"""
+Servidor HTTP local que imita biblia.es con páginas de capítulos grabadas,
+para probar y medir BibleScraper sin salir a internet.
+
+Estructura de fixtures:  <dir>/<libro>/<capitulo>.html
+Se obtienen grabando un scrape real (BibleScraper(record_dir=...)) o
+generándolas a partir de un JSON ya extraído (write_fixtures_from_json).
+"""
+import hashlib
+import html
+import json
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+PAGE_PATH = "/biblia-buscar-libros-1.php"
+
+
+def render_chapter_html(book: str, chapter: int, verses: dict) -> str:
+    items = "\n".join(
+        f'<p><span class="v">{num}</span>{html.escape(texto)}</p>'
+        for num, texto in sorted(verses.items(), key=lambda x: int(x[0]))
+    )
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+        f"<title>{html.escape(book)} {chapter}</title></head><body>"
+        "<header><nav>Inicio | Libros | Buscar</nav></header>"
+        f"<main><h1>{html.escape(book.title())}</h1>\n{items}\n</main>"
+        "<footer>Reina Valera 1960</footer></body></html>"
+    )
+
+
+def write_fixtures_from_json(json_path: str | Path, out_dir: str | Path, books=None) -> int:
+    """Genera <out_dir>/<libro>/<cap>.html desde un JSON de la Biblia. Devuelve nº de páginas."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        libros = json.load(f).get("libros", {})
+
+    out_dir = Path(out_dir)
+    count = 0
+    for book, chapters in libros.items():
+        if books and book not in books:
+            continue
+        for chapter, verses in chapters.items():
+            path = out_dir / book / f"{chapter}.html"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(render_chapter_html(book, int(chapter), verses or {}), encoding="utf-8")
+            count += 1
+    return count
+
+
+class FixtureServer:
+    """
+    Uso:
+        with FixtureServer("fixtures", latency=0.2) as server:
+            scraper = BibleScraper(base_url=server.base_url)
+
+    `latency` simula el tiempo de respuesta del servidor real (segundos).
+    Responde ETag/Last-Modified y 304 a peticiones condicionales, como un
+    servidor real, para probar BibleScraper.refresh().
+    """
+
+    def __init__(self, fixtures_dir: str | Path, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.fixtures_dir = Path(fixtures_dir)
+        self.latency = latency
+        self.requests = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{PAGE_PATH}"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                book = (query.get("libro") or [""])[0]
+                chapter = (query.get("capitulo") or [""])[0]
+                path = server.fixtures_dir / book / f"{chapter}.html"
+
+                if url.path != PAGE_PATH or not chapter.isdigit() or "/" in book or not path.is_file():
+                    self._send(404, b"<html><body>No encontrado</body></html>")
+                    return
+
+                body = path.read_bytes()
+                mtime = int(path.stat().st_mtime)
+                validators = {
+                    "ETag": '"' + hashlib.sha1(body).hexdigest() + '"',
+                    "Last-Modified": formatdate(mtime, usegmt=True),
+                }
+                if self._not_modified(validators["ETag"], mtime):
+                    with server._lock:
+                        server.not_modified += 1
+                    self._send(304, b"", validators)
+                    return
+                self._send(200, body, validators)
+
+            def _not_modified(self, etag, mtime):
+                if_none_match = self.headers.get("If-None-Match")
+                if if_none_match is not None:
+                    return if_none_match == etag
+                if_modified_since = self.headers.get("If-Modified-Since")
+                if if_modified_since:
+                    try:
+                        return mtime <= parsedate_to_datetime(if_modified_since).timestamp()
+                    except (TypeError, ValueError):
+                        return False
+                return False
+
+            def _send(self, status, body, extra_headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                for name, value in (extra_headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
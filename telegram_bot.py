@@ -16,6 +16,7 @@ from pipeline_status import get_status, next_pending
 from pipeline_cancel import reset_cancel, request_cancel
 from main import (
     run_json,
+    run_json_libro,
     run_tts_from_json,
     run_json_tts,
     run_imagenes_from_json,
@@ -24,6 +25,16 @@ from main import (
 
 from config import BIBLE_JSON_PATH
 from bible_io import BibleJSONProcessor
+from llm_pipeline import (
+    CACHE_MODES,
+    set_cache_mode,
+    get_cache_mode,
+    llm_cache_stats,
+    set_cascade_mode,
+    get_cascade_mode,
+    cascade_stats,
+)
+from tts_pipeline import tts_cache_stats
 
 processor = BibleJSONProcessor(BIBLE_JSON_PATH)
 
@@ -41,12 +52,16 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/json <libro> <cap>      – Solo generar JSON para libro/capítulo\n"
         "/tts <cap>               – Solo TTS (requiere JSON previo)\n"
         "/tts <libro> <cap>       – Solo TTS para libro/capítulo\n"
+        "/json_libro <libro> [desde] [hasta] – JSON de muchos capítulos vía batch\n"
         "/json_tts <...>          – JSON + TTS\n"
         "/imagenes <...>          – Solo imágenes (requiere JSON previo)\n"
         "/full <...>              – JSON + TTS + imágenes\n"
         "/libros                  – Lista de libros\n"
         "/capitulos <libro>       – Lista capítulos de un libro\n"
+        "/buscar <texto>          – Busca versículos (\"frase exacta\", prefijo*)\n"
         "/status [libro]          – Estado de progreso (por defecto genesis)\n"
+        "/cache [on|off|refresh]  – Caché LLM: aciertos por etapa / cambiar modo\n"
+        "/cascada [on|off]        – Modelo rápido primero: escalados por etapa / activar\n"
         "/cancel                  – Solicita cancelar el proceso en curso"
     )
 
@@ -118,6 +133,83 @@ async def cmd_capitulos(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     await update.message.reply_text(texto)
 
+BUSCAR_MAX_RESULTADOS = 15
+
+
+async def cmd_buscar(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /buscar principio          -> versículos con "principio"
+    # /buscar "sea la luz"       -> frase exacta
+    # /buscar dios crea*         -> "dios" y cualquier palabra que empiece con "crea"
+    consulta = " ".join(context.args or []).strip()
+    if not consulta:
+        await update.message.reply_text('Uso: /buscar <texto>. Ej: /buscar "sea la luz"')
+        return
+
+    # La primera búsqueda puede tener que construir el índice: fuera del event loop
+    loop = asyncio.get_running_loop()
+    run_fn = partial(processor.search, consulta, BUSCAR_MAX_RESULTADOS + 1)
+    resultados = await loop.run_in_executor(None, run_fn)
+
+    if not resultados:
+        await update.message.reply_text(f"Sin resultados para: {consulta}")
+        return
+
+    lines = [
+        f"{r['libro']} {r['capitulo']}:{r['versiculo']} – {r['texto']}"
+        for r in resultados[:BUSCAR_MAX_RESULTADOS]
+    ]
+    if len(resultados) > BUSCAR_MAX_RESULTADOS:
+        lines.append(f"... (mostrando los primeros {BUSCAR_MAX_RESULTADOS})")
+
+    texto = f"Resultados para {consulta}:\n\n" + "\n\n".join(lines)
+    # Límite de Telegram: 4096 caracteres por mensaje
+    await update.message.reply_text(texto[:4000])
+
+async def cmd_cache(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /cache          -> modo actual + aciertos por etapa
+    # /cache refresh  -> próximas llamadas ignoran lo guardado y lo reemplazan
+    if context.args:
+        modo = context.args[0].lower()
+        if modo not in CACHE_MODES:
+            await update.message.reply_text(f"Uso: /cache [{'|'.join(CACHE_MODES)}]")
+            return
+        set_cache_mode(modo)
+
+    loop = asyncio.get_running_loop()
+    stats = await loop.run_in_executor(None, llm_cache_stats)
+    stats_tts = await loop.run_in_executor(None, tts_cache_stats)
+
+    lines = [f"Caché LLM: modo {get_cache_mode()}"]
+    for etapa, s in sorted(stats.items()):
+        lines.append(
+            f"{etapa}: {s['hits']}/{s['hits'] + s['misses']} aciertos ({s['hit_rate']:.0%}), "
+            f"{s['entries']} entradas, {s['bytes'] / 1024:.0f} KB"
+        )
+    if not stats:
+        lines.append("(vacía)")
+    for _, s in stats_tts.items():
+        lines.append(
+            f"Audios TTS: {s['hits']}/{s['hits'] + s['misses']} aciertos ({s['hit_rate']:.0%}), "
+            f"{s['entries']} audios, {s['bytes'] / 1024 / 1024:.1f} MB"
+        )
+    await update.message.reply_text("\n".join(lines))
+
+async def cmd_cascada(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /cascada        -> estado + tasa de escalado por etapa
+    # /cascada on     -> cada etapa prueba primero el modelo rápido
+    if context.args:
+        modo = context.args[0].lower()
+        if modo not in ("on", "off"):
+            await update.message.reply_text("Uso: /cascada [on|off]")
+            return
+        set_cascade_mode(modo == "on")
+
+    activa, fast = get_cascade_mode()
+    lines = [f"Cascada LLM: {'on' if activa else 'off'} (modelo rápido {fast})"]
+    for etapa, s in sorted(cascade_stats().items()):
+        lines.append(f"{etapa}: {s['escaladas']}/{s['llamadas']} escaladas ({s['escaladas'] / s['llamadas']:.0%})")
+    await update.message.reply_text("\n".join(lines))
+
 async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # /status            -> asume "genesis"
     # /status exodo      -> usa "exodo"
@@ -204,6 +296,49 @@ async def cmd_json(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
 
 
+async def cmd_json_libro(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /json_libro genesis         -> todos los capítulos en batch
+    # /json_libro genesis 10 20   -> solo ese rango
+    reset_cancel()
+    chat_id = update.effective_chat.id
+    args = context.args or []
+
+    if not args:
+        await update.message.reply_text("Uso: /json_libro <libro> [desde] [hasta]")
+        return
+    libro = args[0].lower()
+    try:
+        desde = int(args[1]) if len(args) > 1 else 1
+        hasta = int(args[2]) if len(args) > 2 else None
+    except ValueError:
+        await update.message.reply_text("desde/hasta deben ser números.")
+        return
+    if not processor.list_chapters(libro):
+        await update.message.reply_text(f"El libro '{libro}' no existe en el JSON.")
+        return
+
+    await update.message.reply_text(
+        f"[JSON-BATCH] Enviando {libro} {desde}..{hasta or 'fin'} como jobs de batch. "
+        "Puede tardar horas; aviso al terminar."
+    )
+
+    loop = asyncio.get_running_loop()
+    run_fn = partial(run_json_libro, libro, desde, hasta)
+    try:
+        resumen = await loop.run_in_executor(None, run_fn)
+    except Exception as e:
+        await context.bot.send_message(chat_id=chat_id, text=f"[JSON-BATCH] Error en {libro}: {type(e).__name__}: {e}")
+        return
+
+    await context.bot.send_message(
+        chat_id=chat_id,
+        text=(
+            f"[JSON-BATCH] Terminado {libro}: {len(resumen['json_paths'])}/{len(resumen['capitulos'])} "
+            f"capítulos, {resumen['num_items']} items."
+        ),
+    )
+
+
 # ========== /tts ==========
 
 async def cmd_tts(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -426,13 +561,17 @@ def main():
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("json", cmd_json))
+    app.add_handler(CommandHandler("json_libro", cmd_json_libro))
     app.add_handler(CommandHandler("tts", cmd_tts))
     app.add_handler(CommandHandler("json_tts", cmd_json_tts))
     app.add_handler(CommandHandler("imagenes", cmd_imagenes))
     app.add_handler(CommandHandler("full", cmd_full))
     app.add_handler(CommandHandler("libros", cmd_libros))
     app.add_handler(CommandHandler("capitulos", cmd_capitulos))
+    app.add_handler(CommandHandler("buscar", cmd_buscar))
     app.add_handler(CommandHandler("status", cmd_status))
+    app.add_handler(CommandHandler("cache", cmd_cache))
+    app.add_handler(CommandHandler("cascada", cmd_cascada))
     app.add_handler(CommandHandler("cancel", cmd_cancel))
     print("Bot de Telegram corriendo...")
     app.run_polling()
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from bible_io import BibleJSONProcessor, get_search_index
+
+
+def _escribir(path, libros):
+    path.write_text(json.dumps({"libros": libros}, ensure_ascii=False), encoding="utf-8")
+
+
+@pytest.fixture
+def biblia(tmp_path):
+    path = tmp_path / "biblia.json"
+    _escribir(path, {"rut": {"1": {"1": "En los días que gobernaban los jueces."}, "2": {"1": "Tenía Noemí un pariente."}}})
+    return path
+
+
+@pytest.mark.parametrize("use_index", [True, False])
+def test_processor_ve_el_json_reescrito(biblia, use_index):
+    processor = BibleJSONProcessor(biblia, use_index=use_index)
+    assert processor.chapter_count("rut") == 2
+
+    _escribir(biblia, {"rut": {"1": {"1": "Texto corregido tras el refresh."}, "2": {"1": "x"}, "3": {"1": "y"}}})
+    assert processor.get_chapter("rut", 1) == {"1": "Texto corregido tras el refresh."}
+    assert processor.chapter_count("rut") == 3
+    assert processor.list_chapters("rut") == [1, 2, 3]
+
+
+def test_indice_viejo_se_cierra_al_recompilar(biblia):
+    primero = BibleJSONProcessor(biblia)
+    segundo = BibleJSONProcessor(biblia)
+    viejo = primero.index
+    assert segundo.index is viejo
+
+    _escribir(biblia, {"rut": {"1": {"1": "Nuevo."}}})
+    assert primero.get_chapter("rut", 1) == {"1": "Nuevo."}
+    assert viejo.closed and primero.index is not viejo
+    # El otro processor tenía el mismo mmap, ya cerrado: pide el nuevo
+    assert segundo.get_chapter("rut", 1) == {"1": "Nuevo."}
+    assert segundo.index is primero.index
+
+
+def test_busqueda_se_reconstruye_si_cambia_el_json(biblia):
+    processor = BibleJSONProcessor(biblia)
+    assert [r["capitulo"] for r in get_search_index(processor).search("jueces")] == [1]
+
+    _escribir(biblia, {"rut": {"1": {"1": "En los días de los reyes."}, "2": {"1": "Los jueces de Israel juzgaban."}}})
+    resultados = get_search_index(processor).search("jueces")
+    assert [(r["capitulo"], r["texto"]) for r in resultados] == [(2, "Los jueces de Israel juzgaban.")]
@@ -0,0 +1,78 @@
+import os
+import threading
+
+from disk_cache import DiskCache, make_key
+
+
+def test_make_key_estable_y_sensible_al_contenido():
+    assert make_key("a", {"x": 1, "y": 2}) == make_key("a", {"y": 2, "x": 1})
+    assert make_key("a", {"x": 1}) != make_key("a", {"x": 2})
+
+
+def test_get_put_y_estadisticas(tmp_path):
+    cache = DiskCache(tmp_path)
+    key = make_key("k")
+    assert cache.get(key, "ns") is None
+    cache.put(key, b"valor", "ns")
+    assert cache.get(key, "ns") == b"valor"
+    stats = cache.stats()["ns"]
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (1, 1, 1)
+    cache.close()
+
+    # Los contadores pendientes se vuelcan al cerrar y sobreviven a otra instancia
+    reabierta = DiskCache(tmp_path)
+    assert reabierta.stats()["ns"]["hits"] == 1
+    reabierta.close()
+
+
+def test_expulsa_lo_menos_usado(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=3000)
+    keys = [make_key(i) for i in range(3)]
+    for key in keys:
+        cache.put(key, b"x" * 1000)
+    assert cache.get(keys[0]) is not None  # el más viejo pasa a ser el más reciente
+    cache.put(make_key("nuevo"), b"y" * 1000)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert not cache.path_for(keys[1]).exists()
+    cache.close()
+
+
+def test_put_concurrente_de_la_misma_clave(tmp_path):
+    cache = DiskCache(tmp_path)
+    key = make_key("misma")
+    errores = []
+
+    def escribir(i):
+        try:
+            for _ in range(30):
+                cache.put(key, bytes([i]) * 4096)
+        except Exception as e:  # pragma: no cover - es lo que se prueba
+            errores.append(e)
+
+    hilos = [threading.Thread(target=escribir, args=(i,)) for i in range(8)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    assert not errores
+    valor = cache.get(key)
+    assert len(valor) == 4096 and len(set(valor)) == 1  # nunca un archivo mezclado
+    assert not list(tmp_path.rglob("*.tmp"))
+    cache.close()
+
+
+def test_link_to_comparte_el_blob(tmp_path):
+    cache = DiskCache(tmp_path / "cache")
+    key = make_key("audio")
+    cache.put(key, b"mp3", "tts")
+    dest = tmp_path / "salida" / "a.mp3"
+
+    assert cache.link_to(key, dest, "tts")
+    assert dest.read_bytes() == b"mp3"
+    if os.stat(dest).st_nlink > 1:
+        assert os.path.samefile(dest, cache.path_for(key))
+    assert not cache.link_to(make_key("otro"), tmp_path / "b.mp3", "tts")
+    cache.close()
@@ -0,0 +1,49 @@
+import asyncio
+
+from hedging import Hedger, LatencyTracker
+
+
+def _hedger(latencia=None):
+    tracker = LatencyTracker(min_samples=1)
+    if latencia is not None:
+        tracker.add("k", latencia)
+    return Hedger("prueba", max_extra=1.0, min_delay=0.0, tracker=tracker)
+
+
+def test_duplicado_gana_si_la_original_se_cuelga():
+    hedger = _hedger(0.01)
+    lentas = iter([10.0, 0.0])
+
+    async def fn():
+        await asyncio.sleep(next(lentas))
+        return "ok"
+
+    async def correr():
+        return await hedger.call_async("k", fn)
+
+    assert asyncio.run(correr()) == ("ok", "duplicado")
+
+
+def test_cancelar_al_llamador_cancela_la_original():
+    hedger = _hedger(5.0)  # el duplicado se lanzaría a los 5 s
+    terminada = {}
+
+    async def fn():
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            terminada["cancelada"] = True
+            raise
+
+    async def correr():
+        llamada = asyncio.ensure_future(hedger.call_async("k", fn))
+        await asyncio.sleep(0.01)
+        llamada.cancel()
+        await asyncio.gather(llamada, return_exceptions=True)
+        await asyncio.sleep(0)
+        # Antes de cerrar el loop (asyncio.run cancela lo que quede al salir)
+        return dict(terminada)
+
+    assert asyncio.run(correr()) == {"cancelada": True}
+    # La original deja su muestra de lo que llevaba
+    assert len(hedger.tracker._muestras["k"]) == 2
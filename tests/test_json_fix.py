@@ -0,0 +1,33 @@
+import pytest
+
+from json_fix import contar_reparaciones, loads_lenient, repair_json
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ('```json\n{"a": 1}\n```', {"a": 1}),
+    ('Aquí está:\n{"a": [1, 2,],}\nGracias', {"a": [1, 2]}),
+    ('{"a": 1, // comentario\n "b": "x /* no es comentario */"}', {"a": 1, "b": "x /* no es comentario */"}),
+    ('{"a": "línea\nrota"}', {"a": "línea\nrota"}),
+])
+def test_repara_defectos_comunes(texto, esperado):
+    assert repair_json(texto) == esperado
+
+
+def test_truncado_es_irreparable_por_defecto():
+    with pytest.raises(ValueError):
+        repair_json('{"contenido": [{"tipo": "HISTORIA"}, {"tipo": "CURIO')
+
+
+def test_truncado_opt_in_descarta_el_valor_a_medias():
+    # El número final puede estar cortado: nunca se da por bueno
+    assert repair_json('{"a": [1, 2', allow_truncated=True) == {"a": [1]}
+    assert repair_json('{"a": 1, "b": "a medi', allow_truncated=True) == {"a": 1}
+
+
+def test_loads_lenient_cuenta_reparaciones():
+    with contar_reparaciones() as conteo:
+        assert loads_lenient('{"a": 1}') == {"a": 1}
+        assert loads_lenient('{"a": 1,}') == {"a": 1}
+        with pytest.raises(ValueError):
+            loads_lenient('{"a": ')
+    assert (conteo.reparados, conteo.irreparables) == (1, 1)
@@ -0,0 +1,51 @@
+import pytest
+
+import llm_metrics
+import llm_pipeline
+from llm_batch import BatchRunner
+from llm_fixtures import FakeBatchMistral
+from llm_pipeline import _parse_json, _req_contenido
+from rate_limit import Provider, set_provider
+
+
+@pytest.fixture(autouse=True)
+def entorno_falso(monkeypatch):
+    # Sin caché, sin métricas en disco y sin el límite de cuota de config
+    monkeypatch.setattr(llm_pipeline, "_CACHE_MODE", "off")
+    monkeypatch.setattr(llm_metrics, "_PATH", None)
+    set_provider("mistral", Provider("mistral", requests_per_second=1e6))
+    yield
+    set_provider("mistral", None)
+
+
+def _peticiones(n):
+    return {str(cap): _req_contenido("prompt", f"RUT {cap}\n1 Texto.", "mistral-large-latest", 0.6)
+            for cap in range(1, n + 1)}
+
+
+def test_job_fallido_se_reenvia_en_batch():
+    client = FakeBatchMistral(fail_jobs=1)
+    runner = BatchRunner(client, poll_interval=0)
+    resultados = runner.run("contenido", _peticiones(20), _parse_json)
+
+    assert len(resultados) == 20 and all(v is not None for v in resultados.values())
+    assert runner.stats["jobs"] == 2 and runner.stats["resubmitted"] == 20
+    assert runner.stats["fallbacks"] == 0 and client.calls == 0
+
+
+def test_batch_caido_no_se_convierte_en_corrida_sincrona():
+    client = FakeBatchMistral(fail_jobs=2)
+    runner = BatchRunner(client, poll_interval=0)
+    resultados = runner.run("contenido", _peticiones(20), _parse_json)
+
+    assert list(resultados.values()) == [None] * 20
+    assert runner.stats["aborted"] == 20 and client.calls == 0
+
+
+def test_lineas_sueltas_van_por_la_via_sincrona():
+    client = FakeBatchMistral(fail_ids={"3", "7"})
+    runner = BatchRunner(client, poll_interval=0)
+    resultados = runner.run("contenido", _peticiones(20), _parse_json)
+
+    assert all(v is not None for v in resultados.values())
+    assert runner.stats["fallbacks"] == 2 and client.calls == 2
@@ -0,0 +1,36 @@
+import pytest
+
+from mp3_frames import concatenar_mp3, frames_mp3
+from tts_fixtures import FRAME_BYTES, FRAME_SECONDS, silent_mp3
+
+
+def test_frames_sin_tags_ni_frame_info():
+    audio = silent_mp3(1.0, tags=True)
+    data, frames, duracion = frames_mp3(audio)
+    assert frames == round(1.0 / FRAME_SECONDS)
+    assert len(data) == frames * FRAME_BYTES
+    assert duracion == pytest.approx(frames * FRAME_SECONDS)
+    assert b"Info" not in data and not data.startswith(b"ID3") and b"TAG" not in data[-128:]
+
+
+def test_resincroniza_tras_basura_y_corta_frame_incompleto():
+    audio = b"basura" + silent_mp3(0.5) + silent_mp3(0.1)[:100]
+    _, frames, _ = frames_mp3(audio)
+    assert frames == round(0.5 / FRAME_SECONDS)
+
+
+def test_sin_frames_es_error():
+    with pytest.raises(ValueError):
+        frames_mp3(b"no es un mp3")
+
+
+def test_concatenar_devuelve_tramos_contiguos():
+    partes = [silent_mp3(0.5, tags=True), silent_mp3(1.0), silent_mp3(0.25, tags=True)]
+    audio, tramos = concatenar_mp3(partes)
+
+    total = sum(frames_mp3(p)[1] for p in partes)
+    assert frames_mp3(audio)[1] == total
+    assert tramos[0][0] == 0.0
+    for (_, fin), (inicio, _) in zip(tramos, tramos[1:]):
+        assert inicio == fin
+    assert tramos[-1][1] == pytest.approx(total * FRAME_SECONDS, abs=1e-3)
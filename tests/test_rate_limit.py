@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+import rate_limit
+from rate_limit import CircuitBreaker, CircuitOpenError, Provider, TokenBucket
+
+
+class Reloj:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    r = Reloj()
+    monkeypatch.setattr(rate_limit.time, "monotonic", r)
+    return r
+
+
+def test_bucket_rafaga_y_recarga(reloj):
+    bucket = TokenBucket(rate=2.0, capacity=2.0)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.5)   # saldo -1 a 2 tokens/s
+    reloj.t += 1.0                                  # recupera 2 -> saldo 1
+    assert bucket.reserve() == 0.0
+
+
+def test_bucket_peticion_mayor_que_la_capacidad(reloj):
+    bucket = TokenBucket(rate=10.0, capacity=5.0)
+    # Se recorta a la capacidad: pasa ya y deja el bucket vacío
+    assert bucket.reserve(50) == 0.0
+    assert bucket.reserve(5) == pytest.approx(0.5)
+
+
+def test_circuito_abre_tras_el_umbral(reloj):
+    cb = CircuitBreaker(failure_threshold=3, reset_timeout=10.0)
+    assert not cb.failure()
+    assert not cb.failure()
+    assert cb.failure()
+    assert cb.state == "open"
+    with pytest.raises(CircuitOpenError):
+        cb.before("mistral")
+
+
+def test_half_open_deja_una_sola_prueba(reloj):
+    cb = CircuitBreaker(failure_threshold=1, reset_timeout=10.0)
+    cb.failure()
+    reloj.t += 10.0
+    assert cb.state == "half-open"
+    cb.before("mistral")                 # la llamada de prueba pasa
+    with pytest.raises(CircuitOpenError):
+        cb.before("mistral")             # las demás esperan su resultado
+    assert cb.failure()                  # la prueba falla: se vuelve a abrir
+    assert cb.state == "open"
+    reloj.t += 10.0
+    cb.before("mistral")
+    cb.success()
+    assert cb.state == "closed" and cb.failures == 0
+    cb.before("mistral")
+
+
+def _provider_half_open(reloj, monkeypatch):
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda s: None)
+    provider = Provider("mistral", requests_per_second=1e6, failure_threshold=1, reset_timeout=10.0)
+    provider.breaker.failure()
+    reloj.t += 10.0
+    return provider
+
+
+def test_prueba_con_error_de_parseo_no_deja_el_circuito_trabado(reloj, monkeypatch):
+    provider = _provider_half_open(reloj, monkeypatch)
+    respuestas = iter([ValueError("JSON inválido"), "ok"])
+
+    def fn():
+        r = next(respuestas)
+        if isinstance(r, Exception):
+            raise r
+        return r
+
+    # El reintento dentro del mismo call vuelve a ser la llamada de prueba
+    assert provider.call(fn) == "ok"
+    assert provider.breaker.state == "closed"
+
+
+def test_prueba_cancelada_libera_el_half_open(reloj, monkeypatch):
+    provider = _provider_half_open(reloj, monkeypatch)
+
+    async def colgada():
+        await asyncio.sleep(60)
+
+    async def cancelar():
+        tarea = asyncio.ensure_future(provider.call_async(colgada))
+        await asyncio.sleep(0)
+        tarea.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await tarea
+
+    asyncio.run(cancelar())
+    assert provider.breaker.state == "half-open"
+    assert provider.call(lambda: "ok") == "ok"
+
+
+def test_peticion_extra_no_usa_la_prueba(reloj, monkeypatch):
+    provider = _provider_half_open(reloj, monkeypatch)
+    with pytest.raises(CircuitOpenError):
+        provider.acquire()
+    assert provider.call(lambda: "ok") == "ok"
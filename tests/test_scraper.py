@@ -0,0 +1,136 @@
+import json
+
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("playwright")
+
+from scraper import BibleScraper, ScrapeCheckpoint, ScrapeManifest  # noqa: E402
+
+
+@pytest.fixture
+def scraper():
+    return BibleScraper(checkpoint_path=None, manifest_path=None)
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    (
+        "Libro 5\n1Este es el registro de la familia.\n2Y vivió el padre 130 años, y tuvo un hijo.\n"
+        "3Y fueron todos sus días 930 años; y murió.",
+        {
+            "1": "Este es el registro de la familia.",
+            "2": "Y vivió el padre 130 años, y tuvo un hijo.",
+            "3": "Y fueron todos sus días 930 años; y murió.",
+        },
+    ),
+    (
+        "1 Y dijo: ¿Dónde estás?\n2¿Quién te enseñó esto? 3 Y respondió: Yo lo oí.",
+        {"1": "Y dijo: ¿Dónde estás?", "2": "¿Quién te enseñó esto?", "3": "Y respondió: Yo lo oí."},
+    ),
+    (
+        "1Y salieron los 12 Apóstoles.\n2Y eran como 5 Mil hombres.",
+        {"1": "Y salieron los 12 Apóstoles.", "2": "Y eran como 5 Mil hombres."},
+    ),
+    (
+        # Romanos 1: versículos que empiezan en minúscula
+        "Romanos 1\n1Pablo, siervo de Jesucristo, llamado a ser apóstol,\n2que él había prometido antes"
+        "\n3acerca de su Hijo, nuestro Señor Jesucristo,\n4que fue declarado Hijo de Dios"
+        "\n5y por quien recibimos la gracia\n6entre las cuales estáis también vosotros"
+        "\n7a todos los que estáis en Roma\n8Primeramente doy gracias a mi Dios",
+        {
+            "1": "Pablo, siervo de Jesucristo, llamado a ser apóstol,",
+            "2": "que él había prometido antes",
+            "3": "acerca de su Hijo, nuestro Señor Jesucristo,",
+            "4": "que fue declarado Hijo de Dios",
+            "5": "y por quien recibimos la gracia",
+            "6": "entre las cuales estáis también vosotros",
+            "7": "a todos los que estáis en Roma",
+            "8": "Primeramente doy gracias a mi Dios",
+        },
+    ),
+    (
+        # Una marca que no se reconoce no arrastra a los versículos siguientes
+        "1Y dijo Dios.\n2— Sea la luz.\n3Y fue la luz.\n4y vio Dios que era buena.",
+        {"1": "Y dijo Dios. 2— Sea la luz.", "3": "Y fue la luz.", "4": "y vio Dios que era buena."},
+    ),
+])
+def test_parse_verses_con_numeros_en_el_texto(scraper, texto, esperado):
+    assert scraper.parse_verses(texto) == esperado
+
+
+def test_checkpoint_descarta_linea_cortada(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    cp = ScrapeCheckpoint(path)
+    cp.append("rut", 1, {"1": "uno"})
+    cp.append("rut", 2, {"1": "dos"})
+    cp.close()
+    with open(path, "ab") as f:
+        f.write(b'{"libro": "rut", "capitulo": 3, "versic')  # crash a mitad de escritura
+
+    cp = ScrapeCheckpoint(path)
+    assert cp.books() == {"rut": {1: 1, 2: 1}}
+    assert not cp.is_done("rut", 3)
+    cp.append("rut", 3, {"1": "tres"})
+    cp.close()
+
+    lineas = path.read_bytes().splitlines()
+    assert [json.loads(l)["capitulo"] for l in lineas] == [1, 2, 3]
+    assert dict(ScrapeCheckpoint(path).iter_book("rut"))["3"] == {"1": "tres"}
+
+
+def test_checkpoint_gana_la_ultima_linea(tmp_path):
+    cp = ScrapeCheckpoint(tmp_path / "c.jsonl")
+    cp.append("rut", 1, {})
+    assert not cp.is_done("rut", 1)
+    cp.append("rut", 1, {"1": "uno"})
+    assert cp.is_done("rut", 1)
+    assert dict(cp.iter_book("rut")) == {"1": {"1": "uno"}}
+    cp.close()
+
+
+def test_manifest_sembrado_no_reporta_cambios(tmp_path):
+    biblia = tmp_path / "biblia.json"
+    biblia.write_text(json.dumps({"libros": {"rut": {"1": {"1": "uno"}, "2": {"1": "dos"}}}}), encoding="utf-8")
+    manifest = ScrapeManifest(tmp_path / "manifest.json")
+
+    assert manifest.seed(biblia) == 2
+    assert not manifest.update("rut", 1, {"1": "uno"})
+    assert manifest.update("rut", 2, {"1": "dos, corregido"})
+
+
+def test_refresh_invalida_los_capitulos_cambiados(tmp_path, monkeypatch):
+    import asyncio
+
+    import pipeline_status
+    from scraper import refresh_biblia
+    from scraper_fixtures import FixtureServer, write_fixtures_from_json
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pipeline_status, "STATUS_FILE", tmp_path / "pipeline_status.json")
+    libros = {"rut": {str(c): {"1": f"Texto del capítulo {c}.", "2": "Y fue así."} for c in range(1, 5)}}
+    (tmp_path / "output").mkdir()
+    (tmp_path / "output" / "biblia.json").write_text(json.dumps({"libros": libros}, ensure_ascii=False), encoding="utf-8")
+
+    # El sitio corrige Rut 2 después de la extracción
+    write_fixtures_from_json(tmp_path / "output" / "biblia.json", tmp_path / "fixtures")
+    libros["rut"]["2"]["2"] = "Y fue así, corregido."
+    corregido = {"libros": {"rut": {"2": libros["rut"]["2"]}}}
+    (tmp_path / "corregido.json").write_text(json.dumps(corregido), encoding="utf-8")
+    write_fixtures_from_json(tmp_path / "corregido.json", tmp_path / "fixtures")
+
+    for cap in (1, 2):
+        (tmp_path / f"rut_{cap}_videos.json").write_text("[]", encoding="utf-8")
+        pipeline_status.mark_stage_done("rut", cap, "json")
+
+    with FixtureServer(tmp_path / "fixtures") as server:
+        reporte = asyncio.run(refresh_biblia(
+            "biblia.json", ["rut"], invalidar=True, videos_dir=tmp_path,
+            base_url=server.base_url, manifest_path=tmp_path / "manifest.json", delay=0,
+        ))
+
+    assert reporte["changed"] == [("rut", 2)] and reporte["new"] == []
+    assert not (tmp_path / "rut_2_videos.json").exists()
+    assert (tmp_path / "rut_1_videos.json").exists()
+    assert pipeline_status.get_status("rut") == {"json": [1]}
+    guardado = json.loads((tmp_path / "output" / "biblia.json").read_text(encoding="utf-8"))
+    assert guardado["libros"]["rut"]["2"]["2"] == "Y fue así, corregido."
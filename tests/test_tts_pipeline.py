@@ -0,0 +1,49 @@
+import os
+import threading
+
+import pytest
+
+from tts_pipeline import _escribir_atomico
+
+
+def test_escritores_concurrentes_no_se_pisan(tmp_path):
+    destino = tmp_path / "audio.mp3"
+    errores = []
+
+    def escribir(i):
+        try:
+            for _ in range(30):
+                _escribir_atomico(destino, bytes([i]) * 65536)
+        except Exception as e:  # pragma: no cover - es lo que se prueba
+            errores.append(e)
+
+    hilos = [threading.Thread(target=escribir, args=(i,)) for i in range(8)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    assert not errores
+    data = destino.read_bytes()
+    assert len(data) == 65536 and len(set(data)) == 1
+    assert os.listdir(tmp_path) == ["audio.mp3"]
+
+
+def test_no_deja_temporal_si_falla(tmp_path, monkeypatch):
+    def falla(*args):
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(os, "replace", falla)
+    with pytest.raises(OSError):
+        _escribir_atomico(tmp_path / "audio.mp3", b"mp3")
+    assert os.listdir(tmp_path) == []
+
+
+def test_no_toca_el_blob_enlazado(tmp_path):
+    blob = tmp_path / "blob"
+    blob.write_bytes(b"cache")
+    destino = tmp_path / "audio.mp3"
+    os.link(blob, destino)
+
+    _escribir_atomico(destino, b"nuevo")
+    assert blob.read_bytes() == b"cache" and destino.read_bytes() == b"nuevo"
@@ -0,0 +1,67 @@
+# tts_fixtures.py
+"""
+Cliente falso con la forma de ElevenLabs (text_to_speech.convert) para probar
+y medir tts_pipeline sin red ni API key.
+
+Devuelve MP3 "de silencio" válidos: frames MPEG-1 Layer III a 128 kbps / 44.1 kHz
+mono, tantos como dure el texto leído a CHARS_PER_SECOND.
+`latency` simula el tiempo de síntesis (segundos por llamada, más `char_latency`
+por carácter); con `tail` (prob, factor) una fracción de llamadas tarda `factor`
+veces más. Con `tags=True` cada MP3 trae tag ID3v2, frame Info y tag ID3v1, como
+los de verdad.
+"""
+import random
+import threading
+import time
+
+CHARS_PER_SECOND = 15.0
+FRAME_HEADER = b"\xff\xfb\x90\xc0"  # MPEG-1, Layer III, 128 kbps, 44100 Hz, mono
+FRAME_BYTES = 417                    # 144 * 128000 / 44100
+FRAME_SECONDS = 1152 / 44100
+
+
+def silent_mp3(seconds: float, tags: bool = False) -> bytes:
+    frames = max(1, round(seconds / FRAME_SECONDS))
+    audio = (FRAME_HEADER + bytes(FRAME_BYTES - len(FRAME_HEADER))) * frames
+    if not tags:
+        return audio
+    # ID3v2 (10 bytes + 20 de contenido), frame Info tras 17 bytes de side info (mono), ID3v1
+    id3v2 = b"ID3\x04\x00\x00\x00\x00\x00\x14" + bytes(20)
+    info = FRAME_HEADER + bytes(17) + b"Info" + bytes(FRAME_BYTES - len(FRAME_HEADER) - 21)
+    return id3v2 + info + audio + b"TAG" + bytes(125)
+
+
+class _TextToSpeech:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def convert(self, voice_id, text, model_id=None, voice_settings=None, chunk_size: int = 4096, **kwargs):
+        owner = self._owner
+        with owner._lock:
+            owner.calls += 1
+            owner.requests.append({"voice_id": voice_id, "text": text, "model_id": model_id, **kwargs})
+            lento = owner._rng.random() < owner.tail[0]
+        time.sleep((owner.latency + owner.char_latency * len(text)) * (owner.tail[1] if lento else 1.0))
+        audio = silent_mp3(len(text) / CHARS_PER_SECOND, tags=owner.tags)
+        return (audio[i:i + chunk_size] for i in range(0, len(audio), chunk_size))
+
+
+class FakeElevenLabs:
+    """
+    Uso:
+        client = FakeElevenLabs(latency=0.5)
+        procesar_lote_audios(client, lote)
+        client.calls  # nº de síntesis pedidas
+    """
+
+    def __init__(self, latency: float = 0.0, tail=(0.0, 1.0), seed: int = 0,
+                 char_latency: float = 0.0, tags: bool = False):
+        self.latency = latency
+        self.char_latency = char_latency
+        self.tags = tags
+        self.tail = tail
+        self._rng = random.Random(seed)
+        self.calls = 0
+        self.requests = []
+        self._lock = threading.Lock()
+        self.text_to_speech = _TextToSpeech(self)
@@ -1,8 +1,105 @@
 # tts_pipeline.py
+import asyncio
+import contextvars
+import json
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import AsyncIterable, List, Dict, Any, Tuple
 
+from config import (
+    TTS_MAX_WORKERS,
+    TTS_CACHE_DIR,
+    TTS_CACHE_MAX_MB,
+    TTS_CACHE_MODE,
+    TTS_CHUNKED,
+    TTS_CHUNK_CHARS,
+    TTS_CHUNK_WORKERS,
+)
+from disk_cache import DiskCache, make_key
+from hedging import get_hedger
+from mp3_frames import concatenar_mp3
 from pipeline_cancel import should_cancel
+from rate_limit import get_provider
+
+
+# ============ CACHÉ DE AUDIOS ============
+#
+# Clave = sha256 de (texto normalizado, voice_id, model_id, ajustes de voz).
+# Un acierto se enlaza (hard link) en tts_outputs/<tipo>/<nombre>.mp3 sin
+# llamar a ElevenLabs: ni latencia ni cuota de caracteres.
+#   on      : lee y escribe
+#   off     : ni lee ni escribe
+#   refresh : vuelve a sintetizar y reemplaza lo guardado
+
+TTS_CACHE_MODES = ("on", "off", "refresh")
+
+_CACHE = None
+_CACHE_MODE = TTS_CACHE_MODE if TTS_CACHE_MODE in TTS_CACHE_MODES else "on"
+_CACHE_LOCK = threading.Lock()
+
+
+def set_tts_cache_mode(mode: str):
+    global _CACHE_MODE
+    if mode not in TTS_CACHE_MODES:
+        raise ValueError(f"Modo de caché inválido: {mode!r} (usa {', '.join(TTS_CACHE_MODES)})")
+    with _CACHE_LOCK:
+        _CACHE_MODE = mode
+
+
+def get_tts_cache_mode() -> str:
+    with _CACHE_LOCK:
+        return _CACHE_MODE
+
+
+def get_tts_cache() -> DiskCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = DiskCache(TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_MB * 1024 * 1024)
+        return _CACHE
+
+
+def set_tts_cache(cache: DiskCache | None):
+    """Sustituye la caché (benchmarks, otro directorio). None = volver a la de config."""
+    global _CACHE
+    with _CACHE_LOCK:
+        _CACHE = cache
+
+
+def tts_cache_stats() -> dict:
+    return get_tts_cache().stats()
+
+
+def _normalizar_texto(texto: str) -> str:
+    # Diferencias que no cambian la locución: forma Unicode, espacios repetidos, bordes
+    texto = unicodedata.normalize("NFC", texto).replace("\r\n", "\n")
+    texto = re.sub(r"[ \t]+", " ", texto)
+    texto = re.sub(r" *\n *", "\n", texto)
+    return texto.strip()
+
+
+def _tts_key(texto: str, voice_id: str, model_id: str, settings: dict, frases: int | None = None) -> str:
+    # El audio por frases no es idéntico al de una sola petición: otra clave
+    partes = ("tts", _normalizar_texto(texto), voice_id, model_id, settings)
+    return make_key(*partes, {"frases": frases}) if frases else make_key(*partes)
+
+
+def _escribir_atomico(path: Path, data: bytes):
+    # Reemplazo atómico: si path era un hard link a la caché, el blob no se toca.
+    # Temporal único: dos escritores del mismo archivo no se pisan el .tmp
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
 
 
 def extraer_guiones_para_tts(resultados: list) -> List[Dict[str, str]]:
@@ -16,24 +113,158 @@ def extraer_guiones_para_tts(resultados: list) -> List[Dict[str, str]]:
         return lote
 
     for item in resultados:
-        tipo = (item.get("tipo") or "VIDEO").strip()
-        referencia = (item.get("referencia") or "Capitulo").replace(":", "_").replace(" ", "_")
-        nombre = f"{referencia}_{tipo}"
-        # Sanitizar nombre de archivo
-        nombre = "".join(c for c in nombre if c.isalnum() or c in ("_", "-"))
-
-        guion = (item.get("guion_tts") or "").strip()
-        if guion:
-            lote.append(
-                {
-                    "tipo": tipo,
-                    "nombre": nombre,
-                    "guion_final": guion,
-                }
-            )
+        entrada = guion_para_tts(item)
+        if entrada:
+            lote.append(entrada)
     return lote
 
 
+def guion_para_tts(item: dict) -> Dict[str, str] | None:
+    """Entrada de TTS ({tipo, nombre, guion_final}) para un item, o None si no tiene guion."""
+    tipo = (item.get("tipo") or "VIDEO").strip()
+    referencia = (item.get("referencia") or "Capitulo").replace(":", "_").replace(" ", "_")
+    nombre = f"{referencia}_{tipo}"
+    # Sanitizar nombre de archivo
+    nombre = "".join(c for c in nombre if c.isalnum() or c in ("_", "-"))
+
+    guion = (item.get("guion_tts") or "").strip()
+    if not guion:
+        return None
+    return {
+        "tipo": tipo,
+        "nombre": nombre,
+        "guion_final": guion,
+    }
+
+
+# ============ SÍNTESIS POR FRASES ============
+#
+# Con el modo por frases, un guion de más de TTS_CHUNK_CHARS caracteres se corta
+# en fronteras de frase o de etiqueta de pausa, los fragmentos se sintetizan a la
+# vez (con previous_text/next_text para que la entonación siga el hilo) y los
+# MP3 se unen frame a frame sin recodificar (mp3_frames). Junto al audio queda
+# <nombre>.json con el tramo de cada fragmento (inicio_s, fin_s).
+
+_CHUNKED = TTS_CHUNKED
+_CHUNK_CHARS = TTS_CHUNK_CHARS
+_CHUNK_WORKERS = TTS_CHUNK_WORKERS
+_CHUNK_LOCK = threading.Lock()
+
+# Fin de frase (con comillas o paréntesis de cierre) o etiqueta de pausa, seguido de espacio
+_CORTE_RE = re.compile(
+    r"(?:[.!?…][\"'»”)\]]*|\[[^\]\n]*(?:pause|pausa)[^\]\n]*\]|<break\b[^>]*/>)\s+",
+    re.IGNORECASE,
+)
+
+
+def set_chunked_mode(activo: bool, max_chars: int | None = None, workers: int | None = None):
+    global _CHUNKED, _CHUNK_CHARS, _CHUNK_WORKERS
+    with _CHUNK_LOCK:
+        _CHUNKED = bool(activo)
+        if max_chars:
+            _CHUNK_CHARS = max_chars
+        if workers:
+            _CHUNK_WORKERS = workers
+
+
+def get_chunked_mode() -> Tuple[bool, int]:
+    with _CHUNK_LOCK:
+        return _CHUNKED, _CHUNK_CHARS
+
+
+def dividir_guion(texto: str, max_chars: int = TTS_CHUNK_CHARS) -> List[str]:
+    """
+    Corta en frases / pausas y las agrupa hasta max_chars por fragmento.
+    Una frase más larga que max_chars queda entera (no se corta a mitad).
+    """
+    unidades = []
+    inicio = 0
+    for m in _CORTE_RE.finditer(texto):
+        unidades.append(texto[inicio:m.end()].strip())
+        inicio = m.end()
+    unidades.append(texto[inicio:].strip())
+
+    fragmentos = []
+    actual = ""
+    for unidad in filter(None, unidades):
+        if actual and len(actual) + 1 + len(unidad) > max_chars:
+            fragmentos.append(actual)
+            actual = unidad
+        else:
+            actual = f"{actual} {unidad}" if actual else unidad
+    if actual:
+        fragmentos.append(actual)
+    return fragmentos
+
+
+def _sintetizar(client_eleven, texto: str, voice_id: str, model_id: str, settings: dict, **contexto) -> bytes:
+    """Una petición a ElevenLabs (limitador compartido + hedging si está activo); devuelve el MP3."""
+    provider = get_provider("elevenlabs")
+    hedger = get_hedger("elevenlabs")
+    # previous_text / next_text solo si hay: el SDK no acepta None en todas las versiones
+    contexto = {k: v for k, v in contexto.items() if v}
+
+    def descargar(cancelado) -> bytes:
+        audio_stream = client_eleven.text_to_speech.convert(
+            voice_id=voice_id,
+            text=texto,
+            model_id=model_id,
+            voice_settings=settings,
+            **contexto,
+        )
+        partes = []
+        for chunk in audio_stream:
+            if cancelado.is_set():
+                break  # perdió contra el duplicado (hedging)
+            if chunk:
+                partes.append(chunk)
+        return b"".join(partes)
+
+    def sintetizar() -> bytes:
+        # El audio se junta en memoria y se escribe al final: un stream que falla
+        # a mitad (y se reintenta) o un duplicado de hedging no pisan el archivo
+        if hedger is None:
+            return descargar(threading.Event())
+        audio, _ = hedger.call(
+            f"tts:{model_id}:{len(texto) // 500}",  # p95 por modelo y largo aproximado
+            descargar,
+            before_extra=lambda: provider.acquire(len(texto)),
+        )
+        return audio
+
+    # Límite compartido de ElevenLabs (peticiones/s, caracteres/min, 429, breaker)
+    return provider.call(sintetizar, tokens=len(texto))
+
+
+def _sintetizar_por_frases(
+    client_eleven, fragmentos: List[str], voice_id: str, model_id: str, settings: dict
+) -> Tuple[bytes, Dict[str, Any]]:
+    """Fragmentos en paralelo -> (MP3 unido, metadatos de tiempos)."""
+
+    def uno(i: int) -> bytes:
+        return _sintetizar(
+            client_eleven, fragmentos[i], voice_id, model_id, settings,
+            previous_text=fragmentos[i - 1] if i > 0 else None,
+            next_text=fragmentos[i + 1] if i + 1 < len(fragmentos) else None,
+        )
+
+    with _CHUNK_LOCK:
+        workers = _CHUNK_WORKERS
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(fragmentos)))) as ex:
+        futuros = [ex.submit(contextvars.copy_context().run, uno, i) for i in range(len(fragmentos))]
+        audios = [f.result() for f in futuros]
+
+    audio, tramos = concatenar_mp3(audios)
+    meta = {
+        "duracion_s": tramos[-1][1],
+        "fragmentos": [
+            {"texto": texto, "inicio_s": inicio, "fin_s": fin}
+            for texto, (inicio, fin) in zip(fragmentos, tramos)
+        ],
+    }
+    return audio, meta
+
+
 def generar_audio_tts(
     client_eleven,
     texto: str,
@@ -41,14 +272,38 @@ def generar_audio_tts(
     voice_id: str = "NOpBlnGInO9m6vDvFkFC",
     model_id: str = "eleven_turbo_v2_5",
     output_folder: str = "tts_outputs",
+    quiet: bool = False,
     **voice_settings,
 ) -> Dict[str, Any]:
     """
     Genera un solo archivo de audio TTS y devuelve un dict con status y path.
+    Con el modo por frases (set_chunked_mode) un guion largo se sintetiza por
+    fragmentos en paralelo y se escribe además <filename>.json con los tiempos.
+    quiet=True: no imprime nada; lo usan los lotes en paralelo, que informan
+    cada resultado desde un solo hilo (_informar) para no mezclar líneas.
     """
+    resultado = _generar_audio_tts(client_eleven, texto, filename, voice_id, model_id, output_folder, **voice_settings)
+    if not quiet:
+        _informar(filename, resultado)
+    return resultado
+
+
+def _informar(nombre: str, resultado: Dict[str, Any]):
+    if resultado["status"] == "cancelled":
+        print(f"⛔ Cancelado antes de generar audio para {nombre}.")
+    elif resultado["status"] == "error":
+        print(f"❌ Error TTS {nombre}: {resultado.get('message')}")
+    elif resultado.get("cached"):
+        print(f"🎧 Audio desde caché: {resultado['file']}")
+    else:
+        print(f"🎧 Audio generado: {resultado['file']}")
+
+
+def _generar_audio_tts(client_eleven, texto, filename, voice_id, model_id, output_folder, **voice_settings):
     output_path = Path(output_folder)
     output_path.mkdir(parents=True, exist_ok=True)
     final_path = output_path / f"{filename}.mp3"
+    meta_path = output_path / f"{filename}.json"
 
     try:
         default_settings = {
@@ -62,43 +317,99 @@ def generar_audio_tts(
 
         # Check de cancel justo antes de pegarle a la API
         if should_cancel():
-            print(f"⛔ Cancelado antes de generar audio para {filename}.")
             return {"status": "cancelled", "file": str(final_path)}
 
-        audio_stream = client_eleven.text_to_speech.convert(
-            voice_id=voice_id,
-            text=texto,
-            model_id=model_id,
-            voice_settings=settings,
-        )
+        por_frases, max_chars = get_chunked_mode()
+        fragmentos = dividir_guion(texto, max_chars) if por_frases and len(texto) > max_chars else None
+        if fragmentos is not None and len(fragmentos) < 2:
+            fragmentos = None  # una sola frase larga: no hay nada que paralelizar
 
-        with open(final_path, "wb") as f:
-            for chunk in audio_stream:
-                if chunk:
-                    f.write(chunk)
+        modo = get_tts_cache_mode()
+        key = meta_key = None
+        if modo != "off":
+            key = _tts_key(texto, voice_id, model_id, settings, max_chars if fragmentos else None)
+            meta_key = make_key(key, "meta") if fragmentos else None
+        if modo == "on":
+            cache = get_tts_cache()
+            if cache.link_to(key, final_path, namespace="tts") and (
+                meta_key is None or cache.link_to(meta_key, meta_path, count=False)
+            ):
+                resultado = {"status": "success", "file": str(final_path), "cached": True}
+                if meta_key is not None:
+                    resultado.update(timing=str(meta_path), fragmentos=len(fragmentos))
+                return resultado
 
-        print(f"🎧 Audio generado: {final_path}")
-        return {"status": "success", "file": str(final_path)}
+        meta = None
+        if fragmentos:
+            audio, meta = _sintetizar_por_frases(client_eleven, fragmentos, voice_id, model_id, settings)
+        else:
+            audio = _sintetizar(client_eleven, texto, voice_id, model_id, settings)
+
+        if key is not None:
+            cache = get_tts_cache()
+            cache.put(key, audio, namespace="tts")
+            if not cache.link_to(key, final_path, count=False):
+                _escribir_atomico(final_path, audio)  # expulsado ya (audio mayor que la caché)
+        else:
+            _escribir_atomico(final_path, audio)
+        if meta is not None:
+            meta_bytes = json.dumps({"audio": final_path.name, **meta}, ensure_ascii=False, indent=2).encode("utf-8")
+            _escribir_atomico(meta_path, meta_bytes)
+            if meta_key is not None:
+                get_tts_cache().put(meta_key, meta_bytes, namespace="tts-meta")
+
+        resultado = {"status": "success", "file": str(final_path)}
+        if meta is not None:
+            resultado.update(timing=str(meta_path), fragmentos=len(fragmentos))
+        return resultado
 
     except Exception as e:
-        print(f"❌ Error TTS {filename}: {e}")
         return {"status": "error", "message": str(e)}
 
 
+def _anotar_resultado(reporte: Dict[str, Any], nombre: str, resultado: Dict[str, Any]):
+    if resultado["status"] == "success":
+        reporte["procesados"].append(resultado)
+    elif resultado["status"] == "cancelled":
+        reporte["cancelled"] = True
+    else:
+        reporte["errores"].append(
+            {
+                "nombre": nombre,
+                "error": resultado.get("message", "Error desconocido en TTS"),
+            }
+        )
+
+
+def _generar_entrada(client_eleven, item: Dict[str, str], base_output: str, **voice_settings) -> Dict[str, Any]:
+    tipo = item.get("tipo", "OTRO")
+    return generar_audio_tts(
+        client_eleven=client_eleven,
+        texto=item.get("guion_final", ""),
+        filename=item.get("nombre", "sin_nombre"),
+        output_folder=str(Path(base_output) / tipo),
+        quiet=True,
+        **voice_settings,
+    )
+
+
 def procesar_lote_audios(
     client_eleven,
     lista_guiones: List[Dict[str, str]],
     base_output: str = "tts_outputs",
+    max_workers: int = TTS_MAX_WORKERS,
     **voice_settings,
 ) -> Dict[str, Any]:
     """
-    Procesa un lote de guiones y genera sus audios.
+    Procesa un lote de guiones y genera sus audios, hasta max_workers a la vez
+    (1 = uno tras otro). El límite de ElevenLabs (rate_limit) sigue mandando.
     Devuelve:
       {
-        "procesados": [ {status, file}, ... ],
+        "procesados": [ {status, file}, ... ],   # en el orden del lote
         "errores": [ {nombre, error}, ... ],
         "cancelled": bool
       }
+    Con cancelación no se lanza ningún audio nuevo; los que ya están en curso terminan.
     """
     reporte: Dict[str, Any] = {"procesados": [], "errores": [], "cancelled": False}
 
@@ -106,38 +417,88 @@ def procesar_lote_audios(
         print("⚠️ No hay guiones para TTS (lista_guiones vacía).")
         return reporte
 
-    for item in lista_guiones:
-        if should_cancel():
-            print("⛔ Cancelado por el usuario durante TTS.")
-            reporte["cancelled"] = True
-            break
+    max_workers = max(1, max_workers)
+    resultados = {}
+    pendientes = {}
+    siguiente = 0
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts") as ex:
+        while siguiente < len(lista_guiones) or pendientes:
+            # Solo se encola lo que puede empezar ya: así un cancel corta lo que falta
+            while siguiente < len(lista_guiones) and len(pendientes) < max_workers:
+                if should_cancel():
+                    print("⛔ Cancelado por el usuario durante TTS.")
+                    reporte["cancelled"] = True
+                if reporte["cancelled"]:
+                    siguiente = len(lista_guiones)
+                    break
+                futuro = ex.submit(
+                    contextvars.copy_context().run,
+                    _generar_entrada, client_eleven, lista_guiones[siguiente], base_output, **voice_settings,
+                )
+                pendientes[futuro] = siguiente
+                siguiente += 1
 
-        tipo = item.get("tipo", "OTRO")
-        nombre = item.get("nombre", "sin_nombre")
-        texto = item.get("guion_final", "")
+            if not pendientes:
+                break
+            hechos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futuro in hechos:
+                indice = pendientes.pop(futuro)
+                resultados[indice] = futuro.result()
+                _informar(lista_guiones[indice].get("nombre", "sin_nombre"), resultados[indice])
+                if resultados[indice]["status"] == "cancelled":
+                    reporte["cancelled"] = True  # no tiene sentido seguir encolando
 
-        carpeta_tipo = Path(base_output) / tipo
+    for indice in sorted(resultados):
+        _anotar_resultado(reporte, lista_guiones[indice].get("nombre", "sin_nombre"), resultados[indice])
+    return reporte
 
-        resultado = generar_audio_tts(
-            client_eleven=client_eleven,
-            texto=texto,
-            filename=nombre,
-            output_folder=str(carpeta_tipo),
-            **voice_settings,
-        )
 
-        if resultado["status"] == "success":
-            reporte["procesados"].append(resultado)
-        elif resultado["status"] == "cancelled":
-            # Marcamos cancel y salimos – no tiene sentido seguir
+async def procesar_stream_audios(
+    client_eleven,
+    items: AsyncIterable[dict],
+    base_output: str = "tts_outputs",
+    max_concurrency: int = TTS_MAX_WORKERS,
+    **voice_settings,
+) -> Dict[str, Any]:
+    """
+    Como procesar_lote_audios, pero consume los items del LLM a medida que llegan
+    (p. ej. llm_pipeline.iter_capitulo_async): el audio del primer item se sintetiza
+    mientras los demás siguen en el LLM. La síntesis (cliente síncrono) corre en hilos.
+    Devuelve el mismo reporte que procesar_lote_audios.
+    """
+    reporte: Dict[str, Any] = {"procesados": [], "errores": [], "cancelled": False}
+    semaforo = asyncio.Semaphore(max(1, max_concurrency))
+    tareas = []
+
+    async def sintetizar(entrada):
+        async with semaforo:
+            if should_cancel():
+                reporte["cancelled"] = True
+                return
+            resultado = await asyncio.to_thread(
+                generar_audio_tts,
+                client_eleven=client_eleven,
+                texto=entrada["guion_final"],
+                filename=entrada["nombre"],
+                output_folder=str(Path(base_output) / entrada["tipo"]),
+                quiet=True,
+                **voice_settings,
+            )
+
+        # Se informa desde el hilo del loop, no desde los hilos de síntesis
+        _informar(entrada["nombre"], resultado)
+        _anotar_resultado(reporte, entrada["nombre"], resultado)
+
+    async for item in items:
+        if should_cancel():
+            print("⛔ Cancelado por el usuario durante TTS.")
             reporte["cancelled"] = True
             break
-        else:
-            reporte["errores"].append(
-                {
-                    "nombre": nombre,
-                    "error": resultado.get("message", "Error desconocido en TTS"),
-                }
-            )
+        entrada = guion_para_tts(item)
+        if entrada:
+            tareas.append(asyncio.create_task(sintetizar(entrada)))
 
+    await asyncio.gather(*tareas)
+    if not tareas and not reporte["cancelled"]:
+        print("⚠️ No hay guiones para TTS (ningún item con guion_tts).")
     return reporte